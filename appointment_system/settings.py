@@ -10,8 +10,11 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
+from django.core.exceptions import ImproperlyConfigured
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -41,6 +44,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "booking.middleware.MetricsMiddleware",
+    "booking.middleware.PrimaryStickinessMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -80,6 +85,89 @@ DATABASES = {
     }
 }
 
+# Database profile, chosen with the BOOKING_DB_PROFILE environment variable:
+#   development  SQLite with Django's defaults
+#   sqlite       SQLite tuned for concurrent bookings: persistent connections, write
+#                transactions that take the lock up front and BOOKING_SQLITE_PRAGMAS
+#   postgresql   PostgreSQL from the POSTGRES_* variables with persistent,
+#                health checked connections, or Django's connection pool
+#                (psycopg 3) when BOOKING_DB_POOL_SIZE is set
+BOOKING_DB_PROFILE = os.environ.get("BOOKING_DB_PROFILE", "development")
+
+# PRAGMAs run on every new SQLite connection (booking.signals.configure_sqlite)
+BOOKING_SQLITE_PRAGMAS = {}
+
+if BOOKING_DB_PROFILE == "sqlite":
+    DATABASES["default"].update(
+        CONN_MAX_AGE=600,
+        CONN_HEALTH_CHECKS=True,
+        OPTIONS={"transaction_mode": "IMMEDIATE"},
+        # Tests on a file, an in-memory database has table locks and no busy timeout
+        TEST={"NAME": BASE_DIR / "test-db.sqlite3"},
+    )
+    BOOKING_SQLITE_PRAGMAS = {
+        "journal_mode": "wal",  # readers and the writer no longer block each other
+        "synchronous": "normal",  # safe with WAL, fsync only at checkpoints
+        # ms a writer waits for the lock before "database is locked"
+        "busy_timeout": 5000,
+        "mmap_size": 134217728,  # read through 128 MB of memory mapped I/O
+    }
+elif BOOKING_DB_PROFILE == "postgresql":
+    DATABASES["default"] = {
+        "ENGINE": "django.db.backends.postgresql",
+        "NAME": os.environ.get("POSTGRES_DB", "appointment_system"),
+        "USER": os.environ.get("POSTGRES_USER", ""),
+        "PASSWORD": os.environ.get("POSTGRES_PASSWORD", ""),
+        "HOST": os.environ.get("POSTGRES_HOST", ""),
+        "PORT": os.environ.get("POSTGRES_PORT", ""),
+        "CONN_MAX_AGE": 600,
+        "CONN_HEALTH_CHECKS": True,
+    }
+    if os.environ.get("BOOKING_DB_POOL_SIZE"):
+        # The pool replaces persistent connections, Django rejects both at once
+        DATABASES["default"]["CONN_MAX_AGE"] = 0
+        DATABASES["default"]["OPTIONS"] = {
+            "pool": {
+                "min_size": 2,
+                "max_size": int(os.environ["BOOKING_DB_POOL_SIZE"]),
+                "timeout": 10,
+            }
+        }
+elif BOOKING_DB_PROFILE != "development":
+    raise ImproperlyConfigured(f"Unknown BOOKING_DB_PROFILE {BOOKING_DB_PROFILE!r}")
+
+# Optional read replica for availability and catalogue reads (booking.routers), set up
+# like the primary. Locally a second SQLite file works, refreshed from the primary with
+# sqlite3 db.sqlite3 ".backup db-replica.sqlite3"
+if os.environ.get("BOOKING_REPLICA_DB"):
+    DATABASES["replica"] = {
+        **DATABASES["default"],
+        "NAME": BASE_DIR / os.environ["BOOKING_REPLICA_DB"],
+        "TEST": {"MIRROR": "default"},
+    }
+
+DATABASE_ROUTERS = ["booking.routers.PrimaryReplicaRouter"]
+
+
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+# Any backend works for availability, e.g. django.core.cache.backends.redis.RedisCache
+# (configure maxmemory-policy allkeys-lru on the Redis side for LRU eviction).
+
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+    },
+    # Process local: with several worker processes use a shared backend (Redis,
+    # Memcached), as the version counters invalidating cached slots live here. Slot
+    # responses only carry an ETag with a shared backend.
+    "availability": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "availability",
+        "OPTIONS": {"MAX_ENTRIES": 10000},  # least recently used entries are evicted
+    },
+}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -121,3 +209,52 @@ STATIC_URL = "static/"
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
+
+
+# Booking
+# Longest date range /api/availability-range/ computes in one request
+
+BOOKING_AVAILABILITY_RANGE_MAX_DAYS = 31
+
+# Search horizon (days) and largest limit of /api/next-available/
+BOOKING_NEXT_AVAILABLE_MAX_DAYS = 90
+BOOKING_NEXT_AVAILABLE_MAX_LIMIT = 50
+
+# Most items /api/bookings/batch/ accepts in one request
+BOOKING_BATCH_MAX_ITEMS = 50
+
+# Most occurrences one recurring booking may create
+BOOKING_RECURRENCE_MAX_OCCURRENCES = 52
+
+# Cache alias and TTL (seconds) for computed slots
+BOOKING_AVAILABILITY_CACHE = "availability"
+BOOKING_AVAILABILITY_CACHE_TIMEOUT = 300
+
+# Pub/sub backend of the live slot events, and seconds between SSE keep-alive comments
+BOOKING_EVENTS_BROKER = "booking.events.InProcessBroker"
+BOOKING_EVENTS_HEARTBEAT = 15
+
+# Database aliases serving booking reads, and seconds a client keeps reading the
+# primary after one of its requests wrote
+BOOKING_READ_REPLICAS = [alias for alias in DATABASES if alias != "default"]
+BOOKING_PRIMARY_STICKY_SECONDS = 5
+
+# Notification outbox (run_outbox_worker): hours before a booking its reminder is due,
+# tries per email, seconds before the first retry (doubled for each further one) and
+# seconds a claimed email stays hidden from other workers
+BOOKING_REMINDER_HOURS = 24
+BOOKING_OUTBOX_MAX_ATTEMPTS = 5
+BOOKING_OUTBOX_RETRY_DELAY = 60
+BOOKING_OUTBOX_LEASE = 300
+
+# Minutes a slot reserved through /api/holds/ stays busy for other customers
+BOOKING_HOLD_MINUTES = 10
+
+# Longest date range /api/reports/utilization/ reports in one request
+BOOKING_REPORT_MAX_DAYS = 366
+
+# Most rows the Booking admin changelist counts for its page links
+BOOKING_ADMIN_COUNT_LIMIT = 10000
+
+# Per endpoint timings (Server-Timing header, booking.metrics log, /metrics)
+BOOKING_METRICS_ENABLED = True
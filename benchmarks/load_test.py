@@ -0,0 +1,91 @@
+"""
+Closed-loop HTTP load test for the booking APIs, using only the standard library.
+
+Compare the sync views under WSGI with the async views under ASGI, e.g.:
+
+    gunicorn appointment_system.wsgi -w 4 --threads 8 -b 127.0.0.1:8000
+    python benchmarks/load_test.py \
+        "http://127.0.0.1:8000/api/available-slots/?date=2025-08-04&service_id=1"
+
+    uvicorn appointment_system.asgi:application --workers 4 --port 8001
+    python benchmarks/load_test.py \
+        "http://127.0.0.1:8001/api/async/available-slots/?date=2025-08-04&service_id=1"
+"""
+
+import argparse
+import asyncio
+import json
+import statistics
+import time
+from urllib.parse import urlsplit
+
+
+async def fetch(host, port, request):
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        writer.write(request)
+        await writer.drain()
+        status_line = await reader.readline()
+        await reader.read()  # Connection: close, read until EOF
+        return int(status_line.split()[1])
+    finally:
+        writer.close()
+
+
+async def client(host, port, request, deadline, latencies, errors):
+    while time.perf_counter() < deadline:
+        started = time.perf_counter()
+        try:
+            status = await fetch(host, port, request)
+        except OSError:
+            status = None
+        if status == 200:
+            latencies.append(time.perf_counter() - started)
+        else:
+            errors.append(status)
+
+
+async def run(url, clients, duration):
+    parts = urlsplit(url)
+    path = parts.path + (f"?{parts.query}" if parts.query else "")
+    request = (
+        f"GET {path} HTTP/1.1\r\nHost: {parts.netloc}\r\nConnection: close\r\n\r\n"
+    ).encode()
+
+    latencies, errors = [], []
+    deadline = time.perf_counter() + duration
+    await asyncio.gather(
+        *(
+            client(
+                parts.hostname, parts.port or 80, request, deadline, latencies, errors
+            )
+            for _ in range(clients)
+        )
+    )
+
+    cuts = statistics.quantiles(latencies, n=100) if len(latencies) > 1 else [0] * 99
+    return {
+        "url": url,
+        "clients": clients,
+        "duration_s": duration,
+        "requests": len(latencies),
+        "errors": len(errors),
+        "requests_per_s": round(len(latencies) / duration, 1),
+        "p50_ms": round(cuts[49] * 1000, 2),
+        "p95_ms": round(cuts[94] * 1000, 2),
+        "p99_ms": round(cuts[98] * 1000, 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("url")
+    parser.add_argument("--clients", type=int, default=200)
+    parser.add_argument("--duration", type=float, default=30.0, help="Seconds")
+    args = parser.parse_args()
+
+    print(json.dumps(asyncio.run(run(args.url, args.clients, args.duration)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
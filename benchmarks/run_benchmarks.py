@@ -0,0 +1,180 @@
+"""
+Benchmarks the slot engine and booking writes at several synthetic data scales.
+
+Runs against a throwaway SQLite database, never the project database:
+
+    python benchmarks/run_benchmarks.py --output bench.json
+    python benchmarks/run_benchmarks.py --scales small --iterations 20
+
+Each scenario reports latency percentiles and the mean number of queries.
+The JSON output includes the git commit so runs can be compared between commits.
+"""
+
+import argparse
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time as timer
+from datetime import time, timedelta
+from io import StringIO
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+
+SCALES = {
+    "small": {"staff": 5, "services": 5, "days": 30, "bookings_per_day": 3},
+    "medium": {"staff": 20, "services": 10, "days": 60, "bookings_per_day": 8},
+    "large": {"staff": 50, "services": 20, "days": 90, "bookings_per_day": 15},
+}
+
+
+def setup_django(database_path):
+    sys.path.insert(0, str(BASE_DIR))
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "appointment_system.settings")
+
+    from django.conf import settings
+
+    settings.DATABASES["default"]["NAME"] = database_path
+    settings.BOOKING_METRICS_ENABLED = False
+    # Computed slots expire immediately, so every call measures a cache miss
+    settings.BOOKING_AVAILABILITY_CACHE_TIMEOUT = 0
+
+    import django
+
+    django.setup()
+
+
+def measure(func, iterations):
+    """
+    Calls func once per iteration, counting queries with the metrics query wrapper.
+    """
+    from booking import metrics
+
+    latencies, queries = [], []
+    for iteration in range(iterations):
+        request_metrics = metrics.RequestMetrics()
+        token = metrics.current_request.set(request_metrics)
+        started = timer.perf_counter()
+        try:
+            func(iteration)
+        finally:
+            latencies.append(timer.perf_counter() - started)
+            metrics.current_request.reset(token)
+        queries.append(request_metrics.db_queries)
+
+    cuts = statistics.quantiles(latencies, n=100) if iterations > 1 else latencies * 99
+    return {
+        "iterations": iterations,
+        "mean_ms": round(statistics.fmean(latencies) * 1000, 3),
+        "p50_ms": round(cuts[49] * 1000, 3),
+        "p95_ms": round(cuts[94] * 1000, 3),
+        "p99_ms": round(cuts[98] * 1000, 3),
+        "mean_queries": round(statistics.fmean(queries), 2),
+    }
+
+
+def run_scale(name, scale, iterations):
+    from django.core.management import call_command
+    from django.utils import timezone
+
+    from booking.models import Service, Staff
+    from booking.utils import (
+        create_booking,
+        get_available_slots,
+        get_available_slots_by_staff,
+        iter_available_slots_by_staff,
+    )
+
+    # Start tomorrow so no slot is filtered by the current time
+    start = timezone.localdate() + timedelta(days=1)
+    call_command(
+        "seed_synthetic",
+        clear=True,
+        start=start.isoformat(),
+        stdout=StringIO(),
+        **scale
+    )
+
+    rng = random.Random(0)
+    services = list(Service.objects.all())
+    staff_members = list(Staff.objects.all())
+
+    def random_day():
+        return start + timedelta(days=rng.randrange(scale["days"]))
+
+    def book(iteration):
+        service = rng.choice(services)
+        staff = rng.choice(staff_members)
+        day = random_day()
+        start_time = time(rng.randrange(9, 17), rng.randrange(0, 60, 5))
+        try:
+            create_booking(
+                service, "Bench", "bench@example.com", day, start_time, staff
+            )
+        except Exception:
+            pass  # Conflicting attempts are part of the workload
+
+    scenarios = {
+        "single_day_slots": lambda i: get_available_slots(
+            random_day(), rng.choice(services).id, rng.choice(staff_members)
+        ),
+        "multi_staff_slots": lambda i: get_available_slots_by_staff(
+            random_day(), rng.choice(services)
+        ),
+        "date_range_slots": lambda i: list(
+            iter_available_slots_by_staff(
+                start, start + timedelta(days=30), rng.choice(services)
+            )
+        ),
+        "create_booking": book,
+    }
+    return {
+        "scale": name,
+        "parameters": scale,
+        "scenarios": {
+            scenario: measure(func, iterations) for scenario, func in scenarios.items()
+        },
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--scales", nargs="+", choices=SCALES, default=list(SCALES))
+    parser.add_argument("--iterations", type=int, default=50)
+    parser.add_argument("--output", help="JSON file to write, default stdout")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        setup_django(str(Path(directory) / "bench.sqlite3"))
+
+        from django.core.management import call_command
+
+        call_command("migrate", verbosity=0)
+
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=BASE_DIR,
+            capture_output=True,
+            text=True,
+        ).stdout.strip()
+        results = {
+            "commit": commit or None,
+            "python": sys.version.split()[0],
+            "results": [
+                run_scale(name, SCALES[name], args.iterations) for name in args.scales
+            ],
+        }
+
+    output = json.dumps(results, indent=2)
+    if args.output:
+        Path(args.output).write_text(output + "\n")
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+"""
+Benchmarks fan-out of live slot events to thousands of idle SSE subscribers.
+
+Subscribers wait on one event loop, spread over --days date channels, while a
+separate thread publishes booking frames the way request threads do:
+
+    python benchmarks/sse_fanout.py --subscribers 1000 5000 10000 --output fanout.json
+
+Each run reports the publish call cost, the delay until every subscriber of the
+channel received the frame, and the memory held per idle subscriber.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import time as timer
+import tracemalloc
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+
+
+def setup_django():
+    sys.path.insert(0, str(BASE_DIR))
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "appointment_system.settings")
+
+    import django
+
+    django.setup()
+
+
+async def run(subscriber_count, days, events_count):
+    from booking import events
+
+    broker = events.InProcessBroker()
+    channels = [f"slots:day-{day}" for day in range(days)]
+
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    subscriptions = [
+        broker.subscribe(channels[number % days]) for number in range(subscriber_count)
+    ]
+    received = {channel: 0 for channel in channels}
+    all_received = asyncio.Event()
+    expected = {"channel": None, "count": 0}
+
+    async def listen(subscription):
+        while True:
+            await subscription.next()
+            received[subscription.channel] += 1
+            if (
+                subscription.channel == expected["channel"]
+                and received[subscription.channel] == expected["count"]
+            ):
+                all_received.set()
+
+    listeners = [
+        asyncio.ensure_future(listen(subscription)) for subscription in subscriptions
+    ]
+    await asyncio.sleep(0)
+    per_subscriber = (tracemalloc.get_traced_memory()[0] - before) / subscriber_count
+    tracemalloc.stop()
+
+    frame = events.format_frame(
+        "taken",
+        {
+            "date": "2030-01-01",
+            "staff_id": 1,
+            "start_time": "09:00",
+            "end_time": "09:30",
+        },
+    )
+    counts = {channel: 0 for channel in channels}
+    for subscription in subscriptions:
+        counts[subscription.channel] += 1
+
+    publish_times, delivery_times = [], []
+    loop = asyncio.get_running_loop()
+    for number in range(events_count):
+        channel = channels[number % days]
+        all_received.clear()
+        expected.update(channel=channel, count=received[channel] + counts[channel])
+
+        started = timer.perf_counter()
+        publish_times.append(
+            await loop.run_in_executor(None, _publish, broker, channel, frame)
+        )
+        await all_received.wait()
+        delivery_times.append(timer.perf_counter() - started)
+
+    for listener in listeners:
+        listener.cancel()
+    await asyncio.gather(*listeners, return_exceptions=True)
+    for subscription in subscriptions:
+        broker.unsubscribe(subscription)
+
+    return {
+        "subscribers": subscriber_count,
+        "channels": days,
+        "events": events_count,
+        "publish_mean_us": round(statistics.fmean(publish_times) * 1e6, 1),
+        "delivery_p50_ms": round(statistics.median(delivery_times) * 1000, 3),
+        "delivery_max_ms": round(max(delivery_times) * 1000, 3),
+        "memory_per_subscriber_bytes": round(per_subscriber),
+    }
+
+
+def _publish(broker, channel, frame):
+    started = timer.perf_counter()
+    broker.publish(channel, frame)
+    return timer.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument(
+        "--subscribers", nargs="+", type=int, default=[1000, 5000, 10000]
+    )
+    parser.add_argument(
+        "--days", type=int, default=30, help="Date channels to spread subscribers over"
+    )
+    parser.add_argument("--events", type=int, default=200)
+    parser.add_argument("--output", help="JSON file to write, default stdout")
+    args = parser.parse_args()
+
+    setup_django()
+    results = {
+        "python": sys.version.split()[0],
+        "results": [
+            asyncio.run(run(count, args.days, args.events))
+            for count in args.subscribers
+        ],
+    }
+
+    output = json.dumps(results, indent=2)
+    if args.output:
+        Path(args.output).write_text(output + "\n")
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,162 @@
+"""
+Stress tests concurrent booking writes under each SQLite database profile.
+
+Every profile runs in its own process against a throwaway SQLite file. Threads read
+availability, book distinct, non-overlapping slots and then edit the booking in a
+read-then-write transaction like the admin change form, so every failed write is a
+locking error rather than a conflict:
+
+    python benchmarks/write_stress.py --profiles development sqlite --threads 16
+
+Each run reports the bookings made, the "database is locked" errors and the throughput.
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time as timer
+from concurrent.futures import ThreadPoolExecutor
+from datetime import time, timedelta
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+
+
+def setup_django(database_path):
+    sys.path.insert(0, str(BASE_DIR))
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "appointment_system.settings")
+
+    from django.conf import settings
+
+    settings.DATABASES["default"]["NAME"] = database_path
+    settings.BOOKING_METRICS_ENABLED = False
+    # Every read computes the day from the database
+    settings.BOOKING_AVAILABILITY_CACHE_TIMEOUT = 0
+
+    import django
+
+    django.setup()
+
+
+def run(threads, bookings):
+    from django.core.management import call_command
+    from django.db import OperationalError, connection, transaction
+    from django.utils import timezone
+
+    from booking.models import AvailabilityRule, Booking, Service, Staff
+    from booking.utils import create_booking, get_available_slots
+
+    call_command("migrate", verbosity=0)
+    service = Service.objects.create(name="Stress", duration_minutes=25, price=10)
+    staff_members = [
+        Staff.objects.create(name=f"Staff {number}") for number in range(8)
+    ]
+    AvailabilityRule.objects.bulk_create(
+        AvailabilityRule(
+            staff=staff,
+            day_of_week=weekday,
+            start_time=time(8, 0),
+            end_time=time(20, 0),
+        )
+        for staff in staff_members
+        for weekday in range(7)
+    )
+
+    # 24 half hour slots a day, spread over staff and days so no two bookings overlap
+    start = timezone.localdate() + timedelta(days=1)
+    work = [
+        (
+            staff_members[number % len(staff_members)],
+            start + timedelta(days=number // (len(staff_members) * 24)),
+            time(
+                8 + number // len(staff_members) % 24 // 2,
+                30 * (number // len(staff_members) % 2),
+            ),
+        )
+        for number in range(bookings)
+    ]
+
+    def attempt(job):
+        staff, day, start_time = job
+        try:
+            get_available_slots(day, service.id, staff)
+            booking = create_booking(
+                service, "Stress", "stress@example.com", day, start_time, staff
+            )
+            with transaction.atomic():
+                booking = Booking.objects.get(pk=booking.pk)
+                booking.customer_name = "Stress edited"
+                booking.save()
+            return "booked"
+        except OperationalError as e:
+            return "locked" if "locked" in str(e) else "error"
+        except Exception:
+            return "rejected"
+        finally:
+            connection.close()
+
+    started = timer.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        outcomes = list(pool.map(attempt, work))
+    elapsed = timer.perf_counter() - started
+
+    return {
+        "threads": threads,
+        "attempts": bookings,
+        "booked_and_edited": outcomes.count("booked"),
+        "locked_errors": outcomes.count("locked"),
+        "other_errors": outcomes.count("error") + outcomes.count("rejected"),
+        "bookings_per_sec": round(outcomes.count("booked") / elapsed, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument(
+        "--profiles",
+        nargs="+",
+        choices=["development", "sqlite"],
+        default=["development", "sqlite"],
+    )
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--bookings", type=int, default=400)
+    parser.add_argument("--output", help="JSON file to write, default stdout")
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        with tempfile.TemporaryDirectory() as directory:
+            setup_django(str(Path(directory) / "stress.sqlite3"))
+            print(json.dumps(run(args.threads, args.bookings)))
+        return
+
+    # Settings are read once per process, so each profile gets its own
+    results = {"python": sys.version.split()[0], "results": []}
+    for profile in args.profiles:
+        worker = subprocess.run(
+            [
+                sys.executable,
+                __file__,
+                "--worker",
+                f"--threads={args.threads}",
+                f"--bookings={args.bookings}",
+            ],
+            env={**os.environ, "BOOKING_DB_PROFILE": profile},
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+        results["results"].append({"profile": profile, **json.loads(worker.stdout)})
+
+    output = json.dumps(results, indent=2)
+    if args.output:
+        Path(args.output).write_text(output + "\n")
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
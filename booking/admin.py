@@ -1,5 +1,117 @@
+from datetime import date, time, timedelta
+from itertools import groupby
+
+from django.conf import settings
 from django.contrib import admin
-from .models import Service, Staff, AvailabilityRule, Booking
+from django.core.exceptions import PermissionDenied
+from django.core.paginator import Paginator
+from django.db import connections
+from django.template.response import TemplateResponse
+from django.urls import path
+from django.utils import timezone
+from django.utils.functional import cached_property
+
+from . import schedule
+from .models import (
+    AvailabilityException,
+    AvailabilityRule,
+    Booking,
+    BookingHistory,
+    NotificationOutbox,
+    Recurrence,
+    Service,
+    Staff,
+    StaffService,
+)
+
+
+# Bulk updates skip model signals, so they invalidate cached availability themselves
+@admin.action(description="Mark selected as active")
+def make_active(modeladmin, request, queryset):
+    queryset.update(is_active=True)
+    schedule.invalidate_schedules()
+
+
+@admin.action(description="Mark selected as inactive")
+def make_inactive(modeladmin, request, queryset):
+    queryset.update(is_active=False)
+    schedule.invalidate_schedules()
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Counts at most BOOKING_ADMIN_COUNT_LIMIT rows instead of the whole table, and on
+    PostgreSQL takes the planner's row estimate for the unfiltered table. Rows past
+    the limit are reached by narrowing the list with the date hierarchy or filters.
+    """
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        connection = connections[queryset.db]
+        if connection.vendor == "postgresql" and not queryset.query.where:
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    "SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass",
+                    [queryset.model._meta.db_table],
+                )
+                estimate = cursor.fetchone()[0]
+            # -1 until the table is first analyzed
+            if estimate > 0:
+                return estimate
+        return queryset[: settings.BOOKING_ADMIN_COUNT_LIMIT].count()
+
+
+def _minutes(value):
+    return value.hour * 60 + value.minute
+
+
+def timeline_rows(day):
+    """
+    Per active staff member working on day: their working windows and bookings, as
+    minutes of the day. Anyone else with bookings that day is shown without windows.
+    """
+    exceptions = schedule.ExceptionCalendar(schedule.exceptions_between(day, day))
+    schedules = dict(schedule.get_schedules())
+    for staff_id, staff in exceptions.open_staff().items():
+        schedules.setdefault(staff_id, schedule.StaffSchedule(staff, []))
+
+    rows = {}
+    for staff_id, staff_schedule in schedules.items():
+        windows = exceptions.windows(
+            staff_id, day, staff_schedule.windows(day.weekday())
+        )
+        if windows and staff_schedule.staff.is_active:
+            rows[staff_id] = {
+                "staff": staff_schedule.staff,
+                "windows": [
+                    (_minutes(window.start_time), _minutes(window.end_time))
+                    for window in windows
+                ],
+                "bookings": [],
+            }
+
+    bookings = (
+        BookingHistory.objects.filter(date=day)
+        .select_related("service", "staff")
+        .order_by("staff_id", "start_time")
+    )
+    for staff_id, staff_bookings in groupby(
+        bookings, key=lambda booking: booking.staff_id
+    ):
+        staff_bookings = list(staff_bookings)
+        row = rows.setdefault(
+            staff_id, {"staff": staff_bookings[0].staff, "windows": [], "bookings": []}
+        )
+        row["bookings"] = staff_bookings
+
+    for row in rows.values():
+        row["working_minutes"] = sum(end - start for start, end in row["windows"])
+        row["booked_minutes"] = sum(
+            _minutes(booking.end_time) - _minutes(booking.start_time)
+            for booking in row["bookings"]
+        )
+    return sorted(rows.values(), key=lambda row: row["staff"].name)
 
 
 @admin.register(Service)
@@ -9,15 +121,37 @@ class ServiceAdmin(admin.ModelAdmin):
     list_editable = ("price",)
 
 
+# Inline rows show str(obj), which reads the related names
 class AvailabilityInline(admin.TabularInline):
     model = AvailabilityRule
     extra = 0
 
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related("staff")
+
+
+class StaffServiceInline(admin.TabularInline):
+    model = StaffService
+    extra = 0
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related("staff", "service")
+
+    def formfield_for_foreignkey(self, db_field, request, **kwargs):
+        formfield = super().formfield_for_foreignkey(db_field, request, **kwargs)
+        if db_field.name == "service":
+            # Loaded once per request, otherwise the select of every row queries them
+            if not hasattr(request, "_service_choices"):
+                request._service_choices = [choice for choice in formfield.choices]
+            formfield.choices = request._service_choices
+        return formfield
+
 
 @admin.register(Staff)
 class StaffAdmin(admin.ModelAdmin):
-    inlines = [AvailabilityInline]
+    inlines = [AvailabilityInline, StaffServiceInline]
     list_display = ("name", "email", "is_active")
+    actions = [make_active, make_inactive]
     list_filter = ("is_active",)
     search_fields = ("name", "email")
 
@@ -25,13 +159,160 @@ class StaffAdmin(admin.ModelAdmin):
 @admin.register(AvailabilityRule)
 class AvailabilityRuleAdmin(admin.ModelAdmin):
     list_display = ("staff", "day_of_week", "start_time", "end_time", "is_active")
+    list_select_related = ("staff",)
     list_filter = ("day_of_week", "is_active")
+    actions = [make_active, make_inactive]
     search_fields = ("staff__name",)
 
 
+@admin.register(AvailabilityException)
+class AvailabilityExceptionAdmin(admin.ModelAdmin):
+    list_display = (
+        "staff",
+        "kind",
+        "start_date",
+        "end_date",
+        "start_time",
+        "end_time",
+        "reason",
+    )
+    list_select_related = ("staff",)
+    list_filter = ("kind", "staff")
+    date_hierarchy = "start_date"
+    search_fields = ("reason", "staff__name")
+
+
 @admin.register(Booking)
 class BookingAdmin(admin.ModelAdmin):
     list_display = ("customer_name", "service", "staff", "date", "start_time")
-    list_filter = ("date", "staff", "service")
+    list_select_related = ("service", "staff")
+    list_filter = ("staff", "service")
+    date_hierarchy = "date"
+    ordering = ("-date", "-start_time")
+    search_fields = ("customer_name", "customer_email")
+    readonly_fields = ("end_time", "price", "created_at")
+    raw_id_fields = ("recurrence",)
+    paginator = EstimatedCountPaginator
+    # Skips the second COUNT(*) of the whole table on filtered pages
+    show_full_result_count = False
+
+    def get_urls(self):
+        return [
+            path(
+                "timeline/",
+                self.admin_site.admin_view(self.timeline_view),
+                name="booking_booking_timeline",
+            ),
+            *super().get_urls(),
+        ]
+
+    def timeline_view(self, request):
+        """
+        Bookings of one day laid out over the working windows of each staff member.
+        """
+        if not self.has_view_permission(request):
+            raise PermissionDenied
+        try:
+            day = date.fromisoformat(request.GET["date"])
+        except (KeyError, ValueError):
+            day = timezone.localdate()
+
+        rows = timeline_rows(day)
+        spans = [span for row in rows for span in row["windows"]] + [
+            (_minutes(booking.start_time), _minutes(booking.end_time))
+            for row in rows
+            for booking in row["bookings"]
+        ]
+        first_hour = min((start for start, _ in spans), default=9 * 60) // 60
+        last_hour = -(-max((end for _, end in spans), default=17 * 60) // 60)
+        day_start, length = first_hour * 60, (last_hour - first_hour) * 60
+
+        def position(start, end):
+            return {
+                "left": round((start - day_start) * 100 / length, 3),
+                "width": round((end - start) * 100 / length, 3),
+            }
+
+        for row in rows:
+            row["window_positions"] = [position(*window) for window in row["windows"]]
+            row["booking_positions"] = [
+                (
+                    booking,
+                    position(_minutes(booking.start_time), _minutes(booking.end_time)),
+                )
+                for booking in row["bookings"]
+            ]
+        context = {
+            **self.admin_site.each_context(request),
+            "opts": self.model._meta,
+            "title": f"Timeline for {day:%A, %d %B %Y}",
+            "day": day,
+            "previous_day": day - timedelta(days=1),
+            "next_day": day + timedelta(days=1),
+            "hours": [
+                {
+                    "label": time(hour).strftime("%H:%M"),
+                    **position(hour * 60, (hour + 1) * 60),
+                }
+                for hour in range(first_hour, last_hour)
+            ],
+            "rows": rows,
+        }
+        return TemplateResponse(request, "admin/booking/booking/timeline.html", context)
+
+
+@admin.register(BookingHistory)
+class BookingHistoryAdmin(admin.ModelAdmin):
+    """
+    Live and archived bookings together, read only; live ones are edited as Bookings.
+    """
+
+    list_display = (
+        "customer_name",
+        "service",
+        "staff",
+        "date",
+        "start_time",
+        "archived",
+    )
+    list_select_related = ("service", "staff")
+    list_filter = ("archived", "staff", "service")
+    date_hierarchy = "date"
+    ordering = ("-date", "-start_time")
+    search_fields = ("customer_name", "customer_email")
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(Recurrence)
+class RecurrenceAdmin(admin.ModelAdmin):
+    list_display = (
+        "customer_name",
+        "service",
+        "staff",
+        "frequency",
+        "start_date",
+        "start_time",
+    )
+    list_select_related = ("service", "staff")
+    list_filter = ("frequency", "staff", "service")
     search_fields = ("customer_name", "customer_email")
-    readonly_fields = ("created_at",)
+
+
+@admin.register(NotificationOutbox)
+class NotificationOutboxAdmin(admin.ModelAdmin):
+    list_display = ("booking", "kind", "status", "attempts", "available_at", "sent_at")
+    list_select_related = ("booking__service",)
+    list_filter = ("status", "kind")
+    date_hierarchy = "available_at"
+    raw_id_fields = ("booking",)
+    readonly_fields = ("created_at", "sent_at", "last_error")
@@ -0,0 +1,191 @@
+import time
+from threading import Lock
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import transaction
+
+# Version counters that make up the availability cache keys.
+# "schedule" covers services, staff, the skill matrix, availability rules and
+# exceptions, which change rarely and affect every date. "day" and "staff_day"
+# cover bookings of one date.
+SCHEDULE_VERSION_KEY = "availability:v:schedule"
+# Timestamp of the earliest slot hold expiry, after which a write releases holds.
+# The same per day and staff-day tell reads which cached slots are stale.
+HOLDS_EXPIRY_KEY = "availability:holds:next_expiry"
+
+_stats = {"hits": 0, "misses": 0}
+_stats_lock = Lock()
+
+
+def get_cache():
+    return caches[settings.BOOKING_AVAILABILITY_CACHE]
+
+
+def is_shared():
+    """False for backends whose version counters other worker processes never see."""
+    return not isinstance(get_cache(), (LocMemCache, DummyCache))
+
+
+def _day_version_key(date):
+    return f"availability:v:day:{date.isoformat()}"
+
+
+def _staff_day_version_key(staff_id, date):
+    return f"availability:v:staff_day:{staff_id}:{date.isoformat()}"
+
+
+def _day_expiry_key(date):
+    return f"availability:holds:day:{date.isoformat()}"
+
+
+def _staff_day_expiry_key(staff_id, date):
+    return f"availability:holds:staff_day:{staff_id}:{date.isoformat()}"
+
+
+def _get_versions(version_keys, expiry_key):
+    """
+    Reads version counters in one round trip, or None while a hold of expiry_key has
+    expired unreleased. Missing counters (never bumped or evicted) are seeded with the
+    current time so an old entry can never match again.
+    """
+    cache = get_cache()
+    versions = cache.get_many([*version_keys, expiry_key])
+    expiry = versions.get(expiry_key)
+    if expiry is not None and expiry <= time.time():
+        return None
+    for key in version_keys:
+        if key not in versions:
+            cache.add(key, time.time_ns(), timeout=None)
+            versions[key] = cache.get(key)
+    return ".".join(str(versions[key]) for key in version_keys)
+
+
+def _bump(key):
+    """Increments a version counter and returns its new value."""
+    cache = get_cache()
+    try:
+        return cache.incr(key)
+    except ValueError:
+        version = time.time_ns()
+        cache.set(key, version, timeout=None)
+        return version
+
+
+# Slot keys are None while the staff-day or day has an expired hold, until it is
+# released cached slots may still count it
+def staff_slots_key(service_id, staff_id, date):
+    versions = _get_versions(
+        [SCHEDULE_VERSION_KEY, _staff_day_version_key(staff_id, date)],
+        _staff_day_expiry_key(staff_id, date),
+    )
+    if versions is None:
+        return None
+    return f"availability:slots:{service_id}:{staff_id}:{date.isoformat()}:{versions}"
+
+
+def day_slots_key(service_id, date):
+    versions = day_version(date)
+    if versions is None:
+        return None
+    return f"availability:day_slots:{service_id}:{date.isoformat()}:{versions}"
+
+
+def day_version(date):
+    """Changes whenever anything affecting the availability of date changes."""
+    return _get_versions(
+        [SCHEDULE_VERSION_KEY, _day_version_key(date)], _day_expiry_key(date)
+    )
+
+
+def get_slots(key):
+    value = None if key is None else get_cache().get(key)
+    with _stats_lock:
+        _stats["hits" if value is not None else "misses"] += 1
+    return value
+
+
+def set_slots(key, value):
+    if key is not None:
+        get_cache().set(key, value, timeout=settings.BOOKING_AVAILABILITY_CACHE_TIMEOUT)
+
+
+def _bump_staff_day(staff_id, date):
+    _bump(_staff_day_version_key(staff_id, date))
+    _bump(_day_version_key(date))
+
+
+def invalidate_staff_day(staff_id, date):
+    """
+    Called when a booking of staff_id on date is created, changed or removed.
+    Bumps now and again once the transaction commits: a read between the two
+    still sees the old rows and may cache them under the first bump.
+    """
+    _bump_staff_day(staff_id, date)
+    transaction.on_commit(lambda: _bump_staff_day(staff_id, date))
+
+
+def invalidate_schedule():
+    """
+    Called when services, staff, qualifications, availability rules or exceptions
+    change. Bumps now and again once the transaction commits, like
+    invalidate_staff_day.
+    """
+    _bump(SCHEDULE_VERSION_KEY)
+    transaction.on_commit(lambda: _bump(SCHEDULE_VERSION_KEY))
+
+
+def note_hold_expiry(staff_id, date, expires_at):
+    """Called when a slot hold is created, so reads know when its slot frees up."""
+    cache = get_cache()
+    keys = [
+        HOLDS_EXPIRY_KEY,
+        _day_expiry_key(date),
+        _staff_day_expiry_key(staff_id, date),
+    ]
+    expiries = cache.get_many(keys)
+    for key in keys:
+        if key not in expiries or expires_at.timestamp() < expiries[key]:
+            cache.set(key, expires_at.timestamp(), timeout=None)
+
+
+def set_next_hold_expiry(expires_at, released, remaining):
+    """
+    Called after the expired holds of the (staff_id, date) pairs in released were
+    deleted, with the next expiry or None and the remaining holds' (staff_id, date,
+    expires_at).
+    """
+    cache = get_cache()
+    if expires_at is None:
+        cache.delete(HOLDS_EXPIRY_KEY)
+    else:
+        cache.set(HOLDS_EXPIRY_KEY, expires_at.timestamp(), timeout=None)
+    cache.delete_many(
+        [_staff_day_expiry_key(staff_id, date) for staff_id, date in released]
+        + [_day_expiry_key(date) for _, date in released]
+    )
+    for staff_id, date, expires_at in remaining:
+        note_hold_expiry(staff_id, date, expires_at)
+
+
+def holds_expired():
+    """
+    True once a slot hold may have expired since the last release. An evicted expiry
+    reads as nothing due: slot queries skip expired holds anyway, so at worst cached
+    slots stay stale for BOOKING_AVAILABILITY_CACHE_TIMEOUT.
+    """
+    next_expiry = get_cache().get(HOLDS_EXPIRY_KEY)
+    return next_expiry is not None and next_expiry <= time.time()
+
+
+def stats():
+    """Returns process wide hit/miss counters of the availability cache."""
+    with _stats_lock:
+        return dict(_stats)
+
+
+def reset_stats():
+    with _stats_lock:
+        _stats.update(hits=0, misses=0)
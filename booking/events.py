@@ -0,0 +1,130 @@
+import asyncio
+import json
+from functools import lru_cache
+from threading import Lock
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+# Frames waiting for a slow client before it is told to resync instead
+SUBSCRIPTION_QUEUE_SIZE = 100
+
+RESYNC_FRAME = "event: resync\ndata: {}\n\n"
+
+
+class Subscription:
+    """
+    One subscriber's queue of SSE frames, owned by the event loop it was created on.
+    """
+
+    def __init__(self, channel):
+        self.channel = channel
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(maxsize=SUBSCRIPTION_QUEUE_SIZE)
+        self.overflowed = False
+
+    def deliver(self, frame):
+        """Runs on self.loop."""
+        try:
+            self.queue.put_nowait(frame)
+        except asyncio.QueueFull:
+            self.overflowed = True
+
+    async def next(self, timeout=None):
+        """Next frame, or None when nothing arrived within timeout seconds."""
+        if self.overflowed:
+            # Dropped frames cannot be replayed, the client refetches the day instead
+            self.overflowed = False
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            return RESYNC_FRAME
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+
+class InProcessBroker:
+    """
+    Pub/sub between the threads and event loops of one process. Deployments running
+    several ASGI processes need a backend with the same three methods over a shared
+    channel (e.g. Redis pub/sub), set with BOOKING_EVENTS_BROKER.
+    """
+
+    def __init__(self):
+        # {channel: {event loop: set of subscriptions}}
+        self.channels = {}
+        self.lock = Lock()
+
+    def subscribe(self, channel):
+        subscription = Subscription(channel)
+        with self.lock:
+            loops = self.channels.setdefault(channel, {})
+            loops.setdefault(subscription.loop, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self.lock:
+            loops = self.channels.get(subscription.channel, {})
+            subscriptions = loops.get(subscription.loop, set())
+            subscriptions.discard(subscription)
+            if not subscriptions:
+                loops.pop(subscription.loop, None)
+            if not loops:
+                self.channels.pop(subscription.channel, None)
+
+    def publish(self, channel, frame):
+        """
+        Safe to call from any thread. Costs one loop wakeup per event loop, not per
+        subscriber.
+        """
+        with self.lock:
+            targets = [
+                (loop, list(subscriptions))
+                for loop, subscriptions in self.channels.get(channel, {}).items()
+            ]
+        for loop, subscriptions in targets:
+            try:
+                loop.call_soon_threadsafe(_deliver_all, subscriptions, frame)
+            except RuntimeError:
+                pass  # The loop was closed, its subscribers are gone
+
+
+def _deliver_all(subscriptions, frame):
+    for subscription in subscriptions:
+        subscription.deliver(frame)
+
+
+@lru_cache(maxsize=None)
+def get_broker():
+    return import_string(settings.BOOKING_EVENTS_BROKER)()
+
+
+def day_channel(date):
+    return f"slots:{date.isoformat()}"
+
+
+def format_frame(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+def publish_bookings(event, bookings):
+    """
+    Tells subscribers of each booking's date that its interval was "taken" or
+    "released". A taken interval is a delta clients apply themselves, so nobody
+    re-queries the day.
+    """
+    broker = get_broker()
+    for booking in bookings:
+        broker.publish(
+            day_channel(booking.date),
+            format_frame(
+                event,
+                {
+                    "date": booking.date.isoformat(),
+                    "staff_id": booking.staff_id,
+                    "start_time": booking.start_time.strftime("%H:%M"),
+                    "end_time": booking.end_time.strftime("%H:%M"),
+                },
+            ),
+        )
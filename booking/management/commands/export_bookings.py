@@ -0,0 +1,86 @@
+import csv
+import json
+import time
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+
+from booking.models import BookingHistory
+
+FIELDS = [
+    "id",
+    "service_id",
+    "staff_id",
+    "customer_name",
+    "customer_email",
+    "date",
+    "start_time",
+    "end_time",
+]
+
+
+class Command(BaseCommand):
+    help = (
+        "Exports live and archived bookings as CSV or NDJSON, streaming rows in chunks."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--output", default="-", help="File to write, - for stdout")
+        parser.add_argument("--format", choices=["csv", "ndjson"], default="csv")
+        parser.add_argument("--from", dest="from_date", help="First date, YYYY-MM-DD")
+        parser.add_argument("--to", dest="to_date", help="Last date, YYYY-MM-DD")
+        parser.add_argument("--chunk-size", type=int, default=2000)
+
+    def handle(self, *args, **options):
+        try:
+            from_date, to_date = (
+                (
+                    datetime.strptime(options[name], "%Y-%m-%d").date()
+                    if options[name]
+                    else None
+                )
+                for name in ("from_date", "to_date")
+            )
+        except ValueError:
+            raise CommandError("Dates must be YYYY-MM-DD")
+
+        bookings = BookingHistory.objects.order_by("date", "staff_id", "start_time")
+        if from_date:
+            bookings = bookings.filter(date__gte=from_date)
+        if to_date:
+            bookings = bookings.filter(date__lte=to_date)
+
+        output = (
+            self.stdout
+            if options["output"] == "-"
+            else open(options["output"], "w", newline="")
+        )
+        exported = 0
+        started = time.perf_counter()
+
+        try:
+            writer = csv.writer(output) if options["format"] == "csv" else None
+            if writer:
+                writer.writerow(FIELDS)
+
+            for row in bookings.values_list(*FIELDS).iterator(
+                chunk_size=options["chunk_size"]
+            ):
+                row = [
+                    value.isoformat() if hasattr(value, "isoformat") else value
+                    for value in row
+                ]
+                if writer:
+                    writer.writerow(row)
+                else:
+                    output.write(json.dumps(dict(zip(FIELDS, row))) + "\n")
+                exported += 1
+        finally:
+            if output is not self.stdout:
+                output.close()
+
+        elapsed = time.perf_counter() - started
+        self.stderr.write(
+            f"Exported {exported} bookings in {elapsed:.2f}s "
+            f"({exported / elapsed if elapsed else 0:.0f} rows/sec)"
+        )
@@ -0,0 +1,217 @@
+import csv
+import json
+import sys
+import time
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from booking import cache as availability_cache
+from booking import events, rollups, routers, schedule
+from booking.models import Booking, Service, Staff
+from booking.utils import IntervalIndex, busy_intervals
+
+FIELDS = [
+    "service_id",
+    "staff_id",
+    "customer_name",
+    "customer_email",
+    "date",
+    "start_time",
+]
+
+
+class Command(BaseCommand):
+    help = "Imports bookings from a CSV or NDJSON file, rejecting rows that overlap."
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="File to import, or - for stdin")
+        parser.add_argument("--format", choices=["csv", "ndjson"])
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    @routers.use_primary()
+    def handle(self, *args, **options):
+        file_format = options["format"] or (
+            "ndjson" if options["path"].endswith((".ndjson", ".jsonl")) else "csv"
+        )
+        batch_size = options["batch_size"]
+        if batch_size < 1:
+            raise CommandError("--batch-size must be positive")
+
+        self.services = Service.objects.in_bulk()
+        self.staff_ids = set(Staff.objects.values_list("id", flat=True))
+        self.indexes = {}
+        self.rejected = []
+        imported = 0
+        started = time.perf_counter()
+
+        source = (
+            sys.stdin if options["path"] == "-" else open(options["path"], newline="")
+        )
+        with source:
+            rows = csv.DictReader(source) if file_format == "csv" else source
+            self.decode = dict if file_format == "csv" else self.decode_line
+            batch = []
+            for line_number, row in enumerate(rows, start=1):
+                if file_format == "ndjson" and not row.strip():
+                    continue
+                batch.append((line_number, row))
+                if len(batch) == batch_size:
+                    imported += self.import_batch(batch)
+                    batch = []
+            imported += self.import_batch(batch)
+
+        elapsed = time.perf_counter() - started
+        for line_number, reason in self.rejected[:20]:
+            self.stderr.write(f"Row {line_number}: {reason}")
+        if len(self.rejected) > 20:
+            self.stderr.write(f"... and {len(self.rejected) - 20} more rejected rows")
+
+        total = imported + len(self.rejected)
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Imported {imported} bookings, rejected {len(self.rejected)} "
+                f"in {elapsed:.2f}s ({total / elapsed if elapsed else 0:.0f} rows/sec)"
+            )
+        )
+
+    def import_batch(self, batch):
+        parsed = []
+        for line_number, row in batch:
+            try:
+                parsed.append(
+                    (line_number, self.parse_row(line_number, self.decode(row)))
+                )
+            except ValueError as e:
+                self.rejected.append((line_number, str(e)))
+
+        with transaction.atomic():
+            qualifications = schedule.load_qualifications(
+                {booking.staff_id for _, booking in parsed}
+            )
+            timed = []
+            for line_number, booking in parsed:
+                if not qualifications.is_qualified(
+                    booking.staff_id, booking.service_id
+                ):
+                    self.rejected.append(
+                        (line_number, "staff does not offer this service")
+                    )
+                    continue
+                booking.end_time = Booking.compute_end_time(
+                    booking.service,
+                    booking.date,
+                    booking.start_time,
+                    booking.staff_id,
+                    qualifications,
+                )
+                if booking.end_time < booking.start_time:
+                    self.rejected.append((line_number, "booking runs past midnight"))
+                    continue
+                timed.append((line_number, booking))
+
+            self.load_existing(
+                {(booking.staff_id, booking.date) for _, booking in timed}
+            )
+
+            bookings = []
+            for line_number, booking in timed:
+                index = self.indexes[(booking.staff_id, booking.date)]
+                if index.add(booking.start_time, booking.end_time):
+                    bookings.append(booking)
+                else:
+                    self.rejected.append((line_number, "overlaps an existing booking"))
+
+            Booking.objects.bulk_create(bookings)
+            rollups.record(bookings)
+
+        for staff_id, date in {
+            (booking.staff_id, booking.date) for booking in bookings
+        }:
+            availability_cache.invalidate_staff_day(staff_id, date)
+        events.publish_bookings("taken", bookings)
+        return len(bookings)
+
+    def decode_line(self, line):
+        try:
+            row = json.loads(line)
+        except json.JSONDecodeError as e:
+            raise ValueError(f"invalid JSON: {e.msg}")
+        if not isinstance(row, dict):
+            raise ValueError("not a JSON object")
+        return row
+
+    def parse_row(self, line_number, row):
+        missing = [field for field in FIELDS if not row.get(field)]
+        if missing:
+            raise ValueError(f"missing {', '.join(missing)}")
+        for field in FIELDS:
+            value = row[field]
+            if field.endswith("_id"):
+                valid = isinstance(value, str) and value.isdigit()
+                valid |= isinstance(value, int) and not isinstance(value, bool)
+            else:
+                valid = isinstance(value, str)
+            if not valid:
+                raise CommandError(f"Row {line_number}: invalid {field} {value!r}")
+
+        service = self.services.get(int(row["service_id"]))
+        staff_id = int(row["staff_id"])
+        if service is None or staff_id not in self.staff_ids:
+            raise ValueError("unknown service or staff")
+
+        date = self.parse_value(
+            line_number, row, "date", "YYYY-MM-DD", "%Y-%m-%d"
+        ).date()
+        # Exports write whole minutes as HH:MM:SS
+        start = self.parse_value(
+            line_number, row, "start_time", "HH:MM", "%H:%M", "%H:%M:%S"
+        )
+        if start.second:
+            raise CommandError(
+                f"Row {line_number}: start_time must be HH:MM, "
+                f"got {row['start_time']!r}"
+            )
+
+        # The end time depends on the staff's qualifications, set by import_batch
+        return Booking(
+            service=service,
+            staff_id=staff_id,
+            customer_name=row["customer_name"],
+            customer_email=row["customer_email"],
+            date=date,
+            start_time=start.time(),
+            price=service.price,
+        )
+
+    def parse_value(self, line_number, row, field, expected, *formats):
+        for value_format in formats:
+            try:
+                return datetime.strptime(row[field], value_format)
+            except ValueError:
+                pass
+        raise CommandError(
+            f"Row {line_number}: {field} must be {expected}, got {row[field]!r}"
+        )
+
+    def load_existing(self, staff_days):
+        """
+        Loads the stored bookings and holds of every staff-day not seen yet with one
+        query.
+        """
+        missing = staff_days - self.indexes.keys()
+        if not missing:
+            return
+
+        intervals = {staff_day: [] for staff_day in missing}
+        for staff_id, date, start_time, end_time in busy_intervals(
+            ["staff_id", "date", "start_time", "end_time"],
+            staff_id__in={staff_id for staff_id, _ in missing},
+            date__in={date for _, date in missing},
+        ):
+            if (staff_id, date) in intervals:
+                intervals[(staff_id, date)].append((start_time, end_time))
+
+        for staff_day, staff_day_intervals in intervals.items():
+            self.indexes[staff_day] = IntervalIndex(staff_day_intervals)
@@ -0,0 +1,54 @@
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Max, Min
+
+from booking import rollups, routers
+from booking.models import BookingHistory
+
+
+class Command(BaseCommand):
+    help = (
+        "Recomputes the daily staff stats from the bookings, one date chunk per "
+        "transaction. Defaults to every booked date."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--from", dest="start", help="First date, YYYY-MM-DD")
+        parser.add_argument("--to", dest="end", help="Last date, YYYY-MM-DD")
+        parser.add_argument("--chunk-days", type=int, default=31)
+
+    @routers.use_primary()
+    def handle(self, *args, **options):
+        if options["chunk_days"] < 1:
+            raise CommandError("--chunk-days must be positive")
+        try:
+            start, end = (
+                (
+                    datetime.strptime(options[name], "%Y-%m-%d").date()
+                    if options[name]
+                    else None
+                )
+                for name in ("start", "end")
+            )
+        except ValueError:
+            raise CommandError("Dates must be YYYY-MM-DD")
+
+        if start is None or end is None:
+            booked = BookingHistory.objects.aggregate(
+                first=Min("date"), last=Max("date")
+            )
+            start = start or booked["first"]
+            end = end or booked["last"]
+        if start is None or end is None:
+            self.stdout.write("No bookings to roll up")
+            return
+
+        staff_days = 0
+        for first, last, rows in rollups.rebuild(start, end, options["chunk_days"]):
+            staff_days += rows
+            if options["verbosity"] > 1:
+                self.stdout.write(f"{first} to {last}: {rows} staff-days")
+        self.stdout.write(
+            self.style.SUCCESS(f"Rebuilt {staff_days} staff-days from {start} to {end}")
+        )
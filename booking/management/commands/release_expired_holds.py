@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from booking.utils import release_expired_holds
+
+
+class Command(BaseCommand):
+    help = (
+        "Deletes expired slot holds and frees their slots, e.g. every minute from cron."
+    )
+
+    def handle(self, *args, **options):
+        released = release_expired_holds()
+        self.stdout.write(self.style.SUCCESS(f"Released {released} expired holds"))
@@ -0,0 +1,72 @@
+import logging
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, close_old_connections
+
+from booking import outbox, routers
+
+logger = logging.getLogger("booking.outbox")
+
+# Longest wait, in seconds, between retries while the database keeps failing
+MAX_BACKOFF = 60
+
+
+class Command(BaseCommand):
+    help = "Sends due booking notifications from the outbox, in batches."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=100)
+        parser.add_argument(
+            "--poll-interval",
+            type=float,
+            default=5,
+            help="Seconds to wait when nothing is due",
+        )
+        parser.add_argument(
+            "--once", action="store_true", help="Exit when nothing is due"
+        )
+
+    @routers.use_primary()
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+        if batch_size < 1:
+            raise CommandError("--batch-size must be positive")
+
+        sent = failed = errors = 0
+        started = time.perf_counter()
+        while True:
+            # Like a request, drops connections past CONN_MAX_AGE or left broken
+            close_old_connections()
+            try:
+                notifications = outbox.claim(batch_size)
+                if notifications:
+                    batch_sent, batch_failed = outbox.deliver(notifications)
+            except OperationalError:
+                # Locked or unreachable database: unsent claims return after the lease
+                errors += 1
+                delay = min(2 ** (errors - 1), MAX_BACKOFF)
+                logger.warning(
+                    "Outbox batch failed, retrying in %.1fs", delay, exc_info=True
+                )
+                time.sleep(delay)
+                continue
+            errors = 0
+
+            if notifications:
+                sent += batch_sent
+                failed += batch_failed
+                if options["verbosity"] > 1:
+                    self.stdout.write(f"Sent {batch_sent}, failed {batch_failed}")
+            elif options["once"]:
+                break
+            else:
+                time.sleep(options["poll_interval"])
+
+        elapsed = time.perf_counter() - started
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Sent {sent} notifications, {failed} failed "
+                f"in {elapsed:.2f}s ({sent / elapsed if elapsed else 0:.0f} emails/sec)"
+            )
+        )
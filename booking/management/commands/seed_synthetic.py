@@ -0,0 +1,153 @@
+import random
+import time as timer
+from datetime import datetime, time, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+
+from booking import cache as availability_cache
+from booking import rollups, schedule
+from booking.models import AvailabilityRule, Booking, Service, Staff
+from booking.utils import SLOT_STEP, IntervalIndex
+
+# Weekly schedule of every synthetic staff member: Monday to Saturday with a lunch break
+SHIFTS = [(time(9, 0), time(13, 0)), (time(14, 0), time(18, 0))]
+WORKING_DAYS = range(6)
+
+
+class Command(BaseCommand):
+    help = (
+        "Generates synthetic services, staff, weekly rules and bookings for "
+        "benchmarking."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--staff", type=int, default=10)
+        parser.add_argument("--services", type=int, default=5)
+        parser.add_argument("--days", type=int, default=30)
+        parser.add_argument(
+            "--bookings-per-day",
+            type=int,
+            default=8,
+            help="Bookings attempted per staff member and working day",
+        )
+        parser.add_argument(
+            "--start", help="First booked date, YYYY-MM-DD (default today)"
+        )
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument(
+            "--clear",
+            action="store_true",
+            help="Delete all existing booking data first",
+        )
+        parser.add_argument("--batch-size", type=int, default=2000)
+
+    def handle(self, *args, **options):
+        if min(options["staff"], options["services"], options["days"]) < 1:
+            raise CommandError("--staff, --services and --days must be positive")
+
+        rng = random.Random(options["seed"])
+        start = timezone.localdate()
+        if options["start"]:
+            try:
+                start = datetime.strptime(options["start"], "%Y-%m-%d").date()
+            except ValueError:
+                raise CommandError("--start must be YYYY-MM-DD")
+        started = timer.perf_counter()
+
+        with transaction.atomic():
+            if options["clear"]:
+                # Staff first, their bookings' stats rows go with them instead of
+                # being decremented booking by booking
+                Staff.objects.all().delete()
+                Booking.objects.all().delete()
+                AvailabilityRule.objects.all().delete()
+                Service.objects.all().delete()
+
+            services = Service.objects.bulk_create(
+                Service(
+                    name=f"Service {index + 1}",
+                    duration_minutes=rng.choice([15, 30, 45, 60, 90]),
+                    buffer_minutes=rng.choice([0, 0, 5, 10]),
+                    price=rng.randrange(10, 150),
+                )
+                for index in range(options["services"])
+            )
+            staff_members = Staff.objects.bulk_create(
+                Staff(name=f"Staff {index + 1}") for index in range(options["staff"])
+            )
+            AvailabilityRule.objects.bulk_create(
+                AvailabilityRule(
+                    staff=staff,
+                    day_of_week=day_of_week,
+                    start_time=shift_start,
+                    end_time=shift_end,
+                )
+                for staff in staff_members
+                for day_of_week in WORKING_DAYS
+                for shift_start, shift_end in SHIFTS
+            )
+            schedule.invalidate_schedules()
+
+            batch = []
+            created = 0
+            for offset in range(options["days"]):
+                date = start + timedelta(days=offset)
+                if date.weekday() not in WORKING_DAYS:
+                    continue
+                for staff in staff_members:
+                    for booking in self.staff_day_bookings(
+                        rng, date, staff, services, options["bookings_per_day"]
+                    ):
+                        batch.append(booking)
+                    if len(batch) >= options["batch_size"]:
+                        created += len(Booking.objects.bulk_create(batch))
+                        rollups.record(batch)
+                        batch = []
+            created += len(Booking.objects.bulk_create(batch))
+            rollups.record(batch)
+
+        # Seeded rows bypass model signals
+        availability_cache.get_cache().clear()
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Created {len(services)} services, {len(staff_members)} staff and "
+                f"{created} bookings in {timer.perf_counter() - started:.2f}s"
+            )
+        )
+
+    def staff_day_bookings(self, rng, date, staff, services, count):
+        """
+        Places up to count non-overlapping bookings on the slot grid of the shifts.
+        """
+        index = IntervalIndex()
+        for attempt in range(count * 3):
+            if len(index.starts) >= count:
+                break
+            service = rng.choice(services)
+            shift_start, shift_end = rng.choice(SHIFTS)
+            total = timedelta(minutes=service.duration_minutes + service.buffer_minutes)
+            window = datetime.combine(date, shift_end) - datetime.combine(
+                date, shift_start
+            )
+            steps = (window - total) // SLOT_STEP
+            if steps < 0:
+                continue
+
+            start_dt = datetime.combine(date, shift_start) + SLOT_STEP * rng.randint(
+                0, steps
+            )
+            end_time = (start_dt + total).time()
+            if index.add(start_dt.time(), end_time):
+                yield Booking(
+                    service=service,
+                    staff=staff,
+                    customer_name=f"Customer {rng.randrange(100000)}",
+                    customer_email="customer@example.com",
+                    date=date,
+                    start_time=start_dt.time(),
+                    end_time=end_time,
+                    price=service.price,
+                )
@@ -0,0 +1,217 @@
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+from threading import Lock
+
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+from . import cache as availability_cache
+
+DURATION_BUCKETS = (
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1,
+    2.5,
+    5,
+    10,
+)
+COUNT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+QUANTILES = (0.5, 0.95, 0.99)
+
+# Measurements of the request being handled. Context variables follow the request
+# into sync_to_async threads, so async views are measured the same way.
+current_request = ContextVar("booking_request_metrics", default=None)
+
+
+class RequestMetrics:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.db_queries = 0
+        self.db_time = 0.0
+        self.timings = {}
+
+    def add_timing(self, name, seconds):
+        self.timings[name] = self.timings.get(name, 0.0) + seconds
+
+
+class Histogram:
+    """Cumulative fixed-bucket histogram, thread safe."""
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self.lock = Lock()
+
+    def observe(self, value):
+        index = bisect_left(self.buckets, value)
+        with self.lock:
+            self.counts[index] += 1
+            self.sum += value
+            self.count += 1
+
+    def quantile(self, q):
+        """Estimates a quantile by linear interpolation inside the matching bucket."""
+        with self.lock:
+            counts, total = list(self.counts), self.count
+        if not total:
+            return 0.0
+
+        rank = q * total
+        seen = 0
+        for index, count in enumerate(counts):
+            if seen + count >= rank and count:
+                lower = self.buckets[index - 1] if index else 0.0
+                upper = self.buckets[index] if index < len(self.buckets) else lower
+                return lower + (upper - lower) * (rank - seen) / count
+            seen += count
+        return self.buckets[-1]
+
+
+# {(metric name, endpoint): Histogram}
+_histograms = {}
+_histograms_lock = Lock()
+
+METRICS = {
+    "booking_request_duration_seconds": ("Wall time per request", DURATION_BUCKETS),
+    "booking_db_duration_seconds": ("Database time per request", DURATION_BUCKETS),
+    "booking_db_queries": ("Database queries per request", COUNT_BUCKETS),
+    "booking_slot_engine_duration_seconds": (
+        "Slot computation time per request",
+        DURATION_BUCKETS,
+    ),
+}
+
+
+def observe(name, endpoint, value):
+    histogram = _histograms.get((name, endpoint))
+    if histogram is None:
+        with _histograms_lock:
+            histogram = _histograms.setdefault(
+                (name, endpoint), Histogram(METRICS[name][1])
+            )
+    histogram.observe(value)
+
+
+def record(endpoint, metrics, wall_time):
+    observe("booking_request_duration_seconds", endpoint, wall_time)
+    observe("booking_db_duration_seconds", endpoint, metrics.db_time)
+    observe("booking_db_queries", endpoint, metrics.db_queries)
+    if "slots" in metrics.timings:
+        observe(
+            "booking_slot_engine_duration_seconds", endpoint, metrics.timings["slots"]
+        )
+
+
+def reset():
+    with _histograms_lock:
+        _histograms.clear()
+
+
+@contextmanager
+def timer(name):
+    """Adds the time spent in the block to the current request's Server-Timing entry."""
+    metrics = current_request.get()
+    if metrics is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        metrics.add_timing(name, time.perf_counter() - started)
+
+
+def timed(name):
+    """Decorator form of timer()."""
+
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            with timer(name):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def count_queries(execute, sql, params, many, context):
+    """Database execute wrapper installed on every connection."""
+    metrics = current_request.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        metrics.db_queries += 1
+        metrics.db_time += time.perf_counter() - started
+
+
+@receiver(connection_created)
+def install_query_counter(sender, connection, **kwargs):
+    if count_queries not in connection.execute_wrappers:
+        connection.execute_wrappers.append(count_queries)
+
+
+def render_prometheus():
+    """Renders all histograms in the Prometheus text exposition format."""
+    with _histograms_lock:
+        histograms = sorted(_histograms.items())
+
+    lines = []
+    for name, (description, buckets) in METRICS.items():
+        lines.append(f"# HELP {name} {description}")
+        lines.append(f"# TYPE {name} histogram")
+        for (metric, endpoint), histogram in histograms:
+            if metric != name:
+                continue
+            with histogram.lock:
+                counts, total, total_sum = (
+                    list(histogram.counts),
+                    histogram.count,
+                    histogram.sum,
+                )
+            cumulative = 0
+            for bound, count in zip(buckets, counts):
+                cumulative += count
+                lines.append(
+                    f'{name}_bucket{{endpoint="{endpoint}",le="{bound}"}} {cumulative}'
+                )
+            lines.append(f'{name}_bucket{{endpoint="{endpoint}",le="+Inf"}} {total}')
+            lines.append(f'{name}_sum{{endpoint="{endpoint}"}} {total_sum}')
+            lines.append(f'{name}_count{{endpoint="{endpoint}"}} {total}')
+
+    name = "booking_request_duration_quantile_seconds"
+    lines.append(f"# HELP {name} Estimated request duration quantiles")
+    lines.append(f"# TYPE {name} gauge")
+    for (metric, endpoint), histogram in histograms:
+        if metric == "booking_request_duration_seconds":
+            for q in QUANTILES:
+                lines.append(
+                    f'{name}{{endpoint="{endpoint}",quantile="{q}"}} '
+                    f"{histogram.quantile(q):.6f}"
+                )
+
+    cache_stats = availability_cache.stats()
+    lines.append("# HELP booking_availability_cache_total Availability cache lookups")
+    lines.append("# TYPE booking_availability_cache_total counter")
+    for result in ("hits", "misses"):
+        lines.append(
+            f'booking_availability_cache_total{{result="{result}"}} '
+            f"{cache_stats[result]}"
+        )
+
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,139 @@
+import json
+import logging
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+
+from . import metrics, routers
+
+logger = logging.getLogger("booking.metrics")
+
+
+class MetricsMiddleware:
+    """
+    Measures wall time, database queries/time and slot engine time of every request.
+    Adds them as a Server-Timing header, logs one JSON line and feeds the /metrics
+    histograms.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.BOOKING_METRICS_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+
+        request_metrics = metrics.RequestMetrics()
+        token = metrics.current_request.set(request_metrics)
+        try:
+            response = self.get_response(request)
+        finally:
+            metrics.current_request.reset(token)
+        return self.finish(request, response, request_metrics)
+
+    async def __acall__(self, request):
+        request_metrics = metrics.RequestMetrics()
+        token = metrics.current_request.set(request_metrics)
+        try:
+            response = await self.get_response(request)
+        finally:
+            metrics.current_request.reset(token)
+        return self.finish(request, response, request_metrics)
+
+    def finish(self, request, response, request_metrics):
+        # Streaming responses are measured up to the first byte
+        wall_time = time.perf_counter() - request_metrics.started
+
+        entries = [
+            f"app;dur={wall_time * 1000:.2f}",
+            f"db;dur={request_metrics.db_time * 1000:.2f};"
+            f'desc="{request_metrics.db_queries} queries"',
+        ]
+        entries += [
+            f"{name};dur={seconds * 1000:.2f}"
+            for name, seconds in request_metrics.timings.items()
+        ]
+        response["Server-Timing"] = ", ".join(entries)
+
+        match = request.resolver_match
+        # Unresolved paths are not recorded to keep the endpoint labels bounded
+        if match is None or match.url_name == "metrics":
+            return response
+
+        metrics.record(match.url_name, request_metrics, wall_time)
+        if logger.isEnabledFor(logging.INFO):
+            logger.info(
+                json.dumps(
+                    {
+                        "endpoint": match.url_name,
+                        "method": request.method,
+                        "status": response.status_code,
+                        "duration_ms": round(wall_time * 1000, 2),
+                        "db_queries": request_metrics.db_queries,
+                        "db_ms": round(request_metrics.db_time * 1000, 2),
+                        **{
+                            f"{name}_ms": round(seconds * 1000, 2)
+                            for name, seconds in request_metrics.timings.items()
+                        },
+                    }
+                )
+            )
+        return response
+
+
+class PrimaryStickinessMiddleware:
+    """
+    Keeps a client reading the primary database for BOOKING_PRIMARY_STICKY_SECONDS after
+    one of its requests wrote, so it sees its own booking before replicas catch up.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.BOOKING_READ_REPLICAS:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+
+        state = routers.RoutingState(pinned=routers.STICKY_COOKIE in request.COOKIES)
+        token = routers.current_request.set(state)
+        try:
+            response = self.get_response(request)
+        finally:
+            routers.current_request.reset(token)
+        return self.finish(response, state)
+
+    async def __acall__(self, request):
+        state = routers.RoutingState(pinned=routers.STICKY_COOKIE in request.COOKIES)
+        token = routers.current_request.set(state)
+        try:
+            response = await self.get_response(request)
+        finally:
+            routers.current_request.reset(token)
+        return self.finish(response, state)
+
+    def finish(self, response, state):
+        if state.wrote:
+            response.set_cookie(
+                routers.STICKY_COOKIE,
+                "1",
+                max_age=settings.BOOKING_PRIMARY_STICKY_SECONDS,
+                httponly=True,
+                samesite="Lax",
+            )
+        return response
@@ -0,0 +1,21 @@
+from django.db import migrations
+
+# PostgreSQL only: the exclusion constraint itself needs end_time, so it is added
+# by 0019 once 0007 has backfilled it. This only installs the extension it uses.
+CREATE_EXTENSION = "CREATE EXTENSION IF NOT EXISTS btree_gist;"
+
+
+def add_gist_extension(apps, schema_editor):
+    if schema_editor.connection.vendor == "postgresql":
+        schema_editor.execute(CREATE_EXTENSION)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("booking", "0005_booking_end_time"),
+    ]
+
+    operations = [
+        migrations.RunPython(add_gist_extension, migrations.RunPython.noop),
+    ]
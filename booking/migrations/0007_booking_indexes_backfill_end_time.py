@@ -0,0 +1,55 @@
+# Generated by Django 5.2.3 on 2026-10-18 17:37
+
+from datetime import datetime, timedelta
+
+from django.db import migrations, models
+
+
+def backfill_end_time(apps, schema_editor):
+    Booking = apps.get_model("booking", "Booking")
+    db_alias = schema_editor.connection.alias
+
+    batch = []
+    for booking in (
+        Booking.objects.using(db_alias)
+        .select_related("service")
+        .iterator(chunk_size=2000)
+    ):
+        start_dt = datetime.combine(booking.date, booking.start_time)
+        booking.end_time = (
+            start_dt
+            + timedelta(
+                minutes=booking.service.duration_minutes
+                + booking.service.buffer_minutes
+            )
+        ).time()
+        batch.append(booking)
+        if len(batch) == 2000:
+            Booking.objects.using(db_alias).bulk_update(batch, ["end_time"])
+            batch = []
+    Booking.objects.using(db_alias).bulk_update(batch, ["end_time"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("booking", "0006_booking_no_overlap_exclusion"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="availabilityrule",
+            index=models.Index(
+                fields=["day_of_week", "is_active", "staff"],
+                name="rule_weekday_active_staff_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="booking",
+            index=models.Index(
+                fields=["staff", "date", "start_time", "end_time"],
+                name="booking_staff_date_span_idx",
+            ),
+        ),
+        migrations.RunPython(backfill_end_time, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.2.3 on 2026-10-18 19:05
+
+from django.db import migrations, models
+
+
+def create_version_row(apps, schema_editor):
+    ScheduleVersion = apps.get_model("booking", "ScheduleVersion")
+    ScheduleVersion.objects.using(schema_editor.connection.alias).get_or_create(pk=1)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("booking", "0007_booking_indexes_backfill_end_time"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ScheduleVersion",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("schedule", models.BigIntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(create_version_row, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.3 on 2026-10-18 17:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("booking", "0008_scheduleversion"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="service",
+            name="updated_at",
+            field=models.DateTimeField(auto_now=True),
+        ),
+    ]
@@ -0,0 +1,79 @@
+# Generated by Django 5.2.3 on 2026-10-18 17:52
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("booking", "0009_service_updated_at"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="Recurrence",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("customer_name", models.CharField(max_length=100)),
+                ("customer_email", models.EmailField(max_length=254)),
+                (
+                    "frequency",
+                    models.CharField(
+                        choices=[
+                            ("weekly", "Weekly"),
+                            ("biweekly", "Every two weeks"),
+                            ("monthly", "Monthly"),
+                        ],
+                        max_length=10,
+                    ),
+                ),
+                ("start_date", models.DateField()),
+                ("start_time", models.TimeField()),
+                ("count", models.PositiveIntegerField(blank=True, null=True)),
+                ("until", models.DateField(blank=True, null=True)),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                (
+                    "service",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to="booking.service",
+                    ),
+                ),
+                (
+                    "staff",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE, to="booking.staff"
+                    ),
+                ),
+            ],
+        ),
+        migrations.AddField(
+            model_name="booking",
+            name="recurrence",
+            field=models.ForeignKey(
+                blank=True,
+                null=True,
+                on_delete=django.db.models.deletion.SET_NULL,
+                related_name="bookings",
+                to="booking.recurrence",
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="recurrence",
+            constraint=models.CheckConstraint(
+                condition=models.Q(
+                    ("count__isnull", False), ("until__isnull", False), _connector="OR"
+                ),
+                name="recurrence_has_end",
+            ),
+        ),
+    ]
@@ -0,0 +1,80 @@
+# Generated by Django 5.2.3 on 2026-10-18 17:54
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("booking", "0010_recurrence"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="AvailabilityException",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("start_date", models.DateField()),
+                ("end_date", models.DateField()),
+                (
+                    "kind",
+                    models.CharField(
+                        choices=[("closed", "Closed"), ("open", "Extra hours")],
+                        default="closed",
+                        max_length=10,
+                    ),
+                ),
+                ("start_time", models.TimeField(blank=True, null=True)),
+                ("end_time", models.TimeField(blank=True, null=True)),
+                ("reason", models.CharField(blank=True, max_length=200)),
+                (
+                    "staff",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to="booking.staff",
+                    ),
+                ),
+            ],
+            options={
+                "indexes": [
+                    models.Index(
+                        fields=["end_date", "start_date"],
+                        name="exception_date_range_idx",
+                    )
+                ],
+                "constraints": [
+                    models.CheckConstraint(
+                        condition=models.Q(("end_date__gte", models.F("start_date"))),
+                        name="exception_dates_ordered",
+                    ),
+                    models.CheckConstraint(
+                        condition=models.Q(
+                            models.Q(
+                                ("end_time__isnull", True),
+                                ("kind", "closed"),
+                                ("start_time__isnull", True),
+                            ),
+                            models.Q(
+                                ("end_time__gt", models.F("start_time")),
+                                ("end_time__isnull", False),
+                                ("start_time__isnull", False),
+                            ),
+                            _connector="OR",
+                        ),
+                        name="exception_times_valid",
+                    ),
+                ],
+            },
+        ),
+    ]
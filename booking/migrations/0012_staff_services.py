@@ -0,0 +1,66 @@
+# Generated by Django 5.2.3 on 2026-10-18 17:57
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("booking", "0011_availabilityexception"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="StaffService",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "duration_minutes",
+                    models.PositiveIntegerField(blank=True, null=True),
+                ),
+                (
+                    "service",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to="booking.service",
+                    ),
+                ),
+                (
+                    "staff",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE, to="booking.staff"
+                    ),
+                ),
+            ],
+        ),
+        migrations.AddField(
+            model_name="staff",
+            name="services",
+            field=models.ManyToManyField(
+                blank=True,
+                related_name="qualified_staff",
+                through="booking.StaffService",
+                to="booking.service",
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="staffservice",
+            constraint=models.UniqueConstraint(
+                fields=("staff", "service"), name="unique_staff_service"
+            ),
+        ),
+        migrations.AddField(
+            model_name="scheduleversion",
+            name="qualifications",
+            field=models.BigIntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.3 on 2026-10-18 18:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("booking", "0012_staff_services"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="booking",
+            index=models.Index(
+                fields=["date", "start_time"], name="booking_date_start_idx"
+            ),
+        ),
+    ]
@@ -0,0 +1,52 @@
+# Generated by Django 5.2.3 on 2026-10-18 18:15
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("booking", "0015_slothold"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="DailyStaffStats",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("date", models.DateField()),
+                ("bookings", models.IntegerField(default=0)),
+                ("booked_minutes", models.IntegerField(default=0)),
+                (
+                    "revenue",
+                    models.DecimalField(decimal_places=2, default=0, max_digits=12),
+                ),
+                (
+                    "staff",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="daily_stats",
+                        to="booking.staff",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name_plural": "daily staff stats",
+                "indexes": [models.Index(fields=["date"], name="stats_date_idx")],
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("staff", "date"), name="unique_staff_day_stats"
+                    )
+                ],
+            },
+        ),
+    ]
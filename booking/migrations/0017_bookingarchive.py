@@ -0,0 +1,97 @@
+# Generated by Django 5.2.3 on 2026-10-18 18:17
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+COLUMNS = (
+    "id, service_id, staff_id, customer_name, customer_email, date, start_time, "
+    "end_time, created_at"
+)
+
+# Same SQL on SQLite and PostgreSQL; both push the filters of a query into each half
+CREATE_VIEW = f"""
+CREATE VIEW booking_bookinghistory AS
+SELECT {COLUMNS}, FALSE AS archived FROM booking_booking
+UNION ALL
+SELECT {COLUMNS}, TRUE AS archived FROM booking_bookingarchive;
+"""
+
+DROP_VIEW = "DROP VIEW IF EXISTS booking_bookinghistory;"
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("booking", "0016_dailystaffstats"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="BookingHistory",
+            fields=[
+                ("id", models.BigIntegerField(primary_key=True, serialize=False)),
+                ("customer_name", models.CharField(max_length=100)),
+                ("customer_email", models.EmailField(max_length=254)),
+                ("date", models.DateField()),
+                ("start_time", models.TimeField()),
+                ("end_time", models.TimeField()),
+                ("created_at", models.DateTimeField()),
+                ("archived", models.BooleanField()),
+            ],
+            options={
+                "verbose_name_plural": "booking history",
+                "db_table": "booking_bookinghistory",
+                "managed": False,
+            },
+        ),
+        migrations.CreateModel(
+            name="BookingArchive",
+            fields=[
+                ("id", models.BigIntegerField(primary_key=True, serialize=False)),
+                ("customer_name", models.CharField(max_length=100)),
+                ("customer_email", models.EmailField(max_length=254)),
+                ("date", models.DateField()),
+                ("start_time", models.TimeField()),
+                ("end_time", models.TimeField()),
+                ("created_at", models.DateTimeField()),
+                ("archived_at", models.DateTimeField(auto_now_add=True)),
+                (
+                    "recurrence",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        related_name="archived_bookings",
+                        to="booking.recurrence",
+                    ),
+                ),
+                (
+                    "service",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="+",
+                        to="booking.service",
+                    ),
+                ),
+                (
+                    "staff",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="+",
+                        to="booking.staff",
+                    ),
+                ),
+            ],
+            options={
+                "indexes": [
+                    models.Index(
+                        fields=["date", "start_time"], name="archive_date_start_idx"
+                    ),
+                    models.Index(
+                        fields=["staff", "date"], name="archive_staff_date_idx"
+                    ),
+                ],
+            },
+        ),
+        migrations.RunSQL(CREATE_VIEW, DROP_VIEW),
+    ]
@@ -0,0 +1,54 @@
+# Generated by Django 5.2.3 on 2026-10-18 18:39
+
+from django.db import migrations, models
+
+
+def split_shop_wide_extra_hours(apps, schema_editor):
+    """Gives every active staff member their own copy of shop wide extra hours."""
+    AvailabilityException = apps.get_model("booking", "AvailabilityException")
+    Staff = apps.get_model("booking", "Staff")
+    db_alias = schema_editor.connection.alias
+
+    shop_wide = AvailabilityException.objects.using(db_alias).filter(
+        kind="open", staff__isnull=True
+    )
+    staff_ids = list(
+        Staff.objects.using(db_alias)
+        .filter(is_active=True)
+        .values_list("id", flat=True)
+    )
+    AvailabilityException.objects.using(db_alias).bulk_create(
+        AvailabilityException(
+            staff_id=staff_id,
+            start_date=exception.start_date,
+            end_date=exception.end_date,
+            kind=exception.kind,
+            start_time=exception.start_time,
+            end_time=exception.end_time,
+            reason=exception.reason,
+        )
+        for exception in shop_wide
+        for staff_id in staff_ids
+    )
+    shop_wide.delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("booking", "0017_bookingarchive"),
+    ]
+
+    operations = [
+        migrations.RunPython(split_shop_wide_extra_hours, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name="availabilityexception",
+            constraint=models.CheckConstraint(
+                condition=models.Q(
+                    ("kind", "closed"), ("staff__isnull", False), _connector="OR"
+                ),
+                name="exception_open_has_staff",
+                violation_error_message="Extra hours need a staff member.",
+            ),
+        ),
+    ]
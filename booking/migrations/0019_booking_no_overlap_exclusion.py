@@ -0,0 +1,37 @@
+from django.db import migrations
+
+# PostgreSQL only: rejects overlapping bookings of the same staff member at the
+# database level. Other backends rely on the locked check in create_booking.
+# Databases that ran an earlier 0006 already have it, hence the drop first.
+CREATE_EXCLUSION = """
+ALTER TABLE booking_booking DROP CONSTRAINT IF EXISTS booking_no_overlap;
+ALTER TABLE booking_booking ADD CONSTRAINT booking_no_overlap EXCLUDE USING gist (
+    staff_id WITH =,
+    tsrange(date + start_time, date + end_time) WITH &&
+);
+"""
+
+DROP_EXCLUSION = (
+    "ALTER TABLE booking_booking DROP CONSTRAINT IF EXISTS booking_no_overlap;"
+)
+
+
+def add_exclusion_constraint(apps, schema_editor):
+    if schema_editor.connection.vendor == "postgresql":
+        schema_editor.execute(CREATE_EXCLUSION)
+
+
+def remove_exclusion_constraint(apps, schema_editor):
+    if schema_editor.connection.vendor == "postgresql":
+        schema_editor.execute(DROP_EXCLUSION)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("booking", "0018_availabilityexception_open_has_staff"),
+    ]
+
+    operations = [
+        migrations.RunPython(add_exclusion_constraint, remove_exclusion_constraint),
+    ]
@@ -0,0 +1,73 @@
+# Generated by Django 5.2.3 on 2026-10-18 20:05
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+COLUMNS = (
+    "id, service_id, staff_id, customer_name, customer_email, date, start_time, "
+    "end_time, created_at"
+)
+
+VIEW = """
+CREATE VIEW booking_bookinghistory AS
+SELECT {0}, FALSE AS archived FROM booking_booking
+UNION ALL
+SELECT {0}, TRUE AS archived FROM booking_bookingarchive;
+"""
+
+DROP_VIEW = "DROP VIEW IF EXISTS booking_bookinghistory;"
+
+
+def backfill_price(apps, schema_editor):
+    """Snapshots the current service prices, the best record of past ones."""
+    Service = apps.get_model("booking", "Service")
+    db_alias = schema_editor.connection.alias
+
+    price = Subquery(
+        Service.objects.using(db_alias)
+        .filter(pk=OuterRef("service_id"))
+        .values("price")[:1]
+    )
+    for model_name in ("Booking", "BookingArchive"):
+        model = apps.get_model("booking", model_name)
+        model.objects.using(db_alias).update(price=price)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("booking", "0019_booking_no_overlap_exclusion"),
+    ]
+
+    # The view is dropped first, SQLite rebuilds the tables it reads when the
+    # columns become NOT NULL
+    operations = [
+        migrations.RunSQL(DROP_VIEW, VIEW.format(COLUMNS)),
+        migrations.AddField(
+            model_name="booking",
+            name="price",
+            field=models.DecimalField(decimal_places=2, max_digits=8, null=True),
+        ),
+        migrations.AddField(
+            model_name="bookingarchive",
+            name="price",
+            field=models.DecimalField(decimal_places=2, max_digits=8, null=True),
+        ),
+        migrations.RunPython(backfill_price, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name="booking",
+            name="price",
+            field=models.DecimalField(decimal_places=2, max_digits=8),
+        ),
+        migrations.AlterField(
+            model_name="bookingarchive",
+            name="price",
+            field=models.DecimalField(decimal_places=2, max_digits=8),
+        ),
+        migrations.AddField(
+            model_name="bookinghistory",
+            name="price",
+            field=models.DecimalField(decimal_places=2, max_digits=8),
+        ),
+        migrations.RunSQL(VIEW.format(f"{COLUMNS}, price"), DROP_VIEW),
+    ]
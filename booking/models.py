@@ -1,3 +1,5 @@
+from datetime import datetime, timedelta
+
 from django.db import models
 from django.utils import timezone
 
@@ -9,6 +11,9 @@ class Service(models.Model):
     duration_minutes = models.PositiveIntegerField()  # How long it takes
     price = models.DecimalField(max_digits=8, decimal_places=2)
     buffer_minutes = models.PositiveIntegerField(default=0)  # Optional buffer time
+    updated_at = models.DateTimeField(
+        auto_now=True
+    )  # Last-Modified of the services api
 
     def __str__(self):
         return self.name
@@ -18,11 +23,34 @@ class Staff(models.Model):
     name = models.CharField(max_length=100)
     email = models.EmailField(blank=True, null=True)
     is_active = models.BooleanField(default=True)
+    # Staff without any listed service can perform every service
+    services = models.ManyToManyField(
+        Service, through="StaffService", related_name="qualified_staff", blank=True
+    )
 
     def __str__(self):
         return self.name
 
 
+# Skill matrix: which services a staff member performs, optionally at their own pace
+class StaffService(models.Model):
+    staff = models.ForeignKey(Staff, on_delete=models.CASCADE)
+    service = models.ForeignKey(Service, on_delete=models.CASCADE)
+    duration_minutes = models.PositiveIntegerField(
+        null=True, blank=True
+    )  # Overrides the service's
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["staff", "service"], name="unique_staff_service"
+            )
+        ]
+
+    def __str__(self):
+        return f"{self.staff.name} - {self.service.name}"
+
+
 # Availability rules (working hours, days off)
 class AvailabilityRule(models.Model):
     DAY_CHOICES = [
@@ -41,11 +69,159 @@ class AvailabilityRule(models.Model):
     end_time = models.TimeField()
     is_active = models.BooleanField(default=True)
 
+    class Meta:
+        indexes = [
+            # Serves both the per staff and the all staff rule lookups of a weekday
+            models.Index(
+                fields=["day_of_week", "is_active", "staff"],
+                name="rule_weekday_active_staff_idx",
+            )
+        ]
+
     def __str__(self):
         staff_name = self.staff.name
         return f"{staff_name} - {self.get_day_of_week_display()} {self.start_time} to {self.end_time}"
 
 
+# Date specific changes to the weekly rules: holidays, time off, extra hours
+class AvailabilityException(models.Model):
+    KIND_CHOICES = [
+        ("closed", "Closed"),  # Removes the hours, or the whole day without times
+        ("open", "Extra hours"),  # Adds hours on top of the weekly rules
+    ]
+
+    # Without staff the exception applies to the whole shop
+    staff = models.ForeignKey(Staff, on_delete=models.CASCADE, null=True, blank=True)
+    start_date = models.DateField()
+    end_date = models.DateField()  # Inclusive
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES, default="closed")
+    start_time = models.TimeField(null=True, blank=True)
+    end_time = models.TimeField(null=True, blank=True)
+    reason = models.CharField(max_length=200, blank=True)
+
+    class Meta:
+        constraints = [
+            models.CheckConstraint(
+                condition=models.Q(end_date__gte=models.F("start_date")),
+                name="exception_dates_ordered",
+            ),
+            # Either the whole day or a proper time range; extra hours always need one
+            models.CheckConstraint(
+                condition=(
+                    models.Q(
+                        start_time__isnull=True, end_time__isnull=True, kind="closed"
+                    )
+                    | models.Q(
+                        start_time__isnull=False,
+                        end_time__isnull=False,
+                        end_time__gt=models.F("start_time"),
+                    )
+                ),
+                name="exception_times_valid",
+            ),
+            # Extra hours belong to someone, the shop as a whole can only close
+            models.CheckConstraint(
+                condition=models.Q(kind="closed") | models.Q(staff__isnull=False),
+                name="exception_open_has_staff",
+                violation_error_message="Extra hours need a staff member.",
+            ),
+        ]
+        indexes = [
+            # Range lookups filter on both ends of the date range
+            models.Index(
+                fields=["end_date", "start_date"], name="exception_date_range_idx"
+            )
+        ]
+
+    @property
+    def whole_day(self):
+        return self.start_time is None
+
+    def __str__(self):
+        who = self.staff.name if self.staff_id else "Everyone"
+        hours = "all day" if self.whole_day else f"{self.start_time} to {self.end_time}"
+        return (
+            f"{who} - {self.get_kind_display()} "
+            f"{self.start_date} to {self.end_date}, {hours}"
+        )
+
+
+# Single row holding the versions of the compiled schedules and the skill matrix.
+# Bumped in the transaction that changes them, so every process sees a change once it
+# commits and never keeps one that rolled back.
+class ScheduleVersion(models.Model):
+    schedule = models.BigIntegerField(default=0)
+    qualifications = models.BigIntegerField(default=0)
+
+    def __str__(self):
+        return f"schedule {self.schedule}, qualifications {self.qualifications}"
+
+
+# Repeating appointments, e.g. every Tuesday at 10:00 for 12 weeks
+class Recurrence(models.Model):
+    FREQUENCY_CHOICES = [
+        ("weekly", "Weekly"),
+        ("biweekly", "Every two weeks"),
+        ("monthly", "Monthly"),
+    ]
+
+    service = models.ForeignKey(Service, on_delete=models.CASCADE)
+    staff = models.ForeignKey(Staff, on_delete=models.CASCADE)
+    customer_name = models.CharField(max_length=100)
+    customer_email = models.EmailField()
+    frequency = models.CharField(max_length=10, choices=FREQUENCY_CHOICES)
+    start_date = models.DateField()
+    start_time = models.TimeField()
+    count = models.PositiveIntegerField(null=True, blank=True)  # Occurrences in total
+    until = models.DateField(null=True, blank=True)  # Last possible date, inclusive
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            # Like an RRULE, the series ends after count occurrences or on until
+            models.CheckConstraint(
+                condition=models.Q(count__isnull=False) | models.Q(until__isnull=False),
+                name="recurrence_has_end",
+            )
+        ]
+
+    def occurrences(self, limit=None):
+        """
+        Lazily yields the dates of the series. Monthly series skip months that have
+        no such day (the 31st, Feb 29th), like RRULE does. Stops after limit dates.
+        """
+        limits = [n for n in (self.count, limit) if n is not None]
+        remaining = min(limits) if limits else None
+        step = 0
+        while remaining is None or remaining > 0:
+            if self.frequency == "monthly":
+                month = self.start_date.month - 1 + step
+                try:
+                    date = self.start_date.replace(
+                        year=self.start_date.year + month // 12, month=month % 12 + 1
+                    )
+                except ValueError:
+                    step += 1
+                    continue
+            else:
+                weeks = 2 if self.frequency == "biweekly" else 1
+                date = self.start_date + timedelta(weeks=weeks * step)
+
+            if self.until is not None and date > self.until:
+                return
+            yield date
+            step += 1
+            if remaining is not None:
+                remaining -= 1
+
+    def __str__(self):
+        return (
+            f"{self.customer_name} - {self.service.name} "
+            f"{self.get_frequency_display().lower()} "
+            f"from {self.start_date} at {self.start_time}"
+        )
+
+
 # Main booking model
 class Booking(models.Model):
     service = models.ForeignKey(Service, on_delete=models.CASCADE)
@@ -55,7 +231,16 @@ class Booking(models.Model):
     date = models.DateField()
     start_time = models.TimeField()
     end_time = models.TimeField()
+    # The service's price when booked, what the stats count as revenue
+    price = models.DecimalField(max_digits=8, decimal_places=2)
     created_at = models.DateTimeField(auto_now_add=True)
+    recurrence = models.ForeignKey(
+        Recurrence,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="bookings",
+    )
 
     # Prevents duplicate data storing
     class Meta:
@@ -64,6 +249,210 @@ class Booking(models.Model):
                 fields=["staff", "date", "start_time"], name="unique_booking_per_slot"
             )
         ]
+        indexes = [
+            # Covers overlap checks, which only read the stored start/end columns
+            models.Index(
+                fields=["staff", "date", "start_time", "end_time"],
+                name="booking_staff_date_span_idx",
+            ),
+            # Admin changelist order and date hierarchy over all staff
+            models.Index(fields=["date", "start_time"], name="booking_date_start_idx"),
+        ]
+
+    # What end_time is computed from, the date only places it on the calendar
+    SPAN_FIELDS = ("service_id", "staff_id", "start_time")
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        loaded = dict(zip(field_names, values))
+        instance._loaded_span = tuple(loaded.get(name) for name in cls.SPAN_FIELDS)
+        return instance
+
+    def save(self, *args, qualifications=None, **kwargs):
+        # Stored so overlap checks never have to join Service, and kept as booked
+        # unless the service, staff or start time changes
+        span = tuple(getattr(self, name) for name in self.SPAN_FIELDS)
+        if self.end_time is None or span != getattr(self, "_loaded_span", None):
+            self.end_time = self.compute_end_time(
+                self.service, self.date, self.start_time, self.staff_id, qualifications
+            )
+        # Later price changes leave existing bookings, and their stats, alone
+        loaded = getattr(self, "_loaded_span", None)
+        if self.price is None or (loaded is not None and loaded[0] != span[0]):
+            self.price = self.service.price
+        super().save(*args, **kwargs)
+        self._loaded_span = span
+
+    @staticmethod
+    def compute_end_time(service, date, start_time, staff_id=None, qualifications=None):
+        """End of the booked interval, with the buffer and the staff's own duration."""
+        # Imported here, the skill matrix is built from these models
+        from .schedule import load_qualifications
+
+        if qualifications is None:
+            qualifications = load_qualifications([staff_id] if staff_id else [])
+        start_dt = datetime.combine(date, start_time)
+        return (start_dt + qualifications.total_required_time(staff_id, service)).time()
 
     def __str__(self):
         return f"{self.customer_name} - {self.service.name} on {self.date} at {self.start_time}"
+
+
+# Bookings of past days, moved out of Booking by archive_bookings so the live table
+# and its indexes only hold upcoming appointments
+class BookingArchive(models.Model):
+    id = models.BigIntegerField(primary_key=True)  # the id it had as a Booking
+    service = models.ForeignKey(Service, on_delete=models.CASCADE, related_name="+")
+    staff = models.ForeignKey(Staff, on_delete=models.CASCADE, related_name="+")
+    customer_name = models.CharField(max_length=100)
+    customer_email = models.EmailField()
+    date = models.DateField()
+    start_time = models.TimeField()
+    end_time = models.TimeField()
+    price = models.DecimalField(max_digits=8, decimal_places=2)
+    created_at = models.DateTimeField()
+    recurrence = models.ForeignKey(
+        Recurrence,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="archived_bookings",
+    )
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["date", "start_time"], name="archive_date_start_idx"),
+            models.Index(fields=["staff", "date"], name="archive_staff_date_idx"),
+        ]
+
+    def __str__(self):
+        return (
+            f"{self.customer_name} - {self.service.name} "
+            f"on {self.date} at {self.start_time}"
+        )
+
+
+# Read only union of Booking and BookingArchive (a database view, see migration 0016)
+# for the admin and reports, which look at past and upcoming bookings alike
+class BookingHistory(models.Model):
+    id = models.BigIntegerField(primary_key=True)
+    service = models.ForeignKey(
+        Service, on_delete=models.DO_NOTHING, db_constraint=False, related_name="+"
+    )
+    staff = models.ForeignKey(
+        Staff, on_delete=models.DO_NOTHING, db_constraint=False, related_name="+"
+    )
+    customer_name = models.CharField(max_length=100)
+    customer_email = models.EmailField()
+    date = models.DateField()
+    start_time = models.TimeField()
+    end_time = models.TimeField()
+    price = models.DecimalField(max_digits=8, decimal_places=2)
+    created_at = models.DateTimeField()
+    archived = models.BooleanField()
+
+    class Meta:
+        managed = False
+        db_table = "booking_bookinghistory"
+        verbose_name_plural = "booking history"
+
+    def __str__(self):
+        return (
+            f"{self.customer_name} - {self.service.name} "
+            f"on {self.date} at {self.start_time}"
+        )
+
+
+# A slot reserved for a few minutes while its customer fills in the booking form.
+# Until it expires it is busy for everyone else, exactly like a booking.
+class SlotHold(models.Model):
+    token = models.CharField(max_length=64, unique=True)
+    service = models.ForeignKey(Service, on_delete=models.CASCADE)
+    staff = models.ForeignKey(Staff, on_delete=models.CASCADE)
+    date = models.DateField()
+    start_time = models.TimeField()
+    end_time = models.TimeField()
+    expires_at = models.DateTimeField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            # Same lookups as the bookings: overlap checks and the bookings of a day
+            models.Index(
+                fields=["staff", "date", "start_time", "end_time"],
+                name="hold_staff_date_span_idx",
+            ),
+            # Sweeping expired holds
+            models.Index(fields=["expires_at"], name="hold_expires_idx"),
+        ]
+
+    def __str__(self):
+        return (
+            f"{self.staff.name} on {self.date} at {self.start_time} "
+            f"until {self.expires_at}"
+        )
+
+
+# Per staff-day totals of the bookings, kept up to date by every booking write so
+# reports never scan the bookings (rebuild_rollups recomputes them)
+class DailyStaffStats(models.Model):
+    staff = models.ForeignKey(
+        Staff, on_delete=models.CASCADE, related_name="daily_stats"
+    )
+    date = models.DateField()
+    bookings = models.IntegerField(default=0)
+    booked_minutes = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+
+    class Meta:
+        verbose_name_plural = "daily staff stats"
+        constraints = [
+            # Target of the incremental upserts, also serves per staff reports
+            models.UniqueConstraint(
+                fields=["staff", "date"], name="unique_staff_day_stats"
+            )
+        ]
+        indexes = [models.Index(fields=["date"], name="stats_date_idx")]
+
+    def __str__(self):
+        return f"{self.staff.name} on {self.date}"
+
+
+# Emails about a booking, written in the booking's transaction and sent by the
+# run_outbox_worker command
+class NotificationOutbox(models.Model):
+    KIND_CHOICES = [
+        ("confirmation", "Confirmation"),
+        ("reminder", "Reminder"),
+    ]
+    STATUS_CHOICES = [
+        ("pending", "Pending"),
+        ("sent", "Sent"),
+        ("failed", "Failed"),  # Gave up after BOOKING_OUTBOX_MAX_ATTEMPTS
+    ]
+
+    booking = models.ForeignKey(
+        Booking, on_delete=models.CASCADE, related_name="notifications"
+    )
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default="pending")
+    # When it is due; moved forward while a worker holds it and before each retry
+    available_at = models.DateTimeField()
+    attempts = models.PositiveIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        verbose_name = "notification"
+        indexes = [
+            # Workers claim the pending rows that are due, oldest first
+            models.Index(fields=["status", "available_at"], name="outbox_due_idx")
+        ]
+
+    def __str__(self):
+        return (
+            f"{self.get_kind_display()} for booking {self.booking_id} ({self.status})"
+        )
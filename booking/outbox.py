@@ -0,0 +1,146 @@
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import connection, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import NotificationOutbox
+
+
+def booking_start(booking):
+    return timezone.make_aware(datetime.combine(booking.date, booking.start_time))
+
+
+def reminder_time(booking):
+    return booking_start(booking) - timedelta(hours=settings.BOOKING_REMINDER_HOURS)
+
+
+def enqueue(bookings):
+    """
+    Writes the confirmation of each booking, and its reminder when that is still ahead,
+    with one insert. Called in the transaction creating the bookings, so notifications
+    exist exactly when their bookings do and nothing slow happens in the request.
+    """
+    now = timezone.now()
+    notifications = []
+    for booking in bookings:
+        notifications.append(
+            NotificationOutbox(booking=booking, kind="confirmation", available_at=now)
+        )
+        remind_at = reminder_time(booking)
+        if remind_at > now:
+            notifications.append(
+                NotificationOutbox(
+                    booking=booking, kind="reminder", available_at=remind_at
+                )
+            )
+    NotificationOutbox.objects.bulk_create(notifications)
+
+
+def reschedule_reminders(booking):
+    """Moves the pending reminder of a booking that moved to another day or time."""
+    NotificationOutbox.objects.filter(
+        booking=booking, kind="reminder", status="pending"
+    ).update(available_at=reminder_time(booking))
+
+
+def claim(batch_size):
+    """
+    Hides up to batch_size due notifications from other workers for BOOKING_OUTBOX_LEASE
+    seconds and returns them with their bookings. Rows locked by another worker are
+    skipped where the database supports it; SQLite serializes the claims instead.
+    Rows of a worker that died are claimed again once the lease ends.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        due = NotificationOutbox.objects.filter(
+            status="pending", available_at__lte=now
+        ).order_by("available_at")
+        if connection.features.has_select_for_update_skip_locked:
+            due = due.select_for_update(skip_locked=True)
+        elif not connection.features.has_select_for_update:
+            # A no-op update takes SQLite's write lock before the read, like
+            # lock_staff_ids. Two claims that both read first would deadlock on
+            # upgrading to it, and one fails with "database is locked".
+            NotificationOutbox.objects.filter(pk__lt=0).update(attempts=F("attempts"))
+        ids = list(due.values_list("id", flat=True)[:batch_size])
+        NotificationOutbox.objects.filter(id__in=ids).update(
+            available_at=now + timedelta(seconds=settings.BOOKING_OUTBOX_LEASE),
+            attempts=F("attempts") + 1,
+        )
+    return list(
+        NotificationOutbox.objects.filter(id__in=ids)
+        .select_related("booking__service", "booking__staff")
+        .order_by("pk")
+    )
+
+
+def render(notification):
+    booking = notification.booking
+    when = f"{booking.date:%A, %d %B %Y} at {booking.start_time:%H:%M}"
+    if notification.kind == "confirmation":
+        subject = f"Booking confirmed: {booking.service.name}"
+        opening = "your booking is confirmed"
+    else:
+        subject = f"Reminder: {booking.service.name} on {when}"
+        opening = "this is a reminder of your upcoming appointment"
+    body = (
+        f"Hi {booking.customer_name},\n\n"
+        f"{opening}:\n\n"
+        f"{booking.service.name} with {booking.staff.name}\n"
+        f"{when} to {booking.end_time:%H:%M}\n\n"
+        f"Booking reference: {booking.pk}\n"
+    )
+    return EmailMessage(
+        subject, body, settings.DEFAULT_FROM_EMAIL, [booking.customer_email]
+    )
+
+
+def deliver(notifications):
+    """
+    Sends claimed notifications over one email connection and records the outcome.
+    A failed notification is retried after BOOKING_OUTBOX_RETRY_DELAY seconds, doubled
+    on each further attempt, until BOOKING_OUTBOX_MAX_ATTEMPTS. Returns (sent, failed).
+    """
+    now = timezone.now()
+    sent, failed = [], {}
+    try:
+        with get_connection() as email_connection:
+            for notification in notifications:
+                booking = notification.booking
+                if notification.kind == "reminder" and booking_start(booking) <= now:
+                    # Too late to remind, not worth a retry
+                    notification.status = "failed"
+                    failed[notification] = "The booking already started."
+                    continue
+                try:
+                    email_connection.send_messages([render(notification)])
+                except Exception as e:
+                    failed[notification] = str(e)
+                else:
+                    sent.append(notification)
+    except Exception as e:
+        # Opening or closing the connection failed, retry what was not sent
+        for notification in notifications:
+            if notification not in sent:
+                failed.setdefault(notification, str(e))
+
+    NotificationOutbox.objects.filter(
+        pk__in=[notification.pk for notification in sent]
+    ).update(status="sent", sent_at=now, last_error="")
+
+    for notification, error in failed.items():
+        notification.last_error = error
+        if notification.attempts >= settings.BOOKING_OUTBOX_MAX_ATTEMPTS:
+            notification.status = "failed"
+        else:
+            notification.available_at = now + timedelta(
+                seconds=settings.BOOKING_OUTBOX_RETRY_DELAY
+                * 2 ** (notification.attempts - 1)
+            )
+    NotificationOutbox.objects.bulk_update(
+        list(failed), ["status", "available_at", "last_error"]
+    )
+    return len(sent), len(failed)
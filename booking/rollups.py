@@ -0,0 +1,231 @@
+from collections import defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db import connection, transaction
+from django.db.models import F
+
+from . import schedule
+from .models import BookingHistory, DailyStaffStats, Staff
+
+# Staff-days per upsert statement, well within the bound parameter limits
+UPSERT_BATCH_SIZE = 1000
+
+# Set by archiving(), read by the booking delete receivers
+_archiving = ContextVar("booking_stats_archiving", default=False)
+
+
+def _minutes(value):
+    return value.hour * 60 + value.minute
+
+
+def _totals(rows):
+    """
+    {(staff_id, date): [bookings, booked minutes, revenue]} of (staff_id, date, start,
+    end, price) rows.
+    """
+    totals = defaultdict(lambda: [0, 0, Decimal(0)])
+    for staff_id, date, start_time, end_time, price in rows:
+        total = totals[(staff_id, date)]
+        total[0] += 1
+        total[1] += _minutes(end_time) - _minutes(start_time)
+        total[2] += price
+    return totals
+
+
+def booking_row(booking):
+    """
+    What a booking adds to the stats of its staff-day, in the shape unrecord takes.
+    """
+    return (
+        booking.staff_id,
+        booking.date,
+        booking.start_time,
+        booking.end_time,
+        booking.price,
+    )
+
+
+def record(bookings):
+    """
+    Adds new bookings to the stats of their staff-days with one upsert per
+    UPSERT_BATCH_SIZE staff-days. Increments run in the database, so concurrent
+    writers of one staff-day cannot lose each other's counts.
+    """
+    totals = list(_totals(booking_row(booking) for booking in bookings).items())
+    table = connection.ops.quote_name(DailyStaffStats._meta.db_table)
+    for offset in range(0, len(totals), UPSERT_BATCH_SIZE):
+        batch = totals[offset : offset + UPSERT_BATCH_SIZE]
+        # Same syntax on PostgreSQL and SQLite 3.24+
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"INSERT INTO {table} "
+                "(staff_id, date, bookings, booked_minutes, revenue) "
+                f"VALUES {', '.join(['(%s, %s, %s, %s, %s)'] * len(batch))} "
+                "ON CONFLICT (staff_id, date) DO UPDATE SET "
+                "bookings = {0}.bookings + excluded.bookings, "
+                "booked_minutes = {0}.booked_minutes + excluded.booked_minutes, "
+                "revenue = {0}.revenue + excluded.revenue".format(table),
+                [
+                    value
+                    for (staff_id, date), (count, minutes, revenue) in batch
+                    for value in (
+                        staff_id,
+                        connection.ops.adapt_datefield_value(date),
+                        count,
+                        minutes,
+                        connection.ops.adapt_decimalfield_value(revenue, 12, 2),
+                    )
+                ],
+            )
+
+
+@contextmanager
+def archiving():
+    """Bookings deleted inside the block were archived and keep their daily stats."""
+    token = _archiving.set(True)
+    try:
+        yield
+    finally:
+        _archiving.reset(token)
+
+
+def is_archiving():
+    return _archiving.get()
+
+
+def unrecord(rows):
+    """
+    Takes removed bookings, as (staff_id, date, start_time, end_time, price) rows, out
+    of their staff-days. Only updates, so a staff member deleted with their bookings
+    gets no stats row back.
+    """
+    for (staff_id, date), (count, minutes, revenue) in _totals(rows).items():
+        DailyStaffStats.objects.filter(staff_id=staff_id, date=date).update(
+            bookings=F("bookings") - count,
+            booked_minutes=F("booked_minutes") - minutes,
+            revenue=F("revenue") - revenue,
+        )
+
+
+def rebuild(start_date, end_date, chunk_days):
+    """
+    Recomputes the stats of the date range from the live and archived bookings, one
+    transaction per chunk_days days, streaming the bookings of each chunk. Yields
+    (first, last, rows).
+    """
+    chunk_start = start_date
+    while chunk_start <= end_date:
+        chunk_end = min(chunk_start + timedelta(days=chunk_days - 1), end_date)
+        with transaction.atomic():
+            totals = _totals(
+                BookingHistory.objects.filter(date__range=(chunk_start, chunk_end))
+                .values_list("staff_id", "date", "start_time", "end_time", "price")
+                .iterator()
+            )
+            DailyStaffStats.objects.filter(
+                date__range=(chunk_start, chunk_end)
+            ).delete()
+            DailyStaffStats.objects.bulk_create(
+                DailyStaffStats(
+                    staff_id=staff_id,
+                    date=date,
+                    bookings=count,
+                    booked_minutes=minutes,
+                    revenue=revenue,
+                )
+                for (staff_id, date), (count, minutes, revenue) in totals.items()
+            )
+        yield chunk_start, chunk_end, len(totals)
+        chunk_start = chunk_end + timedelta(days=1)
+
+
+def period_start(date, period):
+    if period == "week":
+        return date - timedelta(days=date.weekday())
+    if period == "month":
+        return date.replace(day=1)
+    return date
+
+
+def utilization(start_date, end_date, period, staff_ids=None):
+    """
+    Booked vs. working minutes, bookings and revenue per staff member and period
+    ("day", "week" or "month") of the date range. Reads the stats rows and the
+    exceptions of the range, and takes working hours from the compiled schedules,
+    so the cost follows the number of days and staff, not of bookings. Rules are
+    not versioned: past days count the working hours of today's rules.
+    Returns [{"period", "staff_id", "staff", "bookings", "booked_minutes",
+    "available_minutes", "revenue"}] ordered by period and staff.
+    """
+    stats = DailyStaffStats.objects.filter(date__range=(start_date, end_date))
+    if staff_ids is not None:
+        stats = stats.filter(staff_id__in=staff_ids)
+
+    schedules = schedule.get_schedules()
+    exceptions = schedule.ExceptionCalendar(
+        schedule.exceptions_between(start_date, end_date, staff_ids)
+    )
+    staff_by_id = {
+        staff_id: staff_schedule.staff for staff_id, staff_schedule in schedules.items()
+    }
+    staff_by_id.update(exceptions.open_staff())
+    if staff_ids is not None:
+        staff_by_id = {
+            staff_id: staff
+            for staff_id, staff in staff_by_id.items()
+            if staff_id in staff_ids
+        }
+
+    rows = {}
+
+    def row(staff_id, date):
+        key = (period_start(date, period), staff_id)
+        if key not in rows:
+            rows[key] = {
+                "period": key[0],
+                "staff_id": staff_id,
+                "bookings": 0,
+                "booked_minutes": 0,
+                "available_minutes": 0,
+                "revenue": Decimal(0),
+            }
+        return rows[key]
+
+    date = start_date
+    while date <= end_date:
+        for staff_id in staff_by_id:
+            staff_schedule = schedules.get(staff_id)
+            windows = exceptions.windows(
+                staff_id,
+                date,
+                staff_schedule.windows(date.weekday()) if staff_schedule else [],
+            )
+            if windows:
+                row(staff_id, date)["available_minutes"] += sum(
+                    _minutes(window.end_time) - _minutes(window.start_time)
+                    for window in windows
+                )
+        date += timedelta(days=1)
+
+    missing_staff = set()
+    for staff_id, date, count, minutes, revenue in stats.values_list(
+        "staff_id", "date", "bookings", "booked_minutes", "revenue"
+    ):
+        total = row(staff_id, date)
+        total["bookings"] += count
+        total["booked_minutes"] += minutes
+        total["revenue"] += revenue
+        if staff_id not in staff_by_id:
+            missing_staff.add(staff_id)
+
+    if missing_staff:
+        # Booked on days nobody schedules anymore, e.g. staff without rules now
+        staff_by_id.update(Staff.objects.in_bulk(missing_staff))
+
+    return [
+        {**total, "staff": staff_by_id[total["staff_id"]]}
+        for _, total in sorted(rows.items(), key=lambda item: (item[0][0], item[0][1]))
+    ]
@@ -0,0 +1,67 @@
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+
+# Cookie telling the next requests of a client that it wrote moments ago
+STICKY_COOKIE = "booking_primary"
+
+# Set by use_primary(); context variables follow the caller into sync_to_async threads
+_primary_pinned = ContextVar("booking_primary_pinned", default=False)
+
+# RoutingState of the request being handled, set by PrimaryStickinessMiddleware
+current_request = ContextVar("booking_routing_state", default=None)
+
+
+class RoutingState:
+    def __init__(self, pinned=False):
+        self.pinned = pinned  # the client wrote within BOOKING_PRIMARY_STICKY_SECONDS
+        self.wrote = False
+
+
+@contextmanager
+def use_primary():
+    """Reads inside the block (or decorated function) go to the primary database."""
+    token = _primary_pinned.set(True)
+    try:
+        yield
+    finally:
+        _primary_pinned.reset(token)
+
+
+def reads_primary():
+    state = current_request.get()
+    return _primary_pinned.get() or (
+        state is not None and (state.pinned or state.wrote)
+    )
+
+
+class PrimaryReplicaRouter:
+    """
+    Sends reads of booking models to one of BOOKING_READ_REPLICAS and every write to the
+    primary. Reads stay on the primary inside use_primary(), for the rest of a request
+    that wrote, and for clients that wrote within BOOKING_PRIMARY_STICKY_SECONDS.
+    """
+
+    app_label = "booking"
+
+    def db_for_read(self, model, **hints):
+        replicas = settings.BOOKING_READ_REPLICAS
+        if model._meta.app_label != self.app_label or not replicas or reads_primary():
+            return DEFAULT_DB_ALIAS
+        return random.choice(replicas)
+
+    def db_for_write(self, model, **hints):
+        state = current_request.get()
+        if state is not None:
+            state.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same rows as the primary
+        databases = {DEFAULT_DB_ALIAS, *settings.BOOKING_READ_REPLICAS}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
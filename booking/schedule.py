@@ -0,0 +1,382 @@
+import time
+from collections import namedtuple
+from datetime import datetime, timedelta
+from threading import Lock
+
+from django.db import transaction
+from django.db.models import Q
+
+from . import cache as availability_cache
+from . import routers
+from .models import (
+    AvailabilityException,
+    AvailabilityRule,
+    ScheduleVersion,
+    StaffService,
+)
+
+# A day is a bitmap of minutes held in a Python int: bit i is minute i after midnight.
+MINUTES_PER_DAY = 24 * 60
+DAY_MASK = (1 << MINUTES_PER_DAY) - 1
+SLOT_STEP_MINUTES = 5
+
+# Bits 0, 5, 10, ... shifted to a rule start to get the slot grid of that rule
+GRID_MASK = sum(1 << minute for minute in range(0, MINUTES_PER_DAY, SLOT_STEP_MINUTES))
+
+
+def to_minute(value):
+    """Minute of the day of a time, or None when it is not on a whole minute."""
+    if value.second or value.microsecond:
+        return None
+    return value.hour * 60 + value.minute
+
+
+def range_mask(start, end):
+    """Bits start..end-1 set."""
+    if end <= start:
+        return 0
+    return ((1 << (end - start)) - 1) << start
+
+
+def window_starts(free, length):
+    """Sets bit i when minutes i..i+length-1 are all free, in O(log length) shifts."""
+    covered = 1
+    while covered < length:
+        shift = min(covered, length - covered)
+        free &= free >> shift
+        covered += shift
+    return free
+
+
+def busy_mask(intervals):
+    """Busy bitmap of (start_time, end_time) bookings, None if one is not aligned."""
+    busy = 0
+    for start_time, end_time in intervals:
+        start, end = to_minute(start_time), to_minute(end_time)
+        # Empty bookings still block slots straddling them, which a bitmap
+        # cannot express
+        if start is None or end is None or end <= start:
+            return None
+        busy |= range_mask(start, end)
+    return busy
+
+
+def bitmap_slot_times(windows, intervals, total_minutes):
+    """Slot start minutes per rule window, None when the sweep has to be used."""
+    busy = busy_mask(intervals)
+    if busy is None or total_minutes <= 0:
+        return None
+
+    fits = window_starts(~busy & DAY_MASK, total_minutes)
+
+    minutes = []
+    for window in windows:
+        start, end = to_minute(window.start_time), to_minute(window.end_time)
+        if start is None or end is None:
+            return None
+        last_start = end - total_minutes
+        if last_start < start:
+            continue
+
+        candidates = (GRID_MASK << start) & range_mask(start, last_start + 1) & fits
+        while candidates:
+            lowest = candidates & -candidates
+            minutes.append(lowest.bit_length() - 1)
+            candidates ^= lowest
+    return minutes
+
+
+# A working window left after applying exceptions, used wherever a rule is
+Window = namedtuple("Window", ["start_time", "end_time"])
+
+
+def exceptions_between(start_date, end_date, staff_ids=None):
+    """Exceptions overlapping the date range, shop wide ones included, as one query."""
+    exceptions = AvailabilityException.objects.filter(
+        start_date__lte=end_date, end_date__gte=start_date
+    ).select_related("staff")
+    if staff_ids is not None:
+        exceptions = exceptions.filter(
+            Q(staff__isnull=True) | Q(staff_id__in=staff_ids)
+        )
+    return exceptions.order_by("pk")
+
+
+class ExceptionCalendar:
+    """Loaded exceptions of a date range, applied to weekly windows in memory."""
+
+    def __init__(self, exceptions):
+        self.exceptions = list(exceptions)
+
+    def on(self, staff_id, date):
+        return [
+            exception
+            for exception in self.exceptions
+            if exception.start_date <= date <= exception.end_date
+            and exception.staff_id in (None, staff_id)
+        ]
+
+    def open_staff(self):
+        """
+        {staff_id: staff} of everyone with extra hours, who may have no weekly rules.
+        """
+        return {
+            exception.staff_id: exception.staff
+            for exception in self.exceptions
+            if exception.kind == "open" and exception.staff_id is not None
+        }
+
+    def has_open(self, date):
+        return any(
+            exception.kind == "open"
+            and exception.start_date <= date <= exception.end_date
+            for exception in self.exceptions
+        )
+
+    def windows(self, staff_id, date, windows):
+        """
+        The windows of staff_id on date: extra hours are added where the weekly windows
+        do not already cover them, then closures are cut out. A window cut at its start
+        resumes on its own slot grid, so the remaining slots do not move.
+        """
+        exceptions = self.on(staff_id, date)
+        if not exceptions:
+            return windows
+
+        pieces = [
+            (
+                datetime.combine(date, window.start_time),
+                datetime.combine(date, window.end_time),
+            )
+            for window in windows
+        ]
+        for exception in exceptions:
+            if exception.kind == "open":
+                extra = [
+                    (
+                        datetime.combine(date, exception.start_time),
+                        datetime.combine(date, exception.end_time),
+                    )
+                ]
+                for start, end in pieces:
+                    extra = _subtract(extra, start, end)
+                for extra_start, extra_end in extra:
+                    # Hours right before or after a window extend it, so slots may
+                    # span both
+                    starts = [start for start, end in pieces]
+                    ends = [end for start, end in pieces]
+                    if extra_start in ends:
+                        index = ends.index(extra_start)
+                        pieces[index] = (pieces[index][0], extra_end)
+                    elif extra_end in starts:
+                        index = starts.index(extra_end)
+                        # Earliest start on the window's slot grid, like _subtract
+                        step = timedelta(minutes=SLOT_STEP_MINUTES)
+                        start = extra_end - ((extra_end - extra_start) // step) * step
+                        pieces[index] = (start, pieces[index][1])
+                    else:
+                        pieces.append((extra_start, extra_end))
+        for exception in exceptions:
+            if exception.kind == "closed":
+                if exception.whole_day:
+                    return []
+                pieces = _subtract(
+                    pieces,
+                    datetime.combine(date, exception.start_time),
+                    datetime.combine(date, exception.end_time),
+                )
+        return [Window(start.time(), end.time()) for start, end in pieces]
+
+
+def _subtract(pieces, cut_start, cut_end):
+    step = timedelta(minutes=SLOT_STEP_MINUTES)
+    remaining = []
+    for start, end in pieces:
+        if cut_end <= start or cut_start >= end:
+            remaining.append((start, end))
+            continue
+        if cut_start > start:
+            remaining.append((start, cut_start))
+        if cut_end < end:
+            # First slot of the piece's grid at or after the cut
+            resume = start - ((start - cut_end) // step) * step
+            if resume < end:
+                remaining.append((resume, end))
+    return remaining
+
+
+class StaffSchedule:
+    """Weekly working windows of one staff member, compiled from their active rules."""
+
+    def __init__(self, staff, rules):
+        self.staff = staff
+        self.windows_by_weekday = {}
+        for rule in rules:
+            self.windows_by_weekday.setdefault(rule.day_of_week, []).append(rule)
+
+    def windows(self, weekday):
+        return self.windows_by_weekday.get(weekday, [])
+
+
+def _version(field):
+    """Current "schedule" or "qualifications" version, possibly from a replica."""
+    version = ScheduleVersion.objects.filter(pk=1).values_list(field, flat=True).first()
+    return version or 0
+
+
+def _bump_version(field):
+    """Moves a version to a new, never reused timestamp. Returns (previous, new)."""
+    with transaction.atomic():
+        previous = (
+            ScheduleVersion.objects.select_for_update()
+            .filter(pk=1)
+            .values_list(field, flat=True)
+            .first()
+        )
+        version = max(time.time_ns(), (previous or 0) + 1)
+        if previous is None:
+            ScheduleVersion.objects.create(pk=1, **{field: version})
+        else:
+            ScheduleVersion.objects.filter(pk=1).update(**{field: version})
+    return previous or 0, version
+
+
+# Compiled schedules of every staff member with active rules, valid for one
+# schedule version
+_registry = {"version": None, "schedules": {}, "dirty": set()}
+_registry_lock = Lock()
+
+
+def get_schedules():
+    """Returns {staff_id: StaffSchedule}, rebuilt from the primary on a new version."""
+    version = _version("schedule")
+    if _registry["version"] == version and not _registry["dirty"]:
+        return _registry["schedules"]
+    with _registry_lock, routers.use_primary():
+        if _registry["version"] != version:
+            _registry["schedules"] = _compile(AvailabilityRule.objects.all())
+            _registry["dirty"] = set()
+            _registry["version"] = version
+        elif _registry["dirty"]:
+            dirty = _registry["dirty"]
+            schedules = dict(_registry["schedules"])
+            for staff_id in dirty:
+                schedules.pop(staff_id, None)
+            schedules.update(
+                _compile(AvailabilityRule.objects.filter(staff_id__in=dirty))
+            )
+            _registry["schedules"] = schedules
+            _registry["dirty"] = set()
+        return _registry["schedules"]
+
+
+def _compile(rules):
+    rules_by_staff = {}
+    staff_by_id = {}
+    for rule in rules.filter(is_active=True).select_related("staff").order_by("pk"):
+        rules_by_staff.setdefault(rule.staff_id, []).append(rule)
+        staff_by_id[rule.staff_id] = rule.staff
+    return {
+        staff_id: StaffSchedule(staff_by_id[staff_id], staff_rules)
+        for staff_id, staff_rules in rules_by_staff.items()
+    }
+
+
+def reset():
+    """Drops the compiled schedules and skill matrix of this process, e.g. in tests."""
+    with _registry_lock:
+        _registry.update(version=None, schedules={}, dirty=set())
+    with _qualifications_lock:
+        _qualifications["version"] = None
+
+
+def invalidate_schedules(staff_ids=None, rule_id=None):
+    """Called when rules or staff change, with the affected staff or None for all."""
+    previous, version = _bump_version("schedule")
+    availability_cache.invalidate_schedule()
+    if staff_ids is None:
+        return
+    staff_ids = set(staff_ids)
+    mark_dirty(previous, version, staff_ids, rule_id)
+    # A read between the bump and the commit recompiles from the committed rules
+    # under the previous version, which this moves forward again
+    transaction.on_commit(lambda: mark_dirty(previous, version, staff_ids, rule_id))
+
+
+def mark_dirty(previous, version, staff_ids, rule_id=None):
+    """Moves the registry from previous to version, recompiling only staff_ids."""
+    with _registry_lock:
+        if _registry["version"] != previous:
+            return
+        _registry["dirty"].update(staff_ids)
+        if rule_id is not None:
+            # A rule moved to another staff member also leaves its previous owner stale
+            _registry["dirty"].update(
+                owner_id
+                for owner_id, staff_schedule in _registry["schedules"].items()
+                if any(
+                    rule.pk == rule_id
+                    for windows in staff_schedule.windows_by_weekday.values()
+                    for rule in windows
+                )
+            )
+        # Last, get_schedules only skips the lock once nothing is dirty
+        _registry["version"] = version
+
+
+class QualificationMatrix:
+    """Which services each staff member performs, and how long they take them."""
+
+    def __init__(self, rows):
+        # {staff_id: {service_id: duration override or None}}, only for restricted staff
+        self.services_by_staff = {}
+        for staff_id, service_id, duration_minutes in rows:
+            self.services_by_staff.setdefault(staff_id, {})[
+                service_id
+            ] = duration_minutes
+
+    def is_qualified(self, staff_id, service_id):
+        services = self.services_by_staff.get(staff_id)
+        return services is None or service_id in services
+
+    def total_required_time(self, staff_id, service):
+        duration = self.services_by_staff.get(staff_id, {}).get(service.pk)
+        if duration is None:
+            duration = service.duration_minutes
+        return timedelta(minutes=duration + (service.buffer_minutes or 0))
+
+
+# Skill matrix of the whole shop, valid for one qualifications version
+_qualifications = {"version": None, "matrix": QualificationMatrix([])}
+_qualifications_lock = Lock()
+
+
+def get_qualifications():
+    """Returns the QualificationMatrix, reloaded on a new qualifications version."""
+    version = _version("qualifications")
+    if _qualifications["version"] == version:
+        return _qualifications["matrix"]
+    with _qualifications_lock, routers.use_primary():
+        if _qualifications["version"] != version:
+            _qualifications["matrix"] = QualificationMatrix(
+                StaffService.objects.values_list(
+                    "staff_id", "service_id", "duration_minutes"
+                )
+            )
+            _qualifications["version"] = version
+        return _qualifications["matrix"]
+
+
+def load_qualifications(staff_ids):
+    """QualificationMatrix of staff_ids read straight from StaffService, for writes."""
+    return QualificationMatrix(
+        StaffService.objects.filter(staff_id__in=staff_ids).values_list(
+            "staff_id", "service_id", "duration_minutes"
+        )
+    )
+
+
+def invalidate_qualifications():
+    """Called in the transaction that changes staff-service qualifications."""
+    _bump_version("qualifications")
+    availability_cache.invalidate_schedule()
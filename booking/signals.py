@@ -0,0 +1,137 @@
+from django.conf import settings
+from django.db import transaction
+from django.db.backends.signals import connection_created
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from . import cache as availability_cache
+from . import events, outbox, rollups, schedule
+from .models import (
+    AvailabilityException,
+    AvailabilityRule,
+    Booking,
+    Service,
+    Staff,
+    StaffService,
+)
+
+
+@receiver(pre_save, sender=Booking)
+def invalidate_previous_booking_day(sender, instance, **kwargs):
+    """An edited booking may have moved away from its old staff/date."""
+    instance._previous_stats_row = None
+    if instance._state.adding or instance.pk is None:
+        return
+    previous = (
+        Booking.objects.filter(pk=instance.pk)
+        .values_list("staff_id", "date", "start_time", "end_time", "price")
+        .first()
+    )
+    if previous and previous[:2] != (instance.staff_id, instance.date):
+        availability_cache.invalidate_staff_day(*previous[:2])
+    # Read by update_booking_stats and publish_booking_change
+    instance._previous_stats_row = previous
+
+
+@receiver(post_save, sender=Booking)
+@receiver(post_delete, sender=Booking)
+def invalidate_booking_day(sender, instance, **kwargs):
+    # Past days offer no slots to invalidate, e.g. when archive_bookings deletes them
+    if instance.date < timezone.localdate():
+        return
+    availability_cache.invalidate_staff_day(instance.staff_id, instance.date)
+
+
+@receiver(post_save, sender=Booking)
+@receiver(post_delete, sender=Booking)
+def publish_booking_change(sender, instance, signal, created=False, **kwargs):
+    changed = [instance]
+    previous = getattr(instance, "_previous_stats_row", None)
+    if signal is post_save and previous and previous[1] != instance.date:
+        # Moved to another date, whose clients also have to refetch the old one
+        staff_id, date, start_time, end_time = previous[:4]
+        changed.append(
+            Booking(
+                staff_id=staff_id, date=date, start_time=start_time, end_time=end_time
+            )
+        )
+    changed = [booking for booking in changed if booking.date >= timezone.localdate()]
+    if not changed:
+        return
+    # A new booking is a delta clients apply, any other change makes them
+    # refetch the day
+    event = "taken" if created else "released"
+    transaction.on_commit(lambda: events.publish_bookings(event, changed))
+
+
+@receiver(post_save, sender=Booking)
+def update_booking_stats(sender, instance, created, **kwargs):
+    if created:
+        rollups.record([instance])
+        return
+    previous = getattr(instance, "_previous_stats_row", None)
+    current = rollups.booking_row(instance)
+    if previous != current:
+        if previous:
+            rollups.unrecord([previous])
+        rollups.record([instance])
+
+
+@receiver(post_delete, sender=Booking)
+def remove_booking_stats(sender, instance, origin=None, **kwargs):
+    # Archived bookings keep counting
+    if rollups.is_archiving():
+        return
+    # The stats rows of a deleted staff member are deleted with them
+    if isinstance(origin, Staff) or getattr(origin, "model", None) is Staff:
+        return
+    rollups.unrecord([rollups.booking_row(instance)])
+
+
+@receiver(post_save, sender=Booking)
+def reschedule_booking_reminder(sender, instance, created, **kwargs):
+    if not created:
+        outbox.reschedule_reminders(instance)
+
+
+@receiver(post_save, sender=AvailabilityRule)
+@receiver(post_delete, sender=AvailabilityRule)
+@receiver(post_save, sender=Staff)
+@receiver(post_delete, sender=Staff)
+def invalidate_schedules(sender, instance, **kwargs):
+    # Only the compiled schedules of the affected staff have to be rebuilt
+    if sender is AvailabilityRule:
+        schedule.invalidate_schedules([instance.staff_id], rule_id=instance.pk)
+    else:
+        schedule.invalidate_schedules([instance.pk])
+
+
+@receiver(post_save, sender=AvailabilityException)
+@receiver(post_delete, sender=AvailabilityException)
+@receiver(post_save, sender=Service)
+@receiver(post_delete, sender=Service)
+def invalidate_cached_slots(sender, **kwargs):
+    # Exceptions are loaded per request, so like services they leave schedules valid
+    availability_cache.invalidate_schedule()
+
+
+@receiver(post_save, sender=StaffService)
+@receiver(post_delete, sender=StaffService)
+@receiver(m2m_changed, sender=Staff.services.through)
+def invalidate_qualifications(sender, **kwargs):
+    # staff.services.add() and friends bulk insert the rows without post_save
+    if kwargs.get("action", "post_").startswith("post_"):
+        schedule.invalidate_qualifications()
+
+
+@receiver(connection_created)
+def configure_sqlite(sender, connection, **kwargs):
+    """
+    Applies BOOKING_SQLITE_PRAGMAS, e.g. WAL so slot reads never block a booking write.
+    """
+    if connection.vendor != "sqlite":
+        return
+    for name, value in settings.BOOKING_SQLITE_PRAGMAS.items():
+        # Connection setup, run on the raw connection like Django's own PRAGMAs
+        connection.connection.execute(f"PRAGMA {name} = {value}")
@@ -1,15 +1,42 @@
 // api.js
 
+// Last response per url, revalidated with If-None-Match so unchanged data comes back as 304
+const responseCache = new Map();
+
+async function fetchJsonWithEtag(url, errorMessage) {
+  const cached = responseCache.get(url);
+  const res = await fetch(url, {
+    headers: cached ? { "If-None-Match": cached.etag } : {},
+  });
+  if (res.status === 304 && cached) return cached.data;
+  if (!res.ok) throw new Error(errorMessage);
+
+  const data = await res.json();
+  const etag = res.headers.get("ETag");
+  if (etag) responseCache.set(url, { etag, data });
+  return data;
+}
+
 export async function fetchServices() {
-  const res = await fetch("/api/services/");
-  if (!res.ok) throw new Error("Failed to fetch services");
-  return await res.json();
+  return fetchJsonWithEtag("/api/services/", "Failed to fetch services");
 }
 
 export async function fetchAvailableSlots(serviceId, date) {
-  const res = await fetch(`/api/available-slots/?date=${date}&service_id=${serviceId}`);
-  if (!res.ok) throw new Error("Failed to fetch available slots");
-  return await res.json();
+  return fetchJsonWithEtag(
+    `/api/available-slots/?date=${date}&service_id=${serviceId}&staff=any`,
+    "Failed to fetch available slots"
+  );
+}
+
+// Live booking changes of one date; served by the ASGI app only
+export function subscribeToSlotEvents(serviceId, date, handlers) {
+  const source = new EventSource(
+    `/api/async/slot-events/?date=${date}&service_id=${serviceId}`
+  );
+  for (const [event, handler] of Object.entries(handlers)) {
+    source.addEventListener(event, (e) => handler(JSON.parse(e.data)));
+  }
+  return source;
 }
 
 export async function bookAppointment(payload) {
@@ -1,4 +1,9 @@
-import { fetchServices, fetchAvailableSlots, bookAppointment } from "./api.js";
+import {
+  fetchServices,
+  fetchAvailableSlots,
+  bookAppointment,
+  subscribeToSlotEvents,
+} from "./api.js";
 import { addMinutesToTime, timeToMinutes } from "./utils.js";
 
 document.addEventListener("DOMContentLoaded", () => {
@@ -12,6 +17,7 @@ document.addEventListener("DOMContentLoaded", () => {
   const messageDiv = document.getElementById("message");
 
   let allServices = [];
+  let slotEvents = null;
 
   fetchServices()
     .then((data) => {
@@ -48,55 +54,97 @@ document.addEventListener("DOMContentLoaded", () => {
       return;
     }
   
-    const totalDuration = selectedService.duration_minutes + (selectedService.buffer_minutes || 0);
-  
     fetchAvailableSlots(serviceId, date)
       .then((data) => {
-        slotsSelect.innerHTML = "";
-  
-        if (!data.slots || data.slots.length === 0) {
-          slotsSelect.innerHTML = `<option value="">No slots available</option>`;
-          staffNameDisplay.textContent = "--";
-        } else {
-          // Filter slots based on service duration + buffer
-          const filteredSlots = [];
-          let lastSlotMinutes = -Infinity;
-  
-          data.slots.forEach((slot) => {
-            const currentSlotMinutes = timeToMinutes(slot);
-            
-            // Check spacing AND availability for full service duration
-            if (currentSlotMinutes - lastSlotMinutes >= totalDuration) {
-              filteredSlots.push(slot);
-              lastSlotMinutes = currentSlotMinutes;
-            }
-          });
-
-          if (filteredSlots.length === 0) {
-            slotsSelect.innerHTML = `<option value="">No suitable slots available for this service</option>`;
-            staffNameDisplay.textContent = "--";
-          } else {
-            filteredSlots.forEach((slot) => {
-              const option = document.createElement("option");
-              option.value = slot;
-              option.textContent = `${slot} — ${addMinutesToTime(slot, selectedService.duration_minutes)} (${selectedService.duration_minutes} mins)`;
-              option.dataset.staffId = data.staff.id;
-              option.dataset.staffName = data.staff.name;
-              slotsSelect.appendChild(option);
-            });
-
-            if (data.staff) {
-              staffNameDisplay.textContent = data.staff.name;
-              slotsSelect.dataset.staffId = data.staff.id;
-              slotsSelect.dataset.staffName = data.staff.name;
-            }
-          }
-        }
+        renderSlots(data, selectedService);
+        listenForSlotChanges(serviceId, date, data, selectedService);
       })
       .catch((error) => {
         console.error("Error fetching available slots:", error);
       });
   }
+
+  // Applies bookings made by other customers while this day is on screen
+  function listenForSlotChanges(serviceId, date, data, selectedService) {
+    if (slotEvents) slotEvents.close();
+
+    slotEvents = subscribeToSlotEvents(serviceId, date, {
+      taken: (booking) => {
+        // Only the booked staff member's slots change, by their own duration
+        const staff = data.staff[booking.staff_id];
+        if (!staff) return;
+        const start = timeToMinutes(booking.start_time);
+        const end = timeToMinutes(booking.end_time);
+
+        // A copy, data is also the cached response revalidated with its ETag
+        const staffBySlot = { ...data.staff_by_slot };
+        const assignments = { ...data.assignments };
+        const slots = data.slots.filter((slot) => {
+          const minutes = timeToMinutes(slot);
+          if (minutes <= start - staff.total_minutes || minutes >= end) return true;
+
+          const staffIds = staffBySlot[slot].filter((id) => id !== booking.staff_id);
+          staffBySlot[slot] = staffIds;
+          if (assignments[slot] === booking.staff_id) assignments[slot] = staffIds[0];
+          return staffIds.length > 0;
+        });
+        data = { ...data, slots, staff_by_slot: staffBySlot, assignments };
+        renderSlots(data, selectedService);
+      },
+      released: () => loadAvailableSlots(),
+      resync: () => loadAvailableSlots(),
+    });
+  }
+
+  function renderSlots(data, selectedService) {
+    const totalDuration = selectedService.duration_minutes + (selectedService.buffer_minutes || 0);
+    const selectedSlot = slotsSelect.value;
+    slotsSelect.innerHTML = "";
+  
+    if (!data.slots || data.slots.length === 0) {
+      slotsSelect.innerHTML = `<option value="">No slots available</option>`;
+      staffNameDisplay.textContent = "--";
+    } else {
+      // Filter slots based on service duration + buffer
+      const filteredSlots = [];
+      let lastSlotMinutes = -Infinity;
+  
+      data.slots.forEach((slot) => {
+        const currentSlotMinutes = timeToMinutes(slot);
+        
+        // Check spacing AND availability for full service duration
+        if (currentSlotMinutes - lastSlotMinutes >= totalDuration) {
+          filteredSlots.push(slot);
+          lastSlotMinutes = currentSlotMinutes;
+        }
+      });
+
+      if (filteredSlots.length === 0) {
+        slotsSelect.innerHTML = `<option value="">No suitable slots available for this service</option>`;
+        staffNameDisplay.textContent = "--";
+      } else {
+        filteredSlots.forEach((slot) => {
+          // Each slot is assigned to the least loaded staff member who is free then
+          const staff = data.staff[data.assignments[slot]];
+          const option = document.createElement("option");
+          option.value = slot;
+          option.textContent = `${slot} — ${addMinutesToTime(slot, selectedService.duration_minutes)} (${selectedService.duration_minutes} mins)`;
+          option.dataset.staffId = staff.id;
+          option.dataset.staffName = staff.name;
+          slotsSelect.appendChild(option);
+        });
+
+        // Keep the customer's choice when a live update re-renders the list
+        const chosenOption =
+          [...slotsSelect.options].find((option) => option.value === selectedSlot) ||
+          slotsSelect.options[0];
+        chosenOption.selected = true;
+        staffNameDisplay.textContent = chosenOption.dataset.staffName;
+        slotsSelect.dataset.staffId = chosenOption.dataset.staffId;
+        slotsSelect.dataset.staffName = chosenOption.dataset.staffName;
+      }
+    }
+  }
  
   serviceSelect.addEventListener("change", loadAvailableSlots);
   dateInput.addEventListener("change", loadAvailableSlots);
@@ -1,3 +1,2500 @@
-from django.test import TestCase
+import asyncio
+import csv
+import json
+import random
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock, skipUnless
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+from io import StringIO
+from pathlib import Path
+from tempfile import TemporaryDirectory
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core import mail
+from django.core.exceptions import ValidationError
+from django.core.mail.backends.base import BaseEmailBackend
+from django.core.management import CommandError, call_command
+from django.contrib.auth.models import User
+from django.db import (
+    IntegrityError,
+    OperationalError,
+    connection,
+    connections,
+    transaction,
+)
+from django.db.models import F
+from django.db.utils import ConnectionDoesNotExist
+from django.http import HttpResponse
+from django.test import (
+    RequestFactory,
+    TestCase,
+    TransactionTestCase,
+    override_settings,
+)
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from . import cache as availability_cache
+from . import events, metrics, outbox, routers, schedule
+from .admin import make_inactive
+from .middleware import PrimaryStickinessMiddleware
+from .models import (
+    AvailabilityException,
+    AvailabilityRule,
+    Booking,
+    BookingArchive,
+    BookingHistory,
+    DailyStaffStats,
+    NotificationOutbox,
+    Recurrence,
+    ScheduleVersion,
+    Service,
+    SlotHold,
+    Staff,
+    StaffService,
+)
+from .utils import (
+    compute_slot_times,
+    create_booking,
+    create_bookings,
+    create_recurring_booking,
+    create_slot_hold,
+    generate_slot_times,
+    get_available_slots,
+    get_available_slots_by_staff,
+    get_available_staff,
+    merge_intervals,
+)
+
+
+def next_weekday(weekday, weeks_ahead=1):
+    """Returns a future date falling on the given weekday."""
+    today = timezone.localdate()
+    return today + timedelta(days=(weekday - today.weekday()) % 7 + 7 * weeks_ahead)
+
+
+class FailingEmailBackend(BaseEmailBackend):
+    def send_messages(self, email_messages):
+        raise ConnectionRefusedError("SMTP server unavailable")
+
+
+def add_booking(service, staff, day, start, customer="Customer"):
+    start_dt = datetime.combine(day, start)
+    end_dt = start_dt + timedelta(
+        minutes=service.duration_minutes + service.buffer_minutes
+    )
+    return Booking.objects.create(
+        service=service,
+        staff=staff,
+        customer_name=customer,
+        customer_email="customer@example.com",
+        date=day,
+        start_time=start,
+        end_time=end_dt.time(),
+    )
+
+
+class BookingTestCase(TestCase):
+    """Starts every test with an empty availability cache and no compiled schedules."""
+
+    def setUp(self):
+        availability_cache.get_cache().clear()
+        availability_cache.reset_stats()
+        schedule.reset()
+
+
+def reference_slots(day, service, staff):
+    """
+    Per-slot conflict scan the slot engine has to match exactly, written straight
+    from the rule and booking rows so it shares none of the engine's code.
+    """
+    total = timedelta(minutes=service.duration_minutes + service.buffer_minutes)
+    booked = [
+        (
+            datetime.combine(day, booking.start_time),
+            datetime.combine(day, booking.end_time),
+        )
+        for booking in Booking.objects.filter(staff=staff, date=day)
+    ]
+    slots = []
+    for rule in AvailabilityRule.objects.filter(
+        staff=staff, day_of_week=day.weekday(), is_active=True
+    ):
+        current = datetime.combine(day, rule.start_time)
+        end = datetime.combine(day, rule.end_time)
+        while current + total <= end:
+            if not any(
+                current < booked_end and current + total > booked_start
+                for booked_start, booked_end in booked
+            ):
+                slots.append(current.strftime("%H:%M"))
+            current += timedelta(minutes=5)
+    return slots
+
+
+class SlotEngineTests(BookingTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.haircut = Service.objects.create(
+            name="Hair Cut", duration_minutes=30, price=20, buffer_minutes=10
+        )
+        cls.massage = Service.objects.create(
+            name="Massage", duration_minutes=60, price=50, buffer_minutes=0
+        )
+        cls.staff = Staff.objects.create(name="Alice")
+        cls.day = next_weekday(1)
+        AvailabilityRule.objects.create(
+            staff=cls.staff,
+            day_of_week=cls.day.weekday(),
+            start_time=time(9, 0),
+            end_time=time(13, 0),
+        )
+        AvailabilityRule.objects.create(
+            staff=cls.staff,
+            day_of_week=cls.day.weekday(),
+            start_time=time(14, 0),
+            end_time=time(18, 0),
+        )
+        for start, service in [
+            (time(9, 30), cls.haircut),
+            (time(10, 0), cls.massage),
+            (time(12, 55), cls.haircut),
+            (time(15, 15), cls.massage),
+            (time(16, 0), cls.haircut),
+        ]:
+            add_booking(service, cls.staff, cls.day, start)
+
+    def test_matches_per_slot_scan(self):
+        for service in (self.haircut, self.massage):
+            self.assertEqual(
+                get_available_slots(self.day, service.id, self.staff),
+                reference_slots(self.day, service, self.staff),
+            )
+
+    def test_booked_ranges_are_excluded(self):
+        slots = get_available_slots(self.day, self.haircut.id, self.staff)
+        self.assertNotIn("09:00", slots)
+        self.assertNotIn("10:30", slots)
+        self.assertIn("11:00", slots)
+        self.assertIn("12:15", slots)
+        self.assertNotIn("12:20", slots)
+
+    def test_query_count_is_constant(self):
+        # service, qualifications version, skill matrix, schedule version, compiled
+        # schedules, exceptions, bookings
+        with self.assertNumQueries(7):
+            get_available_slots(self.day, self.haircut.id, self.staff)
+
+        # The compiled schedules and skill matrix stay current while no rule changes,
+        # which costs one version check each
+        for hour in range(14, 18):
+            add_booking(
+                self.haircut, self.staff, self.day + timedelta(days=7), time(hour)
+            )
+        with self.assertNumQueries(5):
+            get_available_slots(
+                self.day + timedelta(days=7), self.haircut.id, self.staff
+            )
+
+    def test_unknown_service_returns_no_slots(self):
+        self.assertEqual(get_available_slots(self.day, 0, self.staff), [])
+
+
+class AnyStaffAvailabilityTests(BookingTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.service = Service.objects.create(
+            name="Consultation", duration_minutes=30, price=10
+        )
+        cls.day = next_weekday(2)
+        cls.busy = Staff.objects.create(name="Busy")
+        cls.free = Staff.objects.create(name="Free")
+        for staff in (cls.busy, cls.free):
+            AvailabilityRule.objects.create(
+                staff=staff,
+                day_of_week=cls.day.weekday(),
+                start_time=time(9, 0),
+                end_time=time(10, 0),
+            )
+        add_booking(cls.service, cls.busy, cls.day, time(9, 0))
+        add_booking(cls.service, cls.busy, cls.day, time(9, 30))
+
+    def get_slots(self):
+        return self.client.get(
+            "/api/available-slots/",
+            {
+                "date": self.day.isoformat(),
+                "service_id": self.service.id,
+                "staff": "any",
+            },
+        ).json()
+
+    def test_slots_are_merged_across_staff(self):
+        data = self.get_slots()
+        self.assertEqual(data["slots"][0], "09:00")
+        self.assertEqual(data["staff_by_slot"]["09:00"], [self.free.id])
+        self.assertEqual(data["assignments"]["09:30"], self.free.id)
+
+    def test_staff_durations_are_sent(self):
+        StaffService.objects.create(
+            staff=self.free, service=self.service, duration_minutes=20
+        )
+        staff = self.get_slots()["staff"]
+        self.assertEqual(staff[str(self.free.id)]["total_minutes"], 20)
+        self.assertEqual(staff[str(self.busy.id)]["total_minutes"], 30)
+
+    def test_least_loaded_staff_is_assigned(self):
+        Booking.objects.filter(staff=self.busy).delete()
+        add_booking(self.service, self.free, self.day, time(9, 45))
+        data = self.get_slots()
+        self.assertEqual(data["staff_by_slot"]["09:00"], [self.busy.id, self.free.id])
+        self.assertEqual(data["assignments"]["09:00"], self.busy.id)
+
+    def test_query_count_does_not_grow_with_staff(self):
+        # service, qualifications version, skill matrix, schedule version, compiled
+        # schedules, exceptions, bookings, qualifications version for the durations
+        with self.assertNumQueries(8):
+            self.get_slots()
+
+        for index in range(10):
+            staff = Staff.objects.create(name=f"Extra {index}")
+            AvailabilityRule.objects.create(
+                staff=staff,
+                day_of_week=self.day.weekday(),
+                start_time=time(9, 0),
+                end_time=time(17, 0),
+            )
+            add_booking(self.service, staff, self.day, time(12, 0))
+        # The skill matrix is still current, only the schedules are recompiled
+        with self.assertNumQueries(7):
+            self.get_slots()
+
+
+class AvailabilityExceptionTests(BookingTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.service = Service.objects.create(
+            name="Hair Cut", duration_minutes=30, price=20
+        )
+        cls.alice = Staff.objects.create(name="Alice")
+        cls.bob = Staff.objects.create(name="Bob")
+        cls.day = next_weekday(0)
+        AvailabilityRule.objects.create(
+            staff=cls.alice,
+            day_of_week=cls.day.weekday(),
+            start_time=time(9, 0),
+            end_time=time(12, 0),
+        )
+
+    def slots(self, staff):
+        return get_available_slots(self.day, self.service.id, staff)
+
+    def book(self, staff, start):
+        return create_booking(
+            self.service, "Customer", "customer@example.com", self.day, start, staff
+        )
+
+    def test_shop_holiday_closes_everyone(self):
+        self.assertEqual(list(get_available_staff(self.day)), [self.alice])
+        AvailabilityException.objects.create(
+            start_date=self.day - timedelta(days=1),
+            end_date=self.day,
+            kind="closed",
+            reason="Holiday",
+        )
+        self.assertEqual(self.slots(self.alice), [])
+        self.assertEqual(get_available_slots_by_staff(self.day, self.service), {})
+        self.assertFalse(get_available_staff(self.day).exists())
+        with self.assertRaisesMessage(Exception, "not available"):
+            self.book(self.alice, time(9, 0))
+
+        # The week after is unaffected
+        next_week = self.day + timedelta(weeks=1)
+        self.assertEqual(list(get_available_staff(next_week)), [self.alice])
+
+    def test_time_off_removes_only_those_hours(self):
+        AvailabilityException.objects.create(
+            staff=self.alice,
+            start_date=self.day,
+            end_date=self.day,
+            kind="closed",
+            start_time=time(10, 0),
+            end_time=time(11, 0),
+        )
+        slots = self.slots(self.alice)
+        self.assertIn("09:30", slots)
+        self.assertNotIn("09:35", slots)
+        self.assertNotIn("10:55", slots)
+        self.assertEqual(slots[slots.index("09:30") + 1], "11:00")
+        self.assertEqual(list(get_available_staff(self.day)), [self.alice])
+
+        with self.assertRaisesMessage(Exception, "not available"):
+            self.book(self.alice, time(10, 30))
+        self.book(self.alice, time(11, 0))
+
+    def test_cut_window_keeps_its_slot_grid(self):
+        AvailabilityRule.objects.filter(staff=self.alice).update(start_time=time(9, 2))
+        schedule.invalidate_schedules([self.alice.id])
+        AvailabilityException.objects.create(
+            staff=self.alice,
+            start_date=self.day,
+            end_date=self.day,
+            kind="closed",
+            start_time=time(9, 0),
+            end_time=time(10, 0),
+        )
+        self.assertEqual(self.slots(self.alice)[0], "10:02")
+        with self.assertRaisesMessage(Exception, "not available"):
+            self.book(self.alice, time(10, 0))
+        self.book(self.alice, time(10, 2))
+
+    def test_extra_hours_for_staff_without_rules(self):
+        AvailabilityException.objects.create(
+            staff=self.bob,
+            start_date=self.day,
+            end_date=self.day,
+            kind="open",
+            start_time=time(18, 0),
+            end_time=time(19, 0),
+        )
+        self.assertEqual(
+            self.slots(self.bob),
+            ["18:00", "18:05", "18:10", "18:15", "18:20", "18:25", "18:30"],
+        )
+        self.assertEqual(
+            self.slots(self.bob),
+            get_available_slots_by_staff(self.day, self.service)[self.bob.id][1],
+        )
+        self.assertEqual(set(get_available_staff(self.day)), {self.alice, self.bob})
+        self.book(self.bob, time(18, 30))
+        self.assertNotIn("18:10", self.slots(self.bob))
+
+    def test_extra_hours_extend_weekly_windows(self):
+        AvailabilityException.objects.create(
+            staff=self.alice,
+            start_date=self.day,
+            end_date=self.day,
+            kind="open",
+            start_time=time(11, 0),
+            end_time=time(13, 0),
+        )
+        slots = self.slots(self.alice)
+        self.assertEqual(len(slots), len(set(slots)))
+        self.assertIn("11:45", slots)
+        self.assertEqual(slots[-1], "12:30")
+
+    def test_extra_hours_before_a_window_extend_it(self):
+        AvailabilityRule.objects.filter(staff=self.alice).update(start_time=time(9, 2))
+        schedule.invalidate_schedules([self.alice.id])
+        AvailabilityException.objects.create(
+            staff=self.alice,
+            start_date=self.day,
+            end_date=self.day,
+            kind="open",
+            start_time=time(8, 0),
+            end_time=time(9, 2),
+        )
+        slots = self.slots(self.alice)
+        self.assertEqual(slots[0], "08:02")
+        self.assertIn("08:47", slots)
+        self.assertIn("09:02", slots)
+        self.book(self.alice, time(8, 47))
+
+    def test_extra_hours_need_a_staff_member(self):
+        exception = AvailabilityException(
+            start_date=self.day,
+            end_date=self.day,
+            kind="open",
+            start_time=time(18, 0),
+            end_time=time(19, 0),
+        )
+        with self.assertRaisesMessage(
+            ValidationError, "Extra hours need a staff member."
+        ):
+            exception.full_clean()
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            exception.save()
+
+
+class SkillMatrixTests(BookingTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.haircut = Service.objects.create(
+            name="Hair Cut", duration_minutes=30, price=20
+        )
+        cls.colour = Service.objects.create(
+            name="Colour", duration_minutes=60, price=50
+        )
+        cls.alice = Staff.objects.create(name="Alice")
+        cls.bob = Staff.objects.create(name="Bob")
+        cls.day = next_weekday(0)
+        for staff in (cls.alice, cls.bob):
+            AvailabilityRule.objects.create(
+                staff=staff,
+                day_of_week=cls.day.weekday(),
+                start_time=time(9, 0),
+                end_time=time(12, 0),
+            )
+        StaffService.objects.create(staff=cls.alice, service=cls.haircut)
+
+    def test_unqualified_staff_get_no_slots(self):
+        self.assertEqual(get_available_slots(self.day, self.colour.id, self.alice), [])
+        self.assertEqual(
+            set(get_available_slots_by_staff(self.day, self.colour)), {self.bob.id}
+        )
+        # Bob lists no services, so he still performs every one
+        self.assertIn("09:00", get_available_slots(self.day, self.colour.id, self.bob))
+
+    def test_available_staff_filtered_by_service(self):
+        self.assertEqual(
+            set(get_available_staff(self.day, self.haircut)), {self.alice, self.bob}
+        )
+        self.assertEqual(list(get_available_staff(self.day, self.colour)), [self.bob])
+        self.assertEqual(
+            list(get_available_staff(self.day, self.colour.id)), [self.bob]
+        )
+
+    def test_duration_override(self):
+        StaffService.objects.filter(staff=self.alice).update(duration_minutes=45)
+        schedule.invalidate_qualifications()
+
+        slots = get_available_slots(self.day, self.haircut.id, self.alice)
+        self.assertEqual(slots[-1], "11:15")
+        booking = create_booking(
+            self.haircut,
+            "Customer",
+            "customer@example.com",
+            self.day,
+            time(9, 0),
+            self.alice,
+        )
+        self.assertEqual(booking.end_time, time(9, 45))
+
+    def test_write_paths_do_not_trust_the_cached_matrix(self):
+        schedule.get_qualifications()
+        # Changed behind this process' back, the cached matrix still says 30 minutes
+        StaffService.objects.filter(staff=self.alice).update(duration_minutes=45)
+
+        booking = create_booking(
+            self.haircut,
+            "Customer",
+            "customer@example.com",
+            self.day,
+            time(9, 0),
+            self.alice,
+        )
+        self.assertEqual(booking.end_time, time(9, 45))
+        [result] = create_bookings(
+            [
+                {
+                    "service": self.haircut,
+                    "customer_name": "Customer",
+                    "customer_email": "customer@example.com",
+                    "date": self.day,
+                    "start_time": time(10, 0),
+                    "staff": self.alice,
+                }
+            ]
+        )
+        self.assertEqual(result.end_time, time(10, 45))
+
+    def test_create_booking_rejects_unqualified_staff(self):
+        with self.assertRaisesMessage(Exception, "does not offer this service"):
+            create_booking(
+                self.colour,
+                "Customer",
+                "customer@example.com",
+                self.day,
+                time(9, 0),
+                self.alice,
+            )
+
+    def test_matrix_reloads_when_services_change(self):
+        self.assertEqual(get_available_slots(self.day, self.colour.id, self.alice), [])
+        self.alice.services.add(self.colour)
+        self.assertIn(
+            "09:00", get_available_slots(self.day, self.colour.id, self.alice)
+        )
+        self.bob.services.add(self.haircut)
+        self.assertEqual(get_available_slots(self.day, self.colour.id, self.bob), [])
+
+
+class AvailabilityRangeTests(BookingTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.service = Service.objects.create(
+            name="Massage", duration_minutes=60, price=50
+        )
+        cls.staff = Staff.objects.create(name="Alice")
+        cls.start = next_weekday(0)
+        for weekday in (0, 2, 4):
+            AvailabilityRule.objects.create(
+                staff=cls.staff,
+                day_of_week=weekday,
+                start_time=time(9, 0),
+                end_time=time(12, 0),
+            )
+        add_booking(cls.service, cls.staff, cls.start, time(10, 0))
+        add_booking(cls.service, cls.staff, cls.start + timedelta(days=4), time(9, 0))
+
+    def get_range(self, days):
+        return self.client.get(
+            "/api/availability-range/",
+            {
+                "service_id": self.service.id,
+                "from": self.start.isoformat(),
+                "to": (self.start + timedelta(days=days - 1)).isoformat(),
+            },
+        )
+
+    def test_streams_one_line_per_day(self):
+        response = self.get_range(7)
+        self.assertTrue(response.streaming)
+        self.assertEqual(response["Content-Type"], "application/x-ndjson")
+        lines = [
+            json.loads(line)
+            for line in b"".join(response.streaming_content).splitlines()
+        ]
+
+        self.assertEqual(len(lines), 7)
+        for offset, line in enumerate(lines):
+            day = self.start + timedelta(days=offset)
+            self.assertEqual(line["date"], day.isoformat())
+            self.assertEqual(
+                line["slots"], get_available_slots(day, self.service.id, self.staff)
+            )
+
+    def test_query_count_does_not_grow_with_range(self):
+        # service, qualifications version, skill matrix, schedule version, compiled
+        # schedules, exceptions, bookings
+        with self.assertNumQueries(7):
+            b"".join(self.get_range(2).streaming_content)
+        with self.assertNumQueries(5):
+            b"".join(self.get_range(28).streaming_content)
+
+    @override_settings(BOOKING_AVAILABILITY_RANGE_MAX_DAYS=7)
+    def test_range_length_is_capped(self):
+        self.assertEqual(self.get_range(7).status_code, 200)
+        self.assertEqual(self.get_range(8).status_code, 400)
+
+
+class AvailabilityCacheTests(BookingTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.service = Service.objects.create(
+            name="Hair Cut", duration_minutes=30, price=20
+        )
+        cls.staff = Staff.objects.create(name="Alice")
+        cls.day = next_weekday(3)
+        cls.rule = AvailabilityRule.objects.create(
+            staff=cls.staff,
+            day_of_week=cls.day.weekday(),
+            start_time=time(9, 0),
+            end_time=time(11, 0),
+        )
+
+    def test_repeated_lookups_hit_the_cache(self):
+        slots = get_available_slots(self.day, self.service.id, self.staff)
+        with self.assertNumQueries(0):
+            self.assertEqual(
+                get_available_slots(self.day, self.service.id, self.staff), slots
+            )
+        self.assertEqual(availability_cache.stats(), {"hits": 1, "misses": 1})
+
+    def test_booking_invalidates_only_its_staff_day(self):
+        other_day = self.day + timedelta(days=7)
+        get_available_slots(self.day, self.service.id, self.staff)
+        get_available_slots(other_day, self.service.id, self.staff)
+
+        booking = add_booking(self.service, self.staff, self.day, time(9, 0))
+        self.assertNotIn(
+            "09:00", get_available_slots(self.day, self.service.id, self.staff)
+        )
+        with self.assertNumQueries(0):
+            get_available_slots(other_day, self.service.id, self.staff)
+
+        booking.delete()
+        self.assertIn(
+            "09:00", get_available_slots(self.day, self.service.id, self.staff)
+        )
+
+    def test_booking_invalidates_again_on_commit(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            add_booking(self.service, self.staff, self.day, time(9, 0))
+            # A reader that still saw the committed rows caches them after the bump
+            availability_cache.set_slots(
+                availability_cache.staff_slots_key(
+                    self.service.id, self.staff.id, self.day
+                ),
+                [time(9, 0)],
+            )
+        self.assertNotIn(
+            "09:00", get_available_slots(self.day, self.service.id, self.staff)
+        )
+
+    def test_rule_and_service_changes_invalidate(self):
+        get_available_slots(self.day, self.service.id, self.staff)
+        self.rule.end_time = time(10, 0)
+        self.rule.save()
+        self.assertNotIn(
+            "10:00", get_available_slots(self.day, self.service.id, self.staff)
+        )
+
+        self.service.duration_minutes = 60
+        self.service.save()
+        self.assertNotIn(
+            "09:30", get_available_slots(self.day, self.service.id, self.staff)
+        )
+
+    def test_admin_bulk_edit_invalidates(self):
+        get_available_slots(self.day, self.service.id, self.staff)
+        make_inactive(None, None, AvailabilityRule.objects.filter(pk=self.rule.pk))
+        self.assertEqual(get_available_slots(self.day, self.service.id, self.staff), [])
+
+
+class CreateBookingTests(BookingTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.service = Service.objects.create(
+            name="Hair Cut", duration_minutes=30, price=20, buffer_minutes=10
+        )
+        cls.staff = Staff.objects.create(name="Alice")
+        cls.day = next_weekday(4)
+        AvailabilityRule.objects.create(
+            staff=cls.staff,
+            day_of_week=cls.day.weekday(),
+            start_time=time(9, 0),
+            end_time=time(12, 0),
+        )
+
+    def book(self, start):
+        return create_booking(
+            self.service,
+            "Customer",
+            "customer@example.com",
+            self.day,
+            start,
+            self.staff,
+        )
+
+    def test_bookable_times_match_available_slots(self):
+        self.book(time(10, 0))
+        slots = get_available_slots(self.day, self.service.id, self.staff)
+        for minutes in range(8 * 60, 13 * 60):
+            start = time(minutes // 60, minutes % 60)
+            if start.strftime("%H:%M") in slots:
+                continue
+            with self.assertRaises(Exception):
+                self.book(start)
+        self.assertEqual(Booking.objects.count(), 1)
+
+    def test_overlapping_interval_is_rejected(self):
+        self.book(time(10, 0))
+        with self.assertRaisesMessage(Exception, "not available"):
+            self.book(time(9, 25))
+        self.book(time(10, 40))
+
+    def test_end_time_is_derived_on_save(self):
+        booking = add_booking(self.service, self.staff, self.day, time(9, 0))
+        booking.start_time = time(11, 0)
+        booking.end_time = time(11, 5)
+        booking.save()
+        booking.refresh_from_db()
+        self.assertEqual(booking.end_time, time(11, 40))
+
+    def test_end_time_is_kept_while_the_span_is_unchanged(self):
+        add_booking(self.service, self.staff, self.day, time(9, 0))
+        Service.objects.filter(pk=self.service.pk).update(duration_minutes=90)
+        booking = Booking.objects.get()
+        booking.customer_name = "Renamed"
+        booking.save()
+        booking.refresh_from_db()
+        self.assertEqual(booking.end_time, time(9, 40))
+
+    def test_write_path_does_not_compute_the_day(self):
+        # savepoint, staff lock, qualifications, rules, exceptions, overlap check,
+        # insert, notifications insert, stats upsert, release
+        with self.assertNumQueries(10):
+            self.book(time(9, 0))
+
+
+class BatchBookingTests(BookingTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.haircut = Service.objects.create(
+            name="Hair Cut", duration_minutes=30, price=20
+        )
+        cls.colouring = Service.objects.create(
+            name="Colouring", duration_minutes=60, price=40, buffer_minutes=10
+        )
+        cls.alice = Staff.objects.create(name="Alice")
+        cls.bob = Staff.objects.create(name="Bob")
+        cls.day = next_weekday(2)
+        for staff in (cls.alice, cls.bob):
+            AvailabilityRule.objects.create(
+                staff=staff,
+                day_of_week=cls.day.weekday(),
+                start_time=time(9, 0),
+                end_time=time(12, 0),
+            )
+
+    def item(self, service, staff, start, **overrides):
+        return {
+            "service_id": service.id,
+            "staff_id": staff.id,
+            "customer_name": "Customer",
+            "customer_email": "customer@example.com",
+            "date": self.day.isoformat(),
+            "start_time": start,
+            **overrides,
+        }
+
+    def post(self, items, mode=None):
+        payload = {"bookings": items}
+        if mode:
+            payload["mode"] = mode
+        return self.client.post(
+            "/api/bookings/batch/", json.dumps(payload), content_type="application/json"
+        )
+
+    def test_package_and_group_are_booked_together(self):
+        response = self.post(
+            [
+                self.item(self.haircut, self.alice, "09:00"),
+                self.item(self.colouring, self.alice, "09:30"),
+                self.item(self.haircut, self.bob, "09:00"),
+            ]
+        )
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertTrue(data["success"])
+        self.assertEqual(data["booked"], 3)
+        self.assertEqual(
+            sorted(result["booking_id"] for result in data["results"]),
+            sorted(Booking.objects.values_list("id", flat=True)),
+        )
+        self.assertEqual(
+            Booking.objects.get(service=self.colouring).end_time, time(10, 40)
+        )
+
+    def test_all_or_nothing_books_nothing_on_conflict(self):
+        add_booking(self.haircut, self.bob, self.day, time(9, 0))
+        response = self.post(
+            [
+                self.item(self.haircut, self.alice, "09:00"),
+                self.item(self.haircut, self.bob, "09:15"),
+            ]
+        )
+        self.assertEqual(response.status_code, 400)
+        results = response.json()["results"]
+        self.assertEqual(results[0]["error"], "Not booked because another item failed.")
+        self.assertEqual(results[1]["error"], "This time slot is already booked!")
+        self.assertEqual(Booking.objects.count(), 1)
+
+    def test_best_effort_books_what_fits(self):
+        response = self.post(
+            [
+                self.item(self.colouring, self.alice, "09:00"),
+                self.item(self.haircut, self.alice, "09:30"),  # overlaps the item above
+                self.item(self.haircut, self.alice, "11:02"),  # off the slot grid
+                self.item(self.haircut, self.alice, "11:30", customer_name=""),
+                self.item(self.haircut, self.bob, "09:30", staff_id=999999),
+                self.item(self.haircut, self.bob, "10:00"),
+            ],
+            mode="best_effort",
+        )
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertFalse(data["success"])
+        self.assertEqual(
+            [result.get("error") for result in data["results"]],
+            [
+                None,
+                "This time slot is already booked!",
+                "This time slot is not available for booking.",
+                "Missing required fields",
+                "Invalid staff or service",
+                None,
+            ],
+        )
+        self.assertEqual(Booking.objects.count(), 2)
+
+    def test_batch_invalidates_availability(self):
+        get_available_slots(self.day, self.haircut.id, self.alice)
+        self.post([self.item(self.haircut, self.alice, "10:00")])
+        self.assertNotIn(
+            "10:00", get_available_slots(self.day, self.haircut.id, self.alice)
+        )
+
+    def test_queries_do_not_grow_with_items(self):
+        items = [
+            self.item(self.haircut, staff, f"{hour:02d}:00")
+            for staff in (self.alice, self.bob)
+            for hour in (9, 10, 11)
+        ]
+        # services, staff, savepoint, staff locks, qualifications, rules, exceptions,
+        # bookings, insert, notifications insert, stats upsert, release
+        with self.assertNumQueries(12):
+            response = self.post(items)
+        self.assertEqual(response.json()["booked"], 6)
+
+    def test_rejects_invalid_requests(self):
+        self.assertEqual(self.post([]).status_code, 400)
+        response = self.post(
+            [self.item(self.haircut, self.alice, "09:00")], mode="some"
+        )
+        self.assertEqual(response.status_code, 400)
+        with override_settings(BOOKING_BATCH_MAX_ITEMS=1):
+            response = self.post([self.item(self.haircut, self.alice, "09:00")] * 2)
+        self.assertEqual(response.status_code, 400)
+
+
+class RecurringBookingTests(BookingTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.service = Service.objects.create(
+            name="Hair Cut", duration_minutes=30, price=20
+        )
+        cls.staff = Staff.objects.create(name="Alice")
+        cls.day = next_weekday(1)
+        AvailabilityRule.objects.create(
+            staff=cls.staff,
+            day_of_week=cls.day.weekday(),
+            start_time=time(9, 0),
+            end_time=time(12, 0),
+        )
+
+    def recurrence(self, **fields):
+        defaults = {
+            "service": self.service,
+            "staff": self.staff,
+            "customer_name": "Customer",
+            "customer_email": "customer@example.com",
+            "frequency": "weekly",
+            "start_date": self.day,
+            "start_time": time(10, 0),
+        }
+        return Recurrence(**{**defaults, **fields})
+
+    def test_occurrences(self):
+        self.assertEqual(
+            list(self.recurrence(count=3).occurrences()),
+            [self.day, self.day + timedelta(weeks=1), self.day + timedelta(weeks=2)],
+        )
+        biweekly = self.recurrence(
+            frequency="biweekly", until=self.day + timedelta(weeks=5)
+        )
+        self.assertEqual(
+            list(biweekly.occurrences()),
+            [self.day, self.day + timedelta(weeks=2), self.day + timedelta(weeks=4)],
+        )
+        # Months without a 31st are skipped
+        monthly = self.recurrence(
+            frequency="monthly", start_date=datetime(2031, 1, 31).date(), count=3
+        )
+        self.assertEqual(
+            [date.isoformat() for date in monthly.occurrences()],
+            ["2031-01-31", "2031-03-31", "2031-05-31"],
+        )
+
+    def test_series_is_booked_with_constant_queries(self):
+        # two savepoints and releases, recurrence, staff lock, qualifications, rules,
+        # exceptions, bookings, insert, notifications insert, stats upsert
+        with self.assertNumQueries(13):
+            bookings, conflicts = create_recurring_booking(self.recurrence(count=12))
+        self.assertEqual(conflicts, [])
+        self.assertEqual(Booking.objects.filter(recurrence__isnull=False).count(), 12)
+        self.assertEqual(bookings[-1].date, self.day + timedelta(weeks=11))
+
+    def test_conflicts_report_nearest_alternatives(self):
+        conflict_day = self.day + timedelta(weeks=1)
+        add_booking(self.service, self.staff, conflict_day, time(10, 0))
+        bookings, conflicts = create_recurring_booking(self.recurrence(count=3))
+        self.assertEqual(bookings, [])
+        self.assertFalse(Recurrence.objects.exists())
+        self.assertEqual(
+            conflicts,
+            [
+                {
+                    "date": conflict_day,
+                    "error": "This time slot is already booked!",
+                    "alternatives": ["09:30", "10:30", "09:25"],
+                }
+            ],
+        )
+
+        bookings, conflicts = create_recurring_booking(
+            self.recurrence(count=3), all_or_nothing=False
+        )
+        self.assertEqual(
+            [booking.date for booking in bookings],
+            [self.day, self.day + timedelta(weeks=2)],
+        )
+        self.assertEqual(len(conflicts), 1)
+
+    def test_api(self):
+        response = self.client.post(
+            "/api/bookings/recurring/",
+            json.dumps(
+                {
+                    "service_id": self.service.id,
+                    "staff_id": self.staff.id,
+                    "customer_name": "Customer",
+                    "customer_email": "customer@example.com",
+                    "date": self.day.isoformat(),
+                    "start_time": "09:00",
+                    "frequency": "biweekly",
+                    "count": 2,
+                }
+            ),
+            content_type="application/json",
+        )
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertTrue(data["success"])
+        self.assertEqual(
+            [booking["date"] for booking in data["bookings"]],
+            [self.day.isoformat(), (self.day + timedelta(weeks=2)).isoformat()],
+        )
+        self.assertEqual(
+            Recurrence.objects.get(pk=data["recurrence_id"]).bookings.count(), 2
+        )
+
+    def test_series_length_is_capped(self):
+        with override_settings(BOOKING_RECURRENCE_MAX_OCCURRENCES=4):
+            with self.assertRaisesMessage(Exception, "more than 4 occurrences"):
+                create_recurring_booking(self.recurrence(count=5))
+
+
+@override_settings(BOOKING_READ_REPLICAS=["replica"])
+class ReadReplicaRoutingTests(BookingTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.service = Service.objects.create(
+            name="Hair Cut", duration_minutes=30, price=20
+        )
+        cls.staff = Staff.objects.create(name="Alice")
+        cls.day = next_weekday(2)
+        AvailabilityRule.objects.create(
+            staff=cls.staff,
+            day_of_week=cls.day.weekday(),
+            start_time=time(9, 0),
+            end_time=time(12, 0),
+        )
+
+    def setUp(self):
+        super().setUp()
+        self.router = routers.PrimaryReplicaRouter()
+
+    def test_booking_reads_go_to_replica(self):
+        self.assertEqual(self.router.db_for_read(Service), "replica")
+        self.assertEqual(self.router.db_for_read(User), "default")
+        self.assertEqual(self.router.db_for_write(Booking), "default")
+        with routers.use_primary():
+            self.assertEqual(self.router.db_for_read(Service), "default")
+        self.assertTrue(self.router.allow_relation(self.service, self.staff))
+
+    @override_settings(BOOKING_READ_REPLICAS=["missing"])
+    def test_create_booking_revalidates_on_primary(self):
+        # Any read routed to the replica would fail on the unknown alias
+        with self.assertRaises(ConnectionDoesNotExist):
+            get_available_slots(self.day, self.service.id, self.staff)
+        booking = create_booking(
+            self.service,
+            "Customer",
+            "customer@example.com",
+            self.day,
+            time(9, 0),
+            self.staff,
+        )
+        self.assertEqual(booking.end_time, time(9, 30))
+
+    @override_settings(BOOKING_READ_REPLICAS=["missing"])
+    def test_schedule_version_is_read_from_replica(self):
+        with self.assertRaises(ConnectionDoesNotExist):
+            schedule.get_schedules()
+        with routers.use_primary():
+            self.assertIn(self.staff.id, schedule.get_schedules())
+
+    def test_client_sticks_to_primary_after_write(self):
+        reads = []
+
+        def view(request):
+            reads.append(self.router.db_for_read(Booking))
+            if request.method == "POST":
+                self.router.db_for_write(Booking)
+                reads.append(self.router.db_for_read(Booking))
+            return HttpResponse()
+
+        middleware = PrimaryStickinessMiddleware(view)
+        factory = RequestFactory()
+        response = middleware(factory.get("/"))
+        self.assertNotIn(routers.STICKY_COOKIE, response.cookies)
+
+        response = middleware(factory.post("/"))
+        cookie = response.cookies[routers.STICKY_COOKIE]
+        self.assertEqual(cookie["max-age"], 5)
+
+        request = factory.get("/")
+        request.COOKIES[routers.STICKY_COOKIE] = cookie.value
+        middleware(request)
+        self.assertEqual(reads, ["replica", "replica", "default", "default"])
+        self.assertEqual(self.router.db_for_read(Booking), "replica")
+
+
+class AdminQueryBudgetTests(BookingTestCase):
+    """Queries per admin page stay the same however many rows the page shows."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.day = next_weekday(0)
+        services = [
+            Service.objects.create(
+                name=f"Service {number}", duration_minutes=30, price=20
+            )
+            for number in range(4)
+        ]
+        cls.staff = []
+        for number in range(3):
+            staff = Staff.objects.create(name=f"Staff {number}")
+            cls.staff.append(staff)
+            AvailabilityRule.objects.bulk_create(
+                AvailabilityRule(
+                    staff=staff,
+                    day_of_week=weekday,
+                    start_time=time(9, 0),
+                    end_time=time(17, 0),
+                )
+                for weekday in range(7)
+            )
+            staff.services.set(services)
+        for number in range(40):
+            add_booking(
+                services[number % 4],
+                cls.staff[number % 3],
+                cls.day + timedelta(days=number // 30),
+                time(9 + number // 3 % 10 // 2 * 2, 30 * (number // 3 % 2)),
+                customer=f"Customer {number}",
+            )
+        cls.user = User.objects.create_superuser(
+            "admin", "admin@example.com", "password"
+        )
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(self.user)
+
+    def assertPageQueries(self, url, count):
+        with self.assertNumQueries(count):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def test_booking_changelist(self):
+        # session, user, staff and service filters, capped count, page,
+        # date hierarchy (2)
+        response = self.assertPageQueries("/admin/booking/booking/", 8)
+        self.assertContains(response, "Customer 39")
+        self.assertPageQueries(f"/admin/booking/booking/?date__year={self.day.year}", 7)
+
+    def test_other_changelists(self):
+        # session, user, count (2), page, then one per related filter and two for
+        # the date hierarchy
+        self.assertPageQueries("/admin/booking/availabilityrule/", 5)
+        self.assertPageQueries("/admin/booking/recurrence/", 7)
+        self.assertPageQueries("/admin/booking/availabilityexception/", 8)
+
+    def test_staff_change_form_inlines(self):
+        # session, user, staff, services of the selects, rules, qualifications,
+        # content type
+        self.assertPageQueries(f"/admin/booking/staff/{self.staff[0].pk}/change/", 7)
+
+    def test_day_timeline(self):
+        url = f"/admin/booking/booking/timeline/?date={self.day.isoformat()}"
+        # session, user, exceptions, schedule version, compiled schedules, bookings
+        response = self.assertPageQueries(url, 6)
+        self.assertContains(response, "Staff 2")
+        self.assertContains(response, "Customer 29")
+        self.assertNotContains(response, "Customer 30")
+        self.assertContains(response, "10 (300 of 480 min)")
+        # The compiled schedules are reused
+        self.assertPageQueries(url, 5)
+
+    def test_day_timeline_skips_inactive_staff(self):
+        former = Staff.objects.create(name="Former", is_active=False)
+        AvailabilityRule.objects.create(
+            staff=former,
+            day_of_week=self.day.weekday(),
+            start_time=time(9, 0),
+            end_time=time(17, 0),
+        )
+        url = f"/admin/booking/booking/timeline/?date={self.day.isoformat()}"
+        response = self.client.get(url)
+        self.assertContains(response, "Staff 2")
+        self.assertNotContains(response, "Former")
+
+
+class NotificationOutboxTests(BookingTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.service = Service.objects.create(
+            name="Hair Cut", duration_minutes=30, price=20
+        )
+        cls.staff = Staff.objects.create(name="Alice")
+        cls.day = next_weekday(3)
+        AvailabilityRule.objects.create(
+            staff=cls.staff,
+            day_of_week=cls.day.weekday(),
+            start_time=time(9, 0),
+            end_time=time(17, 0),
+        )
+
+    def book(self, start=time(9, 0), email="customer@example.com"):
+        return create_booking(
+            self.service, "Customer", email, self.day, start, self.staff
+        )
+
+    def run_worker(self, *args):
+        stdout = StringIO()
+        # The test transaction leaves autocommit off, which makes a file database
+        # connection look obsolete to close_old_connections
+        with mock.patch(
+            "booking.management.commands.run_outbox_worker.close_old_connections"
+        ):
+            call_command("run_outbox_worker", "--once", *args, stdout=stdout)
+        return stdout.getvalue()
+
+    def test_booking_writes_confirmation_and_reminder(self):
+        booking = self.book()
+        notifications = {n.kind: n for n in booking.notifications.all()}
+        self.assertEqual(set(notifications), {"confirmation", "reminder"})
+        self.assertEqual(
+            notifications["reminder"].available_at,
+            outbox.booking_start(booking) - timedelta(hours=24),
+        )
+
+        with self.assertRaises(Exception):
+            self.book()
+        self.assertEqual(NotificationOutbox.objects.count(), 2)
+
+    def test_worker_sends_due_notifications(self):
+        booking = self.book()
+        self.assertIn("Sent 1 notifications, 0 failed", self.run_worker())
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].subject, "Booking confirmed: Hair Cut")
+        self.assertEqual(mail.outbox[0].to, ["customer@example.com"])
+        self.assertIn("Hair Cut with Alice", mail.outbox[0].body)
+
+        # The reminder is sent once it is due
+        self.assertIn("Sent 0 notifications", self.run_worker())
+        booking.notifications.filter(kind="reminder").update(
+            available_at=timezone.now()
+        )
+        self.run_worker()
+        self.assertEqual(len(mail.outbox), 2)
+        self.assertTrue(mail.outbox[1].subject.startswith("Reminder: Hair Cut"))
+        self.assertFalse(NotificationOutbox.objects.filter(status="pending").exists())
+
+    @override_settings(EMAIL_BACKEND="booking.tests.FailingEmailBackend")
+    def test_failed_sends_back_off_then_give_up(self):
+        booking = self.book()
+        confirmation = booking.notifications.get(kind="confirmation")
+        for attempt in range(1, 6):
+            started = timezone.now()
+            self.assertIn("1 failed", self.run_worker())
+            confirmation.refresh_from_db()
+            self.assertEqual(confirmation.attempts, attempt)
+            self.assertEqual(confirmation.last_error, "SMTP server unavailable")
+            if attempt < 5:
+                self.assertEqual(confirmation.status, "pending")
+                self.assertGreaterEqual(
+                    confirmation.available_at,
+                    started + timedelta(seconds=60 * 2 ** (attempt - 1)),
+                )
+                confirmation.available_at = timezone.now()
+                confirmation.save(update_fields=["available_at"])
+        self.assertEqual(confirmation.status, "failed")
+
+    def test_moved_booking_moves_its_reminder(self):
+        booking = self.book()
+        booking.date += timedelta(weeks=1)
+        booking.save()
+        reminder = booking.notifications.get(kind="reminder")
+        self.assertEqual(
+            reminder.available_at, outbox.booking_start(booking) - timedelta(hours=24)
+        )
+
+    def test_batches_take_constant_queries(self):
+        results = create_bookings(
+            [
+                {
+                    "service": self.service,
+                    "staff": self.staff,
+                    "customer_name": f"Customer {number}",
+                    "customer_email": f"customer{number}@example.com",
+                    "date": self.day + timedelta(weeks=number // 16),
+                    "start_time": time(9 + number % 16 // 2, 30 * (number % 2)),
+                }
+                for number in range(48)
+            ]
+        )
+        self.assertTrue(all(isinstance(result, Booking) for result in results))
+
+        # savepoint, write lock (SQLite), due ids, claim, release, claimed rows with
+        # bookings, mark sent
+        with self.assertNumQueries(7):
+            notifications = outbox.claim(20)
+            self.assertEqual(outbox.deliver(notifications), (20, 0))
+        self.assertIn("Sent 28 notifications", self.run_worker("--batch-size=20"))
+        self.assertEqual(len(mail.outbox), 48)
+
+    def test_worker_backs_off_on_database_errors(self):
+        self.book()
+        claim = outbox.claim
+        calls = []
+
+        def flaky_claim(batch_size):
+            calls.append(batch_size)
+            if len(calls) <= 2:
+                raise OperationalError("database is locked")
+            return claim(batch_size)
+
+        with (
+            mock.patch("booking.outbox.claim", flaky_claim),
+            mock.patch(
+                "booking.management.commands.run_outbox_worker.time.sleep"
+            ) as sleep,
+            self.assertLogs("booking.outbox", "WARNING") as logs,
+        ):
+            self.assertIn("Sent 1 notifications", self.run_worker())
+        self.assertEqual([call.args for call in sleep.call_args_list], [(1,), (2,)])
+        self.assertIn("retrying in 1.0s", logs.output[0])
+
+
+class SlotHoldTests(BookingTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.service = Service.objects.create(
+            name="Hair Cut", duration_minutes=30, price=20
+        )
+        cls.staff = Staff.objects.create(name="Alice")
+        cls.day = next_weekday(2)
+        AvailabilityRule.objects.create(
+            staff=cls.staff,
+            day_of_week=cls.day.weekday(),
+            start_time=time(9, 0),
+            end_time=time(12, 0),
+        )
+
+    def book(self, start, hold_token=None):
+        return create_booking(
+            self.service,
+            "Customer",
+            "customer@example.com",
+            self.day,
+            start,
+            self.staff,
+            hold_token=hold_token,
+        )
+
+    def test_held_slot_is_busy_for_others(self):
+        self.assertIn(
+            "10:00", get_available_slots(self.day, self.service.id, self.staff)
+        )
+        create_slot_hold(self.service, self.day, time(10, 0), self.staff)
+
+        slots = get_available_slots(self.day, self.service.id, self.staff)
+        self.assertNotIn("09:35", slots)
+        self.assertNotIn("10:00", slots)
+        self.assertIn("10:30", slots)
+        self.assertNotIn(
+            "10:00",
+            get_available_slots_by_staff(self.day, self.service)[self.staff.id][1],
+        )
+        with self.assertRaisesMessage(Exception, "not available"):
+            self.book(time(10, 15))
+        with self.assertRaisesMessage(Exception, "not available"):
+            create_slot_hold(self.service, self.day, time(9, 45), self.staff)
+
+    def test_booking_with_token_skips_revalidation(self):
+        hold = create_slot_hold(self.service, self.day, time(10, 0), self.staff)
+        # savepoint, staff lock, qualifications, hold delete, insert, notifications
+        # insert, stats upsert, release
+        with self.assertNumQueries(8):
+            booking = self.book(time(10, 0), hold_token=hold.token)
+        self.assertEqual(booking.end_time, time(10, 30))
+        self.assertFalse(SlotHold.objects.exists())
+
+        # A token is used once, then the booking itself blocks the slot
+        with self.assertRaisesMessage(Exception, "not available"):
+            self.book(time(10, 0), hold_token=hold.token)
+
+    def test_expired_holds_free_their_slot_without_writes(self):
+        hold = create_slot_hold(self.service, self.day, time(10, 0), self.staff)
+        self.assertNotIn(
+            "10:00", get_available_slots(self.day, self.service.id, self.staff)
+        )
+
+        # The hold expires while its slots are cached
+        expired_at = timezone.now() - timedelta(seconds=1)
+        SlotHold.objects.update(expires_at=expired_at)
+        availability_cache.note_hold_expiry(self.staff.id, self.day, expired_at)
+        with CaptureQueriesContext(connection) as queries:
+            self.assertIn(
+                "10:00", get_available_slots(self.day, self.service.id, self.staff)
+            )
+        self.assertTrue(all(query["sql"].startswith("SELECT") for query in queries))
+        self.assertTrue(SlotHold.objects.exists())
+
+        # Other days keep using their cached slots
+        next_week = self.day + timedelta(weeks=1)
+        get_available_slots(next_week, self.service.id, self.staff)
+        with self.assertNumQueries(0):
+            get_available_slots(next_week, self.service.id, self.staff)
+
+        # An expired token is checked like any other booking, which releases the hold
+        self.book(time(10, 0), hold_token=hold.token)
+        self.assertFalse(SlotHold.objects.exists())
+        self.assertFalse(availability_cache.holds_expired())
+
+    def test_token_cannot_book_a_start_already_passed(self):
+        today = timezone.localdate()
+        hold = SlotHold.objects.create(
+            token="earlier",
+            service=self.service,
+            staff=self.staff,
+            date=today,
+            start_time=time(0, 0),
+            end_time=time(0, 30),
+            expires_at=timezone.now() + timedelta(minutes=5),
+        )
+        with self.assertRaisesMessage(Exception, "not available"):
+            create_booking(
+                self.service,
+                "Customer",
+                "customer@example.com",
+                today,
+                time(0, 0),
+                self.staff,
+                hold_token=hold.token,
+            )
+
+    def test_release_keeps_the_next_expiry_of_the_day(self):
+        first = create_slot_hold(self.service, self.day, time(10, 0), self.staff)
+        second = create_slot_hold(self.service, self.day, time(11, 0), self.staff)
+        expired_at = timezone.now() - timedelta(seconds=1)
+        SlotHold.objects.filter(pk=first.pk).update(expires_at=expired_at)
+        availability_cache.note_hold_expiry(self.staff.id, self.day, expired_at)
+        self.assertIsNone(availability_cache.day_version(self.day))
+
+        call_command("release_expired_holds", stdout=StringIO())
+        self.assertIsNotNone(availability_cache.day_version(self.day))
+        with mock.patch("time.time", return_value=second.expires_at.timestamp()):
+            self.assertIsNone(availability_cache.day_version(self.day))
+
+    @override_settings(BOOKING_HOLD_MINUTES=0)
+    def test_command_releases_expired_holds(self):
+        create_slot_hold(self.service, self.day, time(10, 0), self.staff)
+        stdout = StringIO()
+        call_command("release_expired_holds", stdout=stdout)
+        self.assertIn("Released 1 expired holds", stdout.getvalue())
+        self.assertFalse(SlotHold.objects.exists())
+
+    def test_api(self):
+        payload = {
+            "service_id": self.service.id,
+            "staff_id": self.staff.id,
+            "date": self.day.isoformat(),
+            "start_time": "10:00",
+        }
+        response = self.client.post(
+            "/api/holds/", json.dumps(payload), content_type="application/json"
+        )
+        self.assertEqual(response.status_code, 201)
+        hold = response.json()
+        self.assertEqual((hold["start_time"], hold["end_time"]), ("10:00", "10:30"))
+
+        response = self.client.post(
+            "/api/holds/", json.dumps(payload), content_type="application/json"
+        )
+        self.assertEqual(response.status_code, 400)
+
+        response = self.client.post(
+            "/api/book-appointment/",
+            json.dumps(
+                {
+                    **payload,
+                    "customer_name": "Customer",
+                    "customer_email": "customer@example.com",
+                    "hold_token": hold["hold_token"],
+                }
+            ),
+            content_type="application/json",
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.json()["success"])
+
+
+class DailyStaffStatsTests(BookingTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.service = Service.objects.create(
+            name="Hair Cut", duration_minutes=30, price=20
+        )
+        cls.colour = Service.objects.create(
+            name="Colour", duration_minutes=60, price=45
+        )
+        cls.staff = Staff.objects.create(name="Alice")
+        cls.day = next_weekday(1)
+        for weekday in (cls.day.weekday(), cls.day.weekday() + 1):
+            AvailabilityRule.objects.create(
+                staff=cls.staff,
+                day_of_week=weekday,
+                start_time=time(9, 0),
+                end_time=time(12, 0),
+            )
+        cls.user = User.objects.create_superuser(
+            "admin", "admin@example.com", "password"
+        )
+
+    def stats(self):
+        return list(
+            DailyStaffStats.objects.order_by("date").values_list(
+                "date", "bookings", "booked_minutes", "revenue"
+            )
+        )
+
+    def book(self, service, start, day=None):
+        return create_booking(
+            service,
+            "Customer",
+            "customer@example.com",
+            day or self.day,
+            start,
+            self.staff,
+        )
+
+    def test_every_write_path_keeps_stats(self):
+        booking = self.book(self.service, time(9, 0))
+        create_bookings(
+            [
+                {
+                    "service": service,
+                    "staff": self.staff,
+                    "customer_name": "Customer",
+                    "customer_email": "customer@example.com",
+                    "date": self.day,
+                    "start_time": start,
+                }
+                for service, start in (
+                    (self.colour, time(10, 0)),
+                    (self.service, time(11, 0)),
+                )
+            ]
+        )
+        self.assertEqual(self.stats(), [(self.day, 3, 120, Decimal("85.00"))])
+
+        # Moved to the next day, then cancelled
+        booking.date += timedelta(days=1)
+        booking.save()
+        self.assertEqual(
+            self.stats(),
+            [
+                (self.day, 2, 90, Decimal("65.00")),
+                (booking.date, 1, 30, Decimal("20.00")),
+            ],
+        )
+        booking.delete()
+        maintained = self.stats()
+        self.assertEqual(maintained[1], (booking.date, 0, 0, Decimal("0.00")))
+
+        stdout = StringIO()
+        call_command("rebuild_rollups", "--chunk-days=1", stdout=stdout)
+        self.assertIn("Rebuilt 1 staff-days", stdout.getvalue())
+        self.assertEqual(self.stats(), maintained)
+
+        call_command("rebuild_rollups", f"--to={booking.date}", stdout=stdout)
+        self.assertEqual(self.stats(), maintained[:1])
+
+    def test_stats_keep_the_price_booked(self):
+        booking = self.book(self.service, time(9, 0))
+        self.book(self.service, time(10, 0))
+        Service.objects.filter(pk=self.service.pk).update(price=25)
+
+        booking = Booking.objects.get(pk=booking.pk)
+        booking.customer_name = "Renamed"
+        booking.save()
+        self.assertEqual(booking.price, Decimal("20.00"))
+        self.assertEqual(self.stats(), [(self.day, 2, 60, Decimal("40.00"))])
+
+        call_command("rebuild_rollups", stdout=StringIO())
+        self.assertEqual(self.stats(), [(self.day, 2, 60, Decimal("40.00"))])
+
+        booking.delete()
+        self.assertEqual(self.stats(), [(self.day, 1, 30, Decimal("20.00"))])
+
+        # A booking moved to another service takes its current price
+        other = Booking.objects.get()
+        other.service = self.colour
+        other.save()
+        self.assertEqual(self.stats(), [(self.day, 1, 60, Decimal("45.00"))])
+
+    def test_deleting_staff_deletes_their_stats(self):
+        self.book(self.service, time(9, 0))
+        self.staff.delete()
+        self.assertFalse(DailyStaffStats.objects.exists())
+
+    def test_report_reads_only_rollups(self):
+        self.book(self.service, time(9, 0))
+        self.book(self.colour, time(10, 0), self.day + timedelta(days=1))
+        self.client.force_login(self.user)
+        params = {
+            "from": self.day.isoformat(),
+            "to": (self.day + timedelta(days=6)).isoformat(),
+            "period": "week",
+        }
+        schedule.get_schedules()
+
+        # session, user, schedule version, exceptions, stats
+        with self.assertNumQueries(5):
+            response = self.client.get("/api/reports/utilization/", params)
+        rows = response.json()["rows"]
+        self.assertEqual(len(rows), 2 if self.day.weekday() == 6 else 1)
+        self.assertEqual(sum(row["bookings"] for row in rows), 2)
+        self.assertEqual(sum(row["booked_minutes"] for row in rows), 90)
+        self.assertEqual(sum(row["available_minutes"] for row in rows), 360)
+        self.assertEqual(sum(Decimal(row["revenue"]) for row in rows), Decimal("65"))
+
+        params["period"] = "day"
+        rows = self.client.get("/api/reports/utilization/", params).json()["rows"]
+        self.assertEqual(rows[0]["period_start"], self.day.isoformat())
+        self.assertEqual(rows[0]["utilization"], round(30 / 180, 4))
+
+    def test_report_requires_staff(self):
+        response = self.client.get(
+            "/api/reports/utilization/", {"from": "2026-01-01", "to": "2026-01-31"}
+        )
+        self.assertEqual(response.status_code, 403)
+
+
+class ArchiveBookingsTests(BookingTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.service = Service.objects.create(
+            name="Hair Cut", duration_minutes=30, price=20
+        )
+        cls.staff = Staff.objects.create(name="Alice")
+        cls.today = timezone.localdate()
+        cls.past = [
+            add_booking(
+                cls.service,
+                cls.staff,
+                cls.today - timedelta(days=days_ago),
+                time(9, 0),
+                f"Past {days_ago}",
+            )
+            for days_ago in (1, 2, 3, 4, 5)
+        ]
+        cls.upcoming = add_booking(
+            cls.service,
+            cls.staff,
+            cls.today + timedelta(days=1),
+            time(9, 0),
+            "Upcoming",
+        )
+        NotificationOutbox.objects.create(
+            booking=cls.past[0],
+            kind="confirmation",
+            status="sent",
+            available_at=timezone.now(),
+        )
+        cls.user = User.objects.create_superuser(
+            "admin", "admin@example.com", "password"
+        )
+
+    def archive(self, *args):
+        stdout = StringIO()
+        call_command("archive_bookings", f"--before={self.today}", *args, stdout=stdout)
+        return stdout.getvalue()
+
+    def stats(self):
+        return list(
+            DailyStaffStats.objects.order_by("date").values_list("date", "bookings")
+        )
+
+    def test_past_bookings_move_in_batches(self):
+        stats = self.stats()
+        output = self.archive("--batch-size=2", "--verbosity=2")
+        self.assertIn("Archived 4 bookings, cursor", output)
+        self.assertIn("Archived 5 bookings dated before", output)
+
+        self.assertEqual(list(Booking.objects.all()), [self.upcoming])
+        self.assertEqual(
+            set(BookingArchive.objects.values_list("id", flat=True)),
+            {booking.pk for booking in self.past},
+        )
+        self.assertEqual(
+            set(BookingHistory.objects.values_list("id", "archived")),
+            {(booking.pk, True) for booking in self.past} | {(self.upcoming.pk, False)},
+        )
+        self.assertFalse(NotificationOutbox.objects.exists())
+
+        # Archived bookings still count, also when the stats are rebuilt
+        self.assertEqual(self.stats(), stats)
+        call_command("rebuild_rollups", stdout=StringIO())
+        self.assertEqual(self.stats(), stats)
+
+        self.assertIn("Archived 0 bookings", self.archive())
+
+    def test_deleting_a_past_booking_still_updates_stats(self):
+        stats = dict(self.stats())
+        self.past[0].delete()
+        stats[self.past[0].date] -= 1
+        self.assertEqual(dict(self.stats()), stats)
+
+    def test_resumes_after_cursor(self):
+        cursor = sorted(booking.pk for booking in self.past)[2]
+        self.archive(f"--after-id={cursor}")
+        self.assertEqual(Booking.objects.count(), 4)
+        self.assertEqual(BookingArchive.objects.count(), 2)
+
+    def test_upcoming_bookings_stay_live(self):
+        with self.assertRaisesMessage(CommandError, "cannot be after today"):
+            call_command(
+                "archive_bookings", f"--before={self.today + timedelta(days=1)}"
+            )
+
+    def test_admin_reads_both_tables(self):
+        self.archive()
+        self.client.force_login(self.user)
+        response = self.client.get("/admin/booking/bookinghistory/")
+        self.assertContains(response, "Past 1")
+        self.assertContains(response, "Upcoming")
+
+        day = self.today - timedelta(days=1)
+        response = self.client.get(f"/admin/booking/booking/timeline/?date={day}")
+        self.assertContains(response, "Past 1")
+        self.assertContains(
+            response, f"/admin/booking/bookinghistory/{self.past[0].pk}/"
+        )
+
+
+class ConcurrentBookingTests(TransactionTestCase):
+    """
+    Needs a database that makes writers wait for each other: on SQLite the threads
+    book on a file copy of the test database with a busy timeout.
+    """
+
+    conflicts = {
+        "This time slot is not available for booking.",
+        "This time slot is already booked!",
+    }
+
+    def setUp(self):
+        availability_cache.get_cache().clear()
+        self.service = Service.objects.create(
+            name="Massage", duration_minutes=60, price=50
+        )
+        self.staff = Staff.objects.create(name="Alice")
+        self.day = next_weekday(5)
+        AvailabilityRule.objects.create(
+            staff=self.staff,
+            day_of_week=self.day.weekday(),
+            start_time=time(9, 0),
+            end_time=time(17, 0),
+        )
+        self.settings_dict = None
+        if connection.vendor == "sqlite":
+            directory = TemporaryDirectory()
+            self.addCleanup(directory.cleanup)
+            name = str(Path(directory.name) / "concurrent.sqlite3")
+            connection.ensure_connection()
+            target = sqlite3.connect(name)
+            connection.connection.backup(target)
+            target.close()
+            self.settings_dict = connections.configure_settings(
+                {
+                    "default": {
+                        "ENGINE": "django.db.backends.sqlite3",
+                        "NAME": name,
+                        "OPTIONS": {"transaction_mode": "IMMEDIATE"},
+                    }
+                }
+            )["default"]
+            pragmas = {"journal_mode": "wal", "busy_timeout": 5000}
+            override = override_settings(BOOKING_SQLITE_PRAGMAS=pragmas)
+            override.enable()
+            self.addCleanup(override.disable)
+
+    def connect(self):
+        """Points this thread's default connection at the file copy, if any."""
+        if self.settings_dict:
+            wrapper = connections["default"].__class__
+            connections["default"] = wrapper(self.settings_dict, alias="default")
+
+    def book(self, start):
+        """Returns the conflict message, or None if booked. Anything else raises."""
+        self.connect()
+        try:
+            create_booking(
+                self.service,
+                "Customer",
+                "customer@example.com",
+                self.day,
+                start,
+                self.staff,
+            )
+            return None
+        except Exception as error:
+            if str(error) not in self.conflicts:
+                raise
+            return str(error)
+        finally:
+            connection.close()
+
+    def count_bookings(self):
+        self.connect()
+        try:
+            return Booking.objects.count()
+        finally:
+            connection.close()
+
+    def test_parallel_bookings_of_one_slot(self):
+        starts = [time(10, 0), time(10, 15), time(9, 45), time(10, 0)] * 4
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            results = list(pool.map(self.book, starts))
+            count = pool.submit(self.count_bookings).result()
+
+        rejected = [result for result in results if result is not None]
+        self.assertEqual(len(rejected), len(starts) - 1)
+        self.assertEqual(count, 1)
+
+
+@skipUnless(connection.vendor == "sqlite", "SQLite profile")
+class SQLiteProfileTests(TransactionTestCase):
+    """The sqlite BOOKING_DB_PROFILE, on a file database of its own."""
+
+    pragmas = {"journal_mode": "wal", "synchronous": "normal", "busy_timeout": 5000}
+
+    def setUp(self):
+        directory = TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.settings_dict = connections.configure_settings(
+            {
+                "default": connections.settings["default"],
+                "profile": {
+                    "ENGINE": "django.db.backends.sqlite3",
+                    "NAME": str(Path(directory.name) / "profile.sqlite3"),
+                    "OPTIONS": {"transaction_mode": "IMMEDIATE"},
+                },
+            }
+        )["profile"]
+
+    def connect(self):
+        """A connection of this thread to the profile database, closed by the caller."""
+        profile = connections["default"].__class__(self.settings_dict, alias="profile")
+        connections["profile"] = profile
+        return profile
+
+    def test_pragmas_applied_to_new_connections(self):
+        with override_settings(BOOKING_SQLITE_PRAGMAS=self.pragmas):
+            profile = self.connect()
+            try:
+                with profile.cursor() as cursor:
+                    cursor.execute("PRAGMA journal_mode")
+                    self.assertEqual(cursor.fetchone(), ("wal",))
+                    cursor.execute("PRAGMA busy_timeout")
+                    self.assertEqual(cursor.fetchone(), (5000,))
+            finally:
+                profile.close()
+
+    def test_concurrent_read_then_write_transactions(self):
+        profile = self.connect()
+        with profile.cursor() as cursor:
+            cursor.execute("CREATE TABLE counter (value integer)")
+            cursor.execute("INSERT INTO counter VALUES (0)")
+        profile.close()
+
+        def increment(_):
+            profile = self.connect()
+            errors = 0
+            try:
+                for _ in range(20):
+                    try:
+                        # Reads first, like the admin change form, then writes
+                        with transaction.atomic(using="profile"):
+                            with profile.cursor() as cursor:
+                                cursor.execute("SELECT value FROM counter")
+                                cursor.execute("UPDATE counter SET value = value + 1")
+                    except OperationalError:
+                        errors += 1
+            finally:
+                profile.close()
+            return errors
+
+        with override_settings(BOOKING_SQLITE_PRAGMAS=self.pragmas):
+            with ThreadPoolExecutor(max_workers=8) as pool:
+                errors = sum(pool.map(increment, range(8)))
+
+        self.assertEqual(errors, 0)
+        profile = self.connect()
+        try:
+            with profile.cursor() as cursor:
+                cursor.execute("SELECT value FROM counter")
+                self.assertEqual(cursor.fetchone(), (160,))
+        finally:
+            profile.close()
+
+
+@skipUnless(connection.vendor == "sqlite", "Plan text is SQLite specific")
+class QueryPlanTests(BookingTestCase):
+    def test_overlap_check_uses_covering_index(self):
+        staff = Staff.objects.create(name="Alice")
+        plan = (
+            Booking.objects.filter(
+                staff=staff,
+                date=next_weekday(0),
+                start_time__lt=time(11, 0),
+                end_time__gt=time(10, 0),
+            )
+            .values_list("start_time", "end_time")
+            .explain()
+        )
+        self.assertIn("booking_staff_date_span_idx", plan)
+
+    def test_hold_lookup_uses_index(self):
+        staff = Staff.objects.create(name="Alice")
+        plan = SlotHold.objects.filter(
+            staff=staff,
+            date=next_weekday(0),
+            start_time__lt=time(11, 0),
+            end_time__gt=time(10, 0),
+            expires_at__gt=timezone.now(),
+        ).explain()
+        self.assertIn("hold_staff_date_span_idx", plan)
+
+    def test_rule_lookup_uses_index(self):
+        plan = AvailabilityRule.objects.filter(day_of_week=0, is_active=True).explain()
+        self.assertIn("rule_weekday_active_staff_idx", plan)
+
+
+class BookingImportExportTests(BookingTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.service = Service.objects.create(
+            name="Massage", duration_minutes=60, price=50
+        )
+        cls.staff = Staff.objects.create(name="Alice")
+        cls.day = next_weekday(0)
+        add_booking(cls.service, cls.staff, cls.day, time(9, 0))
+
+    def temp_path(self, name):
+        directory = TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        return Path(directory.name) / name
+
+    def import_rows(self, rows, **options):
+        path = self.temp_path("bookings.csv")
+        with open(path, "w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(
+                [
+                    "service_id",
+                    "staff_id",
+                    "customer_name",
+                    "customer_email",
+                    "date",
+                    "start_time",
+                ]
+            )
+            for start, staff_id in rows:
+                writer.writerow(
+                    [
+                        self.service.id,
+                        staff_id,
+                        "Customer",
+                        "c@example.com",
+                        self.day,
+                        start,
+                    ]
+                )
+        out, err = StringIO(), StringIO()
+        call_command("import_bookings", str(path), stdout=out, stderr=err, **options)
+        return out.getvalue(), err.getvalue()
+
+    def test_overlapping_rows_are_rejected(self):
+        out, err = self.import_rows(
+            [
+                ("09:30", self.staff.id),  # overlaps the stored booking
+                ("10:00", self.staff.id),
+                ("10:30", self.staff.id),  # overlaps the row above
+                ("11:00", self.staff.id),
+                ("11:00", 0),
+            ],
+            batch_size=2,
+        )
+        self.assertIn("Imported 2 bookings, rejected 3", out)
+        self.assertIn("Row 1: overlaps an existing booking", err)
+        self.assertIn("Row 5: unknown service or staff", err)
+        self.assertEqual(
+            list(
+                Booking.objects.order_by("start_time").values_list(
+                    "start_time", "end_time"
+                )
+            ),
+            [
+                (time(9, 0), time(10, 0)),
+                (time(10, 0), time(11, 0)),
+                (time(11, 0), time(12, 0)),
+            ],
+        )
+
+    def test_imported_bookings_invalidate_availability(self):
+        get_available_slots(self.day, self.service.id, self.staff)
+        self.import_rows([("13:00", self.staff.id)])
+        self.assertNotIn(
+            "13:00", get_available_slots(self.day, self.service.id, self.staff)
+        )
+
+    def test_malformed_ndjson_lines_are_rejected(self):
+        row = {
+            "service_id": self.service.id,
+            "staff_id": self.staff.id,
+            "customer_name": "Customer",
+            "customer_email": "c@example.com",
+            "date": self.day.isoformat(),
+            "start_time": "13:00",
+        }
+        path = self.temp_path("bookings.ndjson")
+        path.write_text(
+            "{not json\n"
+            + json.dumps(row)
+            + "\n\n[1, 2]\n"
+            + json.dumps({**row, "start_time": "15:00"})
+            + "\n"
+        )
+        out, err = StringIO(), StringIO()
+        call_command("import_bookings", str(path), stdout=out, stderr=err)
+        self.assertIn("Imported 2 bookings, rejected 2", out.getvalue())
+        self.assertIn("Row 1: invalid JSON", err.getvalue())
+        self.assertIn("Row 4: not a JSON object", err.getvalue())
+
+    def test_malformed_values_stop_the_import(self):
+        row = {
+            "service_id": self.service.id,
+            "staff_id": self.staff.id,
+            "customer_name": "Customer",
+            "customer_email": "c@example.com",
+            "date": self.day.isoformat(),
+            "start_time": "13:00:00",
+        }
+        for value, message in [
+            ("09:30:45", "Row 2: start_time must be HH:MM, got '09:30:45'"),
+            (930, "Row 2: invalid start_time 930"),
+        ]:
+            path = self.temp_path("bookings.ndjson")
+            path.write_text(
+                json.dumps(row) + "\n" + json.dumps({**row, "start_time": value})
+            )
+            with self.assertRaisesMessage(CommandError, message):
+                call_command("import_bookings", str(path), stdout=StringIO())
+        self.assertFalse(Booking.objects.filter(start_time=time(13, 0)).exists())
+
+    def test_export_rejects_malformed_dates(self):
+        with self.assertRaisesMessage(CommandError, "Dates must be YYYY-MM-DD"):
+            call_command("export_bookings", to_date="2025-13-01", stdout=StringIO())
+
+    def test_export_round_trips_through_import(self):
+        out = StringIO()
+        call_command("export_bookings", format="ndjson", stdout=out, stderr=StringIO())
+        rows = [json.loads(line) for line in out.getvalue().splitlines()]
+        self.assertEqual(len(rows), 1)
+        self.assertEqual(rows[0]["start_time"], "09:00:00")
+        self.assertEqual(rows[0]["end_time"], "10:00:00")
+
+        Booking.objects.all().delete()
+        path = self.temp_path("bookings.ndjson")
+        path.write_text(out.getvalue())
+        call_command("import_bookings", str(path), stdout=StringIO(), stderr=StringIO())
+        self.assertEqual(Booking.objects.get().start_time, time(9, 0))
+
+
+class AsyncApiTests(BookingTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.service = Service.objects.create(
+            name="Hair Cut", duration_minutes=30, price=20, buffer_minutes=5
+        )
+        cls.day = next_weekday(1)
+        for name in ("Alice", "Bob"):
+            staff = Staff.objects.create(name=name)
+            AvailabilityRule.objects.create(
+                staff=staff,
+                day_of_week=cls.day.weekday(),
+                start_time=time(9, 0),
+                end_time=time(12, 0),
+            )
+        cls.staff = Staff.objects.get(name="Alice")
+        add_booking(cls.service, cls.staff, cls.day, time(10, 0))
+
+    async def test_slots_match_sync_api(self):
+        for params in ({}, {"staff": "any"}):
+            params.update(date=self.day.isoformat(), service_id=self.service.id)
+            sync_data = (
+                await sync_to_async(self.client.get)("/api/available-slots/", params)
+            ).json()
+            availability_cache.get_cache().clear()
+            async_response = await self.async_client.get(
+                "/api/async/available-slots/", params
+            )
+            self.assertEqual(async_response.json(), sync_data)
+
+    async def test_book_appointment(self):
+        payload = {
+            "service_id": self.service.id,
+            "staff_id": self.staff.id,
+            "customer_name": "Customer",
+            "customer_email": "customer@example.com",
+            "date": self.day.isoformat(),
+            "start_time": "11:00",
+        }
+        response = await self.async_client.post(
+            "/api/async/book-appointment/", payload, content_type="application/json"
+        )
+        self.assertTrue(response.json()["success"])
+        self.assertTrue(await Booking.objects.filter(start_time=time(11, 0)).aexists())
+
+        response = await self.async_client.post(
+            "/api/async/book-appointment/", payload, content_type="application/json"
+        )
+        self.assertEqual(response.status_code, 400)
+
+    async def test_services(self):
+        response = await self.async_client.get("/api/async/services/")
+        self.assertEqual(response.json()["services"][0]["name"], "Hair Cut")
+
+
+class MetricsTests(BookingTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.service = Service.objects.create(
+            name="Hair Cut", duration_minutes=30, price=20
+        )
+        cls.staff = Staff.objects.create(name="Alice")
+        cls.day = next_weekday(2)
+        AvailabilityRule.objects.create(
+            staff=cls.staff,
+            day_of_week=cls.day.weekday(),
+            start_time=time(9, 0),
+            end_time=time(12, 0),
+        )
+
+    def setUp(self):
+        super().setUp()
+        metrics.reset()
+
+    def get_slots(self, path="/api/available-slots/"):
+        return self.client.get(
+            path, {"date": self.day.isoformat(), "service_id": self.service.id}
+        )
+
+    def test_server_timing_header(self):
+        server_timing = self.get_slots()["Server-Timing"]
+        self.assertRegex(
+            server_timing, r'^app;dur=[\d.]+, db;dur=[\d.]+;desc="9 queries"'
+        )
+        self.assertIn("slots;dur=", server_timing)
+
+    def test_async_views_are_measured(self):
+        server_timing = self.get_slots("/api/async/available-slots/")["Server-Timing"]
+        self.assertIn('desc="9 queries"', server_timing)
+
+    def test_prometheus_endpoint(self):
+        self.get_slots()
+        self.get_slots()
+        body = self.client.get("/metrics/").content.decode()
+        self.assertIn(
+            'booking_request_duration_seconds_count{endpoint="available-slots-api"} 2',
+            body,
+        )
+        self.assertIn(
+            'booking_db_queries_bucket{endpoint="available-slots-api",le="10"} 2', body
+        )
+        self.assertIn(
+            "booking_request_duration_quantile_seconds"
+            '{endpoint="available-slots-api",quantile="0.99"}',
+            body,
+        )
+        self.assertIn('booking_availability_cache_total{result="hits"} 1', body)
+        self.assertNotIn('endpoint="metrics"', body)
+
+
+class SeedSyntheticTests(BookingTestCase):
+    def test_seeds_non_overlapping_bookings(self):
+        call_command(
+            "seed_synthetic",
+            staff=3,
+            services=4,
+            days=7,
+            bookings_per_day=6,
+            start=next_weekday(0).isoformat(),
+            stdout=StringIO(),
+        )
+        self.assertEqual(Staff.objects.count(), 3)
+        self.assertEqual(AvailabilityRule.objects.count(), 3 * 6 * 2)
+        self.assertTrue(Booking.objects.exists())
+
+        for staff in Staff.objects.all():
+            for day in Booking.objects.filter(staff=staff).dates("date", "day"):
+                intervals = list(
+                    Booking.objects.filter(staff=staff, date=day)
+                    .order_by("start_time")
+                    .values_list("start_time", "end_time")
+                )
+                for (_, end), (start, _) in zip(intervals, intervals[1:]):
+                    self.assertLessEqual(end, start)
+
+    def test_rejects_malformed_start(self):
+        with self.assertRaisesMessage(CommandError, "--start must be YYYY-MM-DD"):
+            call_command("seed_synthetic", start="2025-13-01", stdout=StringIO())
+
+
+class CompiledScheduleTests(BookingTestCase):
+    def test_bitmaps_match_interval_sweep(self):
+        rng = random.Random(7)
+        day = next_weekday(0)
+        for _ in range(200):
+            windows = []
+            for _ in range(rng.randint(1, 3)):
+                start = rng.randrange(6 * 60, 20 * 60)
+                end = min(start + rng.randrange(30, 8 * 60), 24 * 60 - 1)
+                windows.append(
+                    AvailabilityRule(
+                        start_time=time(start // 60, start % 60),
+                        end_time=time(end // 60, end % 60),
+                    )
+                )
+            bookings = []
+            for _ in range(rng.randint(0, 12)):
+                start = rng.randrange(6 * 60, 22 * 60)
+                end = start + rng.randrange(1, 120)
+                bookings.append(
+                    (time(start // 60, start % 60), time(end // 60, end % 60))
+                )
+            total = timedelta(minutes=rng.randrange(1, 150))
+
+            busy = merge_intervals(
+                [
+                    (datetime.combine(day, s), datetime.combine(day, e))
+                    for s, e in bookings
+                ]
+            )
+            self.assertEqual(
+                compute_slot_times(day, windows, bookings, total),
+                generate_slot_times(day, windows, busy, total),
+            )
+
+    def test_unaligned_times_fall_back_to_sweep(self):
+        windows = [AvailabilityRule(start_time=time(9, 0, 30), end_time=time(10, 0))]
+        self.assertIsNone(schedule.bitmap_slot_times(windows, [], 30))
+        self.assertEqual(
+            compute_slot_times(next_weekday(0), windows, [], timedelta(minutes=30))[0],
+            time(9, 0, 30),
+        )
+
+    def test_rule_change_recompiles_only_that_staff(self):
+        alice = Staff.objects.create(name="Alice")
+        bob = Staff.objects.create(name="Bob")
+        rule = AvailabilityRule.objects.create(
+            staff=alice, day_of_week=0, start_time=time(9, 0), end_time=time(12, 0)
+        )
+        AvailabilityRule.objects.create(
+            staff=bob, day_of_week=0, start_time=time(9, 0), end_time=time(12, 0)
+        )
+        schedules = schedule.get_schedules()
+        self.assertEqual(set(schedules), {alice.id, bob.id})
+
+        # Only the shared version is checked
+        with self.assertNumQueries(1):
+            schedule.get_schedules()
+
+        rule.staff = bob
+        rule.save()
+        with CaptureQueriesContext(connection) as queries:
+            schedules = schedule.get_schedules()
+        self.assertEqual(len(queries), 2)
+        self.assertIn("IN", queries[1]["sql"])
+        self.assertNotIn(alice.id, schedules)
+        self.assertEqual(len(schedules[bob.id].windows(0)), 2)
+
+    def test_rolled_back_change_is_not_kept(self):
+        alice = Staff.objects.create(name="Alice")
+        rule = AvailabilityRule.objects.create(
+            staff=alice, day_of_week=0, start_time=time(9, 0), end_time=time(12, 0)
+        )
+        schedule.get_schedules()
+
+        with self.assertRaisesMessage(Exception, "rolled back"):
+            with transaction.atomic():
+                rule.end_time = time(10, 0)
+                rule.save()
+                # Compiled from the uncommitted rule
+                schedule.get_schedules()
+                raise Exception("rolled back")
+
+        [window] = schedule.get_schedules()[alice.id].windows(0)
+        self.assertEqual(window.end_time, time(12, 0))
+
+    def test_changes_of_other_processes_are_seen(self):
+        alice = Staff.objects.create(name="Alice")
+        AvailabilityRule.objects.create(
+            staff=alice, day_of_week=0, start_time=time(9, 0), end_time=time(12, 0)
+        )
+        schedule.get_schedules()
+
+        # Another process changes the rules and bumps the shared version
+        AvailabilityRule.objects.update(end_time=time(10, 0))
+        ScheduleVersion.objects.update(schedule=F("schedule") + 1)
+
+        [window] = schedule.get_schedules()[alice.id].windows(0)
+        self.assertEqual(window.end_time, time(10, 0))
+
+
+class NextAvailableTests(BookingTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.service = Service.objects.create(
+            name="Massage", duration_minutes=60, price=50
+        )
+        cls.staff = Staff.objects.create(name="Alice")
+        cls.monday = next_weekday(0)
+        AvailabilityRule.objects.create(
+            staff=cls.staff, day_of_week=0, start_time=time(9, 0), end_time=time(11, 0)
+        )
+        # The next three Mondays are fully booked
+        for week in range(3):
+            for hour in (9, 10):
+                add_booking(
+                    cls.service,
+                    cls.staff,
+                    cls.monday + timedelta(weeks=week),
+                    time(hour),
+                )
+
+    def get_next(self, **params):
+        return self.client.get(
+            "/api/next-available/", {"service_id": self.service.id, **params}
+        )
+
+    def test_finds_first_free_day_weeks_ahead(self):
+        with self.assertNumQueries(7):
+            data = self.get_next(after=self.monday.isoformat(), limit=3).json()
+        free_monday = (self.monday + timedelta(weeks=3)).isoformat()
+        self.assertEqual(
+            [(slot["date"], slot["start_time"]) for slot in data["slots"]],
+            [(free_monday, "09:00"), (free_monday, "09:05"), (free_monday, "09:10")],
+        )
+        self.assertEqual(data["slots"][0]["staff"]["id"], self.staff.id)
+
+    def test_after_time_on_first_day(self):
+        Booking.objects.all().delete()
+        data = self.get_next(after=f"{self.monday.isoformat()}T09:55", limit=2).json()
+        self.assertEqual(
+            [slot["start_time"] for slot in data["slots"]], ["10:00", "09:00"]
+        )
+
+    @override_settings(BOOKING_NEXT_AVAILABLE_MAX_DAYS=14)
+    def test_search_horizon_is_bounded(self):
+        data = self.get_next(after=self.monday.isoformat()).json()
+        self.assertEqual(data["slots"], [])
+
+    def test_invalid_limit(self):
+        self.assertEqual(self.get_next(limit=0).status_code, 400)
+        self.assertEqual(self.get_next(limit="x").status_code, 400)
+
+
+class ConditionalRequestTests(BookingTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.service = Service.objects.create(
+            name="Hair Cut", duration_minutes=30, price=20
+        )
+        cls.staff = Staff.objects.create(name="Alice")
+        cls.day = next_weekday(3)
+        AvailabilityRule.objects.create(
+            staff=cls.staff,
+            day_of_week=cls.day.weekday(),
+            start_time=time(9, 0),
+            end_time=time(12, 0),
+        )
+
+    def get_slots(self, **headers):
+        return self.client.get(
+            "/api/available-slots/",
+            {
+                "date": self.day.isoformat(),
+                "service_id": self.service.id,
+                "staff": "any",
+            },
+            headers=headers,
+        )
+
+    def shared_cache(self):
+        directory = TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        availability = {
+            "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+            "LOCATION": directory.name,
+        }
+        return override_settings(
+            CACHES={**settings.CACHES, "availability": availability}
+        )
+
+    def test_unchanged_slots_are_not_modified(self):
+        with self.shared_cache():
+            response = self.get_slots()
+            self.assertEqual(response["Cache-Control"], "private, no-cache")
+            etag = response["ETag"]
+
+            with self.assertNumQueries(0):
+                response = self.get_slots(if_none_match=etag)
+            self.assertEqual(response.status_code, 304)
+
+            add_booking(self.service, self.staff, self.day, time(9, 0))
+            response = self.get_slots(if_none_match=etag)
+            self.assertEqual(response.status_code, 200)
+            self.assertNotEqual(response["ETag"], etag)
+
+    def test_process_local_cache_sends_no_slots_etag(self):
+        response = self.get_slots()
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn("ETag", response)
+
+    def test_unchanged_services_are_not_modified(self):
+        response = self.client.get("/api/services/")
+        self.assertIn("Last-Modified", response)
+        etag = response["ETag"]
+
+        with self.assertNumQueries(1):
+            response = self.client.get(
+                "/api/services/", headers={"if_none_match": etag}
+            )
+        self.assertEqual(response.status_code, 304)
+
+        Service.objects.create(name="Massage", duration_minutes=60, price=50)
+        response = self.client.get("/api/services/", headers={"if_none_match": etag})
+        self.assertEqual(len(response.json()["services"]), 2)
+
+    async def test_async_services_are_not_modified(self):
+        response = await self.async_client.get("/api/async/services/")
+        self.assertIn("Last-Modified", response)
+        etag = response["ETag"]
+
+        response = await self.async_client.get(
+            "/api/async/services/", headers={"if_none_match": etag}
+        )
+        self.assertEqual(response.status_code, 304)
+
+        await Service.objects.acreate(name="Massage", duration_minutes=60, price=50)
+        response = await self.async_client.get(
+            "/api/async/services/", headers={"if_none_match": etag}
+        )
+        self.assertEqual(len(response.json()["services"]), 2)
+
+
+class SlotEventsTests(BookingTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.service = Service.objects.create(
+            name="Hair Cut", duration_minutes=30, price=20
+        )
+        cls.staff = Staff.objects.create(name="Alice")
+        cls.day = next_weekday(1)
+
+    def book(self, start):
+        with self.captureOnCommitCallbacks(execute=True):
+            return add_booking(self.service, self.staff, self.day, start)
+
+    async def test_publish_reaches_only_the_channel_subscribers(self):
+        broker = events.InProcessBroker()
+        first, second = broker.subscribe("a"), broker.subscribe("a")
+        other = broker.subscribe("b")
+
+        # Publishers are request threads, subscribers live on the event loop
+        await sync_to_async(broker.publish, thread_sensitive=False)("a", "frame")
+        self.assertEqual(await first.next(timeout=1), "frame")
+        self.assertEqual(await second.next(timeout=1), "frame")
+        self.assertIsNone(await other.next(timeout=0.01))
+
+        for subscription in (first, second, other):
+            broker.unsubscribe(subscription)
+        self.assertEqual(broker.channels, {})
+
+    async def test_slow_subscriber_is_told_to_resync(self):
+        broker = events.InProcessBroker()
+        subscription = broker.subscribe("a")
+        for _ in range(events.SUBSCRIPTION_QUEUE_SIZE + 1):
+            broker.publish("a", "frame")
+        await asyncio.sleep(0)
+        self.assertEqual(await subscription.next(timeout=1), events.RESYNC_FRAME)
+        self.assertIsNone(await subscription.next(timeout=0.01))
+
+    async def test_new_booking_is_published_after_commit(self):
+        broker = events.get_broker()
+        subscription = broker.subscribe(events.day_channel(self.day))
+        self.addCleanup(broker.unsubscribe, subscription)
+
+        await sync_to_async(self.book)(time(9, 0))
+        frame = await subscription.next(timeout=1)
+        self.assertTrue(frame.startswith("event: taken\n"))
+        self.assertEqual(
+            json.loads(frame.splitlines()[1].removeprefix("data: ")),
+            {
+                "date": self.day.isoformat(),
+                "staff_id": self.staff.id,
+                "start_time": "09:00",
+                "end_time": "09:30",
+            },
+        )
+
+    def test_moved_booking_releases_both_days(self):
+        booking = self.book(time(9, 0))
+        booking.date = self.day + timedelta(days=7)
+        with mock.patch.object(events, "publish_bookings") as publish:
+            with self.captureOnCommitCallbacks(execute=True):
+                booking.save()
+        [(event, bookings)] = [call.args for call in publish.call_args_list]
+        self.assertEqual(event, "released")
+        self.assertEqual([moved.date for moved in bookings], [booking.date, self.day])
+
+    async def test_stream_over_asgi(self):
+        response = await self.async_client.get(
+            "/api/async/slot-events/",
+            {"date": self.day.isoformat(), "service_id": self.service.id},
+        )
+        self.assertEqual(response["Content-Type"], "text/event-stream")
+        stream = aiter(response.streaming_content)
+        self.assertIn(b"connected", await anext(stream))
+
+        await sync_to_async(self.book)(time(10, 0))
+        chunk = await asyncio.wait_for(anext(stream), timeout=1)
+        self.assertIn(b"event: taken", chunk)
+        self.assertIn(b'"start_time": "10:00"', chunk)
+
+        # A client disconnect cancels the task waiting on the stream
+        waiting = asyncio.ensure_future(anext(stream))
+        await asyncio.sleep(0)
+        waiting.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await waiting
+        self.assertNotIn(events.day_channel(self.day), events.get_broker().channels)
+
+    def test_stream_requires_asgi(self):
+        response = self.client.get(
+            "/api/async/slot-events/",
+            {"date": self.day.isoformat(), "service_id": self.service.id},
+        )
+        self.assertEqual(response.status_code, 501)
@@ -7,8 +7,40 @@ urlpatterns = [
     path("book/", views.booking_page, name="booking-page"),
     # My custom apis
     path("api/available-slots/", views.available_slots_api, name="available-slots-api"),
+    path(
+        "api/availability-range/",
+        views.availability_range_api,
+        name="availability-range-api",
+    ),
+    path("api/next-available/", views.next_available_api, name="next-available-api"),
     path(
         "api/book-appointment/", views.book_appointment_api, name="book-appointment-api"
     ),
+    path("api/holds/", views.slot_hold_api, name="slot-hold-api"),
+    path("api/bookings/batch/", views.batch_bookings_api, name="batch-bookings-api"),
+    path(
+        "api/bookings/recurring/",
+        views.recurring_booking_api,
+        name="recurring-booking-api",
+    ),
     path("api/services/", views.services_api, name="services-api"),
+    path(
+        "api/reports/utilization/",
+        views.utilization_report_api,
+        name="utilization-report-api",
+    ),
+    # Async variants of the apis, for ASGI deployments
+    path(
+        "api/async/available-slots/",
+        views.async_available_slots_api,
+        name="async-available-slots-api",
+    ),
+    path(
+        "api/async/book-appointment/",
+        views.async_book_appointment_api,
+        name="async-book-appointment-api",
+    ),
+    path("api/async/services/", views.async_services_api, name="async-services-api"),
+    path("api/async/slot-events/", views.slot_events_api, name="slot-events-api"),
+    path("metrics/", views.metrics_view, name="metrics"),
 ]
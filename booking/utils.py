@@ -1,7 +1,27 @@
+import asyncio
+import secrets
+from bisect import bisect_right
 from datetime import datetime, timedelta, time
+from itertools import groupby
+from operator import itemgetter
+from asgiref.sync import sync_to_async
+from django.conf import settings
 from django.utils import timezone
-from django.db import IntegrityError
-from .models import AvailabilityRule, Booking, Service, Staff
+from django.db import IntegrityError, connection, transaction
+from django.db.models import Exists, F, Min, OuterRef, Q
+from . import cache as availability_cache
+from . import events, metrics, outbox, rollups, routers, schedule
+from .models import (
+    AvailabilityException,
+    AvailabilityRule,
+    Booking,
+    Service,
+    SlotHold,
+    Staff,
+    StaffService,
+)
+
+SLOT_STEP = timedelta(minutes=5)  # smaller, fixed steps for slots time checking
 
 
 def get_available_slots(date, service_id, staff):
@@ -9,107 +29,968 @@ def get_available_slots(date, service_id, staff):
     Returns list of available start times for a given date, service, and staff.
     Only shows slots where no existing booking exists.
     """
-    slots = []
+    # Calculate current datetime
+    now = timezone.localtime().time() if date == timezone.localdate() else None
 
-    try:
-        service = Service.objects.get(id=service_id)
-    except Service.DoesNotExist:
-        return slots
+    cache_key = availability_cache.staff_slots_key(service_id, staff.id, date)
+    slot_times = availability_cache.get_slots(cache_key)
 
-    service_duration = timedelta(minutes=service.duration_minutes)
-    buffer_duration = timedelta(minutes=service.buffer_minutes or 0)
-    total_required_time = service_duration + buffer_duration
+    if slot_times is None:
+        try:
+            service = Service.objects.get(id=service_id)
+        except Service.DoesNotExist:
+            return []
 
-    # Filter availability for this staff on the given weekday
-    availability_qs = AvailabilityRule.objects.filter(
-        staff=staff,
-        day_of_week=date.weekday(),
-        is_active=True,
+        qualifications = schedule.get_qualifications()
+        total_required_time = qualifications.total_required_time(staff.id, service)
+
+        windows = []
+        if qualifications.is_qualified(staff.id, service.id):
+            # Working windows for this staff on the given weekday, from the
+            # compiled schedule
+            staff_schedule = schedule.get_schedules().get(staff.id)
+            windows = staff_schedule.windows(date.weekday()) if staff_schedule else []
+            exceptions = schedule.ExceptionCalendar(
+                schedule.exceptions_between(date, date, [staff.id])
+            )
+            windows = exceptions.windows(staff.id, date, windows)
+
+        bookings = []
+        if windows:
+            bookings = busy_intervals(
+                ["start_time", "end_time"], date=date, staff=staff
+            )
+        slot_times = compute_slot_times(date, windows, bookings, total_required_time)
+        availability_cache.set_slots(cache_key, slot_times)
+
+    return format_slots(slot_times, now)
+
+
+def get_available_slots_by_staff(date, service):
+    """
+    Returns {staff_id: (staff, slots, booking_count)} for every active staff member
+    working on date. Rules and bookings are loaded with one query each and grouped by
+    staff in memory.
+    """
+    now = timezone.localtime().time() if date == timezone.localdate() else None
+
+    cache_key = availability_cache.day_slots_key(service.id, date)
+    slot_times_by_staff = availability_cache.get_slots(cache_key)
+
+    if slot_times_by_staff is None:
+        for day, slot_times_by_staff in _iter_slot_times_by_staff(date, date, service):
+            availability_cache.set_slots(cache_key, slot_times_by_staff)
+
+    return {
+        staff_id: (staff, format_slots(slot_times, now), load)
+        for staff_id, (staff, slot_times, load) in slot_times_by_staff.items()
+    }
+
+
+def iter_available_slots_by_staff(
+    start_date, end_date, service, working_days_only=False
+):
+    """
+    Yields (date, {staff_id: (staff, slots, booking_count)}) for each day in the range.
+    With working_days_only, weekdays nobody works on are skipped instead of yielded
+    empty.
+    """
+    today = timezone.localdate()
+    now = timezone.localtime().time()
+
+    for day, slot_times_by_staff in _iter_slot_times_by_staff(
+        start_date, end_date, service, working_days_only
+    ):
+        yield day, {
+            staff_id: (
+                staff,
+                format_slots(slot_times, now if day == today else None),
+                load,
+            )
+            for staff_id, (staff, slot_times, load) in slot_times_by_staff.items()
+        }
+
+
+def _iter_slot_times_by_staff(start_date, end_date, service, working_days_only=False):
+    """
+    Yields (date, {staff_id: (staff, slot_times, booking_count)}) for each day in the
+    range. Working windows come from the compiled schedules, and one query streams the
+    bookings and holds ordered by date so each day is computed as soon as its bookings
+    are read.
+    """
+    qualifications = schedule.get_qualifications()
+    days = [
+        start_date + timedelta(days=offset)
+        for offset in range((end_date - start_date).days + 1)
+    ]
+
+    exceptions = schedule.ExceptionCalendar(
+        schedule.exceptions_between(start_date, end_date)
+    )
+    schedules = _working_schedules(
+        schedule.get_schedules(),
+        {day.weekday() for day in days},
+        exceptions,
+        service,
+        qualifications,
     )
 
-    # Calculate current datetime
+    if working_days_only:
+        working_weekdays = {
+            weekday
+            for staff_schedule in schedules.values()
+            for weekday in staff_schedule.windows_by_weekday
+        }
+        days = [
+            day
+            for day in days
+            if day.weekday() in working_weekdays or exceptions.has_open(day)
+        ]
+
+    bookings = iter(())
+    if schedules:
+        bookings = groupby(
+            busy_intervals(
+                ["date", "staff_id", "start_time", "end_time"],
+                date__range=(start_date, end_date),
+                staff_id__in=schedules,
+            )
+            .order_by("date")
+            .iterator(),
+            key=itemgetter(0),
+        )
+    next_group = next(bookings, None)
+
+    for day in days:
+        intervals_by_staff = {}
+        if next_group and next_group[0] == day:
+            for _, staff_id, start_time, end_time in next_group[1]:
+                intervals_by_staff.setdefault(staff_id, []).append(
+                    (start_time, end_time)
+                )
+            next_group = next(bookings, None)
+
+        yield day, _slot_times_by_staff(
+            day, schedules, intervals_by_staff, service, qualifications, exceptions
+        )
+
+
+def _working_schedules(schedules, weekdays, exceptions, service, qualifications):
+    """
+    Schedules of the active staff qualified for service and working on any of weekdays,
+    plus qualified staff with extra hours in the loaded exceptions, who may have no
+    weekly rules at all. Nobody else is evaluated by the slot engine.
+    """
+    working = {
+        staff_id: staff_schedule
+        for staff_id, staff_schedule in schedules.items()
+        if staff_schedule.staff.is_active
+        and qualifications.is_qualified(staff_id, service.id)
+        and any(staff_schedule.windows(weekday) for weekday in weekdays)
+    }
+    for staff_id, staff in exceptions.open_staff().items():
+        if (
+            staff.is_active
+            and staff_id not in working
+            and qualifications.is_qualified(staff_id, service.id)
+        ):
+            working[staff_id] = schedules.get(staff_id) or schedule.StaffSchedule(
+                staff, []
+            )
+    return working
+
+
+def _slot_times_by_staff(
+    date, schedules, intervals_by_staff, service, qualifications, exceptions
+):
+    """
+    Returns {staff_id: (staff, slot_times, booking_count)} from already loaded schedules
+    and bookings.
+    """
+    slots_by_staff = {}
+    for staff_id, staff_schedule in schedules.items():
+        windows = exceptions.windows(
+            staff_id, date, staff_schedule.windows(date.weekday())
+        )
+        if not windows:
+            continue
+        intervals = intervals_by_staff.get(staff_id, [])
+        slots = compute_slot_times(
+            date,
+            windows,
+            intervals,
+            qualifications.total_required_time(staff_id, service),
+        )
+        slots_by_staff[staff_id] = (staff_schedule.staff, slots, len(intervals))
+    return slots_by_staff
+
+
+async def aget_available_slots(date, service_id, staff):
+    """Async variant of get_available_slots, with concurrent lookups."""
     now = timezone.localtime().time() if date == timezone.localdate() else None
-    STEP = timedelta(minutes=5)  # smaller, fixed steps for slots time checking
 
-    for rule in availability_qs:
+    cache_key = availability_cache.staff_slots_key(service_id, staff.id, date)
+    slot_times = availability_cache.get_slots(cache_key)
+
+    if slot_times is None:
+        service, schedules, qualifications, exceptions, bookings = await asyncio.gather(
+            Service.objects.filter(id=service_id).afirst(),
+            sync_to_async(schedule.get_schedules)(),
+            sync_to_async(schedule.get_qualifications)(),
+            _alist(schedule.exceptions_between(date, date, [staff.id])),
+            _alist(busy_intervals(["start_time", "end_time"], date=date, staff=staff)),
+        )
+        if service is None:
+            return []
+
+        total_required_time = qualifications.total_required_time(staff.id, service)
+        staff_schedule = schedules.get(staff.id)
+        windows = staff_schedule.windows(date.weekday()) if staff_schedule else []
+        windows = schedule.ExceptionCalendar(exceptions).windows(
+            staff.id, date, windows
+        )
+        if not qualifications.is_qualified(staff.id, service.id):
+            windows = []
+        slot_times = compute_slot_times(date, windows, bookings, total_required_time)
+        availability_cache.set_slots(cache_key, slot_times)
+
+    return format_slots(slot_times, now)
+
+
+async def aget_available_slots_by_staff(date, service):
+    """Async variant of get_available_slots_by_staff, with concurrent lookups."""
+    now = timezone.localtime().time() if date == timezone.localdate() else None
+
+    cache_key = availability_cache.day_slots_key(service.id, date)
+    slot_times_by_staff = availability_cache.get_slots(cache_key)
+
+    if slot_times_by_staff is None:
+        working_staff = AvailabilityRule.objects.filter(
+            day_of_week=date.weekday(), is_active=True, staff__is_active=True
+        ).values("staff_id")
+        extra_hours_staff = (
+            schedule.exceptions_between(date, date)
+            .filter(kind="open", staff__isnull=False)
+            .values("staff_id")
+        )
+        schedules, qualifications, exceptions, bookings = await asyncio.gather(
+            sync_to_async(schedule.get_schedules)(),
+            sync_to_async(schedule.get_qualifications)(),
+            _alist(schedule.exceptions_between(date, date)),
+            _alist(
+                busy_intervals(
+                    ["staff_id", "start_time", "end_time"],
+                    Q(staff_id__in=working_staff) | Q(staff_id__in=extra_hours_staff),
+                    date=date,
+                )
+            ),
+        )
+
+        intervals_by_staff = {}
+        for staff_id, start_time, end_time in bookings:
+            intervals_by_staff.setdefault(staff_id, []).append((start_time, end_time))
+
+        exceptions = schedule.ExceptionCalendar(exceptions)
+        slot_times_by_staff = _slot_times_by_staff(
+            date,
+            _working_schedules(
+                schedules, {date.weekday()}, exceptions, service, qualifications
+            ),
+            intervals_by_staff,
+            service,
+            qualifications,
+            exceptions,
+        )
+        availability_cache.set_slots(cache_key, slot_times_by_staff)
+
+    return {
+        staff_id: (staff, format_slots(slot_times, now), load)
+        for staff_id, (staff, slot_times, load) in slot_times_by_staff.items()
+    }
+
+
+async def _alist(queryset):
+    return [row async for row in queryset]
+
+
+def busy_intervals(fields, *conditions, **filters):
+    """
+    values_list(*fields) of the bookings and unexpired slot holds matching the filters,
+    in one query. Both tables are indexed on (staff, date, start_time, end_time).
+    """
+    return (
+        Booking.objects.filter(*conditions, **filters)
+        .values_list(*fields)
+        .union(
+            SlotHold.objects.filter(
+                *conditions, expires_at__gt=timezone.now(), **filters
+            ).values_list(*fields),
+            all=True,
+        )
+    )
+
+
+def find_next_available_slots(service, after_date, after_time, limit, max_days):
+    """
+    Returns up to limit (date, "HH:MM", staff) tuples from after_date on, later than
+    after_time on that first day if given, searching at most max_days days. Days nobody
+    works are skipped and the search stops as soon as enough slots are found.
+    """
+    start_date = max(after_date, timezone.localdate())
+    after_slot = after_time.strftime("%H:%M") if after_time else None
+
+    found = []
+    days = iter_available_slots_by_staff(
+        start_date,
+        start_date + timedelta(days=max_days - 1),
+        service,
+        working_days_only=True,
+    )
+    for day, slots_by_staff in days:
+        staff_by_slot, assignments = merge_staff_slots(slots_by_staff)
+        for slot, staff_id in assignments.items():
+            if after_slot and day == after_date and slot <= after_slot:
+                continue
+            found.append((day, slot, slots_by_staff[staff_id][0]))
+            if len(found) == limit:
+                # Stops streaming the remaining bookings
+                days.close()
+                return found
+    return found
+
+
+def merge_staff_slots(slots_by_staff):
+    """
+    Merges per-staff slots into a sorted {slot: [staff ids]} map and assigns each
+    slot to the least loaded staff member (fewest bookings that day, then lowest id).
+    """
+    staff_by_slot = {}
+    for staff_id, (staff, slots, load) in slots_by_staff.items():
+        for slot in slots:
+            staff_by_slot.setdefault(slot, []).append(staff_id)
+
+    merged = {}
+    assignments = {}
+    for slot in sorted(staff_by_slot):
+        staff_ids = sorted(set(staff_by_slot[slot]))
+        merged[slot] = staff_ids
+        assignments[slot] = min(
+            staff_ids, key=lambda staff_id: (slots_by_staff[staff_id][2], staff_id)
+        )
+    return merged, assignments
+
+
+def merge_intervals(intervals):
+    """
+    Sorts intervals and merges the ones that strictly overlap.
+    Touching intervals are kept apart so zero length slots between them still match.
+    """
+    merged = []
+    for start, end in sorted(intervals):
+        if merged and start < merged[-1][1]:
+            if end > merged[-1][1]:
+                merged[-1] = (merged[-1][0], end)
+        else:
+            merged.append((start, end))
+    return merged
+
+
+class IntervalIndex:
+    """
+    Non-overlapping (start, end) intervals of one staff-day kept sorted by start.
+    Checks and inserts cost O(log n), so whole imports can be validated in memory.
+    """
+
+    def __init__(self, intervals=()):
+        self.starts = []
+        self.ends = []
+        for start, end in merge_intervals(intervals):
+            if start < end:
+                self.starts.append(start)
+                self.ends.append(end)
+
+    def overlaps(self, start, end):
+        index = bisect_right(self.starts, start)
+        # Only the closest interval on each side can overlap, the rest are
+        # disjoint from them
+        if index > 0 and self.ends[index - 1] > start and end > self.starts[index - 1]:
+            return True
+        return index < len(self.starts) and self.starts[index] < end
+
+    def add(self, start, end):
+        """
+        Inserts the interval unless it overlaps an existing one. Returns whether it was
+        added.
+        """
+        if self.overlaps(start, end):
+            return False
+        if start >= end:
+            # Empty intervals never overlap anything, so they are not stored
+            return True
+        index = bisect_right(self.starts, start)
+        self.starts.insert(index, start)
+        self.ends.insert(index, end)
+        return True
+
+
+@metrics.timed("slots")
+def compute_slot_times(date, windows, bookings, total_required_time):
+    """
+    Free slot start times of the windows given (start_time, end_time) bookings. Uses the
+    minute bitmaps when everything is on whole minutes, the interval sweep otherwise.
+    """
+    bookings = list(bookings)
+    minute = timedelta(minutes=1)
+    if not total_required_time % minute:
+        slot_minutes = schedule.bitmap_slot_times(
+            windows, bookings, total_required_time // minute
+        )
+        if slot_minutes is not None:
+            return [
+                time(slot_minute // 60, slot_minute % 60)
+                for slot_minute in slot_minutes
+            ]
+
+    busy = merge_intervals(
+        [
+            (datetime.combine(date, start_time), datetime.combine(date, end_time))
+            for start_time, end_time in bookings
+        ]
+    )
+    return generate_slot_times(date, windows, busy, total_required_time)
+
+
+def generate_slot_times(date, rules, busy, total_required_time):
+    """
+    Sweeps every rule window in STEP increments against the merged busy intervals.
+    Returns free start times in rule order, same as checking each slot separately.
+    """
+    slot_times = []
+
+    for rule in rules:
         current_start = datetime.combine(date, rule.start_time)
         end_time = datetime.combine(date, rule.end_time)
 
+        # First busy interval that may still overlap the current slot
+        index = bisect_right(busy, current_start, key=lambda interval: interval[1])
+
         while current_start + total_required_time <= end_time:
-            slot_start = current_start.time()
-            # Skip expired slots for today
-            if now and slot_start <= now:
-                current_start += STEP
-                continue
+            while index < len(busy) and busy[index][1] <= current_start:
+                index += 1
 
             # Only show slots if not already booked
-            if not is_slot_conflicted(date, slot_start, total_required_time, staff):
-                slots.append(slot_start.strftime("%H:%M"))
+            if not (
+                index < len(busy)
+                and busy[index][0] < current_start + total_required_time
+            ):
+                slot_times.append(current_start.time())
 
-            current_start += STEP
+            current_start += SLOT_STEP
 
-    return slots
+    return slot_times
 
 
-def is_slot_conflicted(date, slot_start_time, slot_total_duration, staff):
+def format_slots(slot_times, now=None):
+    """Formats slot times as "HH:MM", skipping the ones already passed today."""
+    return [
+        slot_time.strftime("%H:%M")
+        for slot_time in slot_times
+        if not (now and slot_time <= now)
+    ]
+
+
+@routers.use_primary()
+def create_booking(
+    service, customer_name, customer_email, date, start_time, staff, hold_token=None
+):
     """
-    Check if a given time range overlaps with existing bookings for a staff member.
+    Attempts to create a booking; checks only the requested interval while holding a
+    lock on the staff row. A booking with the token of an unexpired hold on the same
+    slot takes the hold's place instead, as the slot was checked when it was held. On
+    PostgreSQL an exclusion constraint rejects overlapping bookings as a last line of
+    defence.
     """
-    slot_start_dt = datetime.combine(date, slot_start_time)
-    slot_end_dt = slot_start_dt + slot_total_duration
+    now = timezone.localtime()
+    if date < now.date():
+        raise Exception("Cannot book a past date.")
+    # Checked by is_slot_bookable too, but a hold may have been taken before it passed
+    if date == now.date() and start_time <= now.time():
+        raise Exception("This time slot is not available for booking.")
+    release_due_holds()
 
-    # Fetch all bookings on that date and staff
-    bookings = Booking.objects.filter(date=date, staff=staff)
+    try:
+        with transaction.atomic():
+            lock_staff(staff)
+            # Read in the transaction, a cached matrix may predate a change
+            qualifications = schedule.load_qualifications([staff.pk])
+            end_time = _checked_end_time(
+                qualifications, service, date, start_time, staff.pk
+            )
 
-    for booking in bookings:
-        booking_start_dt = datetime.combine(date, booking.start_time)
-        booking_end_dt = booking_start_dt + timedelta(
-            minutes=booking.service.duration_minutes + booking.service.buffer_minutes
-        )
+            # Deleting the hold and inserting the booking commit together, so other
+            # writers always see one of them
+            if not (
+                hold_token
+                and _consume_hold(
+                    hold_token, service, staff, date, start_time, end_time
+                )
+            ) and not is_slot_bookable(date, start_time, end_time, staff):
+                raise Exception("This time slot is not available for booking.")
+
+            booking = Booking(
+                service=service,
+                staff=staff,
+                customer_name=customer_name,
+                customer_email=customer_email,
+                date=date,
+                start_time=start_time,
+            )
+            booking.save(force_insert=True, qualifications=qualifications)
+            # Sent by run_outbox_worker, never inside the request
+            outbox.enqueue([booking])
+            return booking
+    except IntegrityError:
+        raise Exception("This time slot is already booked!")
 
-        if slot_start_dt < booking_end_dt and slot_end_dt > booking_start_dt:
-            return True
 
-    return False
+def _checked_end_time(qualifications, service, date, start_time, staff_id):
+    """End time of a booking or hold, raising when staff_id cannot take it."""
+    if not qualifications.is_qualified(staff_id, service.pk):
+        raise Exception("This staff member does not offer this service.")
+    end_dt = datetime.combine(date, start_time) + qualifications.total_required_time(
+        staff_id, service
+    )
+    # A slot always ends on the day it starts
+    if end_dt.date() != date:
+        raise Exception("This time slot is not available for booking.")
+    return end_dt.time()
+
+
+def _consume_hold(token, service, staff, date, start_time, end_time):
+    """Deletes the matching unexpired hold with one query; False when there is none."""
+    deleted, _ = SlotHold.objects.filter(
+        token=token,
+        service=service,
+        staff=staff,
+        date=date,
+        start_time=start_time,
+        end_time=end_time,
+        expires_at__gt=timezone.now(),
+    ).delete()
+    return deleted > 0
 
 
-def create_booking(service, customer_name, customer_email, date, start_time, staff):
+@routers.use_primary()
+def create_slot_hold(service, date, start_time, staff):
     """
-    Attempts to create a booking; relies on available slots and DB constraints to prevent conflicts.
-    Raises IntegrityError if slot is already booked.
+    Reserves a slot for BOOKING_HOLD_MINUTES, checked like create_booking. Until it
+    expires the slot is busy for everyone but a booking carrying the hold's token.
     """
     if date < timezone.localdate():
         raise Exception("Cannot book a past date.")
+    release_due_holds()
 
-    available_slots = get_available_slots(date, service.id, staff)
-
-    if start_time.strftime("%H:%M") not in available_slots:
-        raise Exception("This time slot is not available for booking.")
+    with transaction.atomic():
+        lock_staff(staff)
+        end_time = _checked_end_time(
+            schedule.load_qualifications([staff.pk]),
+            service,
+            date,
+            start_time,
+            staff.pk,
+        )
 
-    total_duration = timedelta(
-        minutes=service.duration_minutes + service.buffer_minutes
-    )
-    start_dt = datetime.combine(date, start_time)
-    end_time = (start_dt + total_duration).time()
+        if not is_slot_bookable(date, start_time, end_time, staff):
+            raise Exception("This time slot is not available for booking.")
 
-    try:
-        return Booking.objects.create(
+        hold = SlotHold.objects.create(
+            token=secrets.token_urlsafe(32),
             service=service,
             staff=staff,
-            customer_name=customer_name,
-            customer_email=customer_email,
             date=date,
             start_time=start_time,
             end_time=end_time,
+            expires_at=timezone.now()
+            + timedelta(minutes=settings.BOOKING_HOLD_MINUTES),
         )
+
+    availability_cache.invalidate_staff_day(staff.pk, date)
+    availability_cache.note_hold_expiry(staff.pk, date, hold.expires_at)
+    transaction.on_commit(lambda: events.publish_bookings("taken", [hold]))
+    return hold
+
+
+@routers.use_primary()
+def release_expired_holds():
+    """
+    Deletes expired holds, frees their slots in the cache and live events, and records
+    when the next hold expires. Returns the number of holds released.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        expired = list(
+            SlotHold.objects.filter(expires_at__lte=now).only(
+                "staff_id", "date", "start_time", "end_time"
+            )
+        )
+        SlotHold.objects.filter(pk__in=[hold.pk for hold in expired]).delete()
+        next_expiry = SlotHold.objects.aggregate(next_expiry=Min("expires_at"))[
+            "next_expiry"
+        ]
+        released = {(hold.staff_id, hold.date) for hold in expired}
+        # Next expiry per staff-day of the released dates, which share day keys
+        remaining = list(
+            SlotHold.objects.filter(date__in={date for _, date in released})
+            .order_by()
+            .values_list("staff_id", "date")
+            .annotate(expires_at=Min("expires_at"))
+        )
+
+    for staff_id, date in released:
+        availability_cache.invalidate_staff_day(staff_id, date)
+    availability_cache.set_next_hold_expiry(next_expiry, released, remaining)
+    transaction.on_commit(lambda: events.publish_bookings("released", expired))
+    return len(expired)
+
+
+def release_due_holds():
+    """
+    Releases expired holds when the cache says one is due. Called by the booking
+    writes, which are on the primary anyway; reads only skip the affected cached slots.
+    """
+    if availability_cache.holds_expired():
+        release_expired_holds()
+
+
+@routers.use_primary()
+def create_bookings(items, all_or_nothing=True):
+    """
+    Creates several bookings in one transaction; items are create_booking kwargs,
+    optionally with the recurrence the booking belongs to.
+    Rules, exceptions and stored bookings of all items are loaded with one query each,
+    and each affected staff-day is checked against one in memory IntervalIndex, so items
+    conflict with each other as well as with stored bookings. Returns the created
+    Booking or an error message per item. With all_or_nothing one error books nothing.
+    """
+    now = timezone.localtime()
+    results = [None] * len(items)
+    candidates = []
+    for position, item in enumerate(items):
+        date, start_time = item["date"], item["start_time"]
+        if date < now.date():
+            results[position] = "Cannot book a past date."
+        elif date == now.date() and start_time <= now.time():
+            results[position] = "This time slot is not available for booking."
+        else:
+            candidates.append(position)
+    release_due_holds()
+
+    bookings = []
+
+    try:
+        with transaction.atomic():
+            end_times = {}
+            rule_windows = {}
+            exceptions = schedule.ExceptionCalendar([])
+            indexes = {}
+            if candidates:
+                candidate_staff_ids = {
+                    items[position]["staff"].pk for position in candidates
+                }
+                lock_staff_ids(candidate_staff_ids)
+                qualifications = schedule.load_qualifications(candidate_staff_ids)
+                for position in candidates:
+                    item = items[position]
+                    try:
+                        end_times[position] = _checked_end_time(
+                            qualifications,
+                            item["service"],
+                            item["date"],
+                            item["start_time"],
+                            item["staff"].pk,
+                        )
+                    except Exception as e:
+                        results[position] = str(e)
+
+            staff_ids = {items[position]["staff"].pk for position in end_times}
+            dates = {items[position]["date"] for position in end_times}
+            if end_times:
+                for (
+                    staff_id,
+                    day_of_week,
+                    start_time,
+                    end_time,
+                ) in AvailabilityRule.objects.filter(
+                    staff_id__in=staff_ids,
+                    day_of_week__in={date.weekday() for date in dates},
+                    is_active=True,
+                ).values_list(
+                    "staff_id", "day_of_week", "start_time", "end_time"
+                ):
+                    rule_windows.setdefault((staff_id, day_of_week), []).append(
+                        schedule.Window(start_time, end_time)
+                    )
+                exceptions = schedule.ExceptionCalendar(
+                    schedule.exceptions_between(min(dates), max(dates), staff_ids)
+                )
+
+                intervals = {}
+                for staff_id, date, start_time, end_time in busy_intervals(
+                    ["staff_id", "date", "start_time", "end_time"],
+                    staff_id__in=staff_ids,
+                    date__in=dates,
+                ):
+                    intervals.setdefault((staff_id, date), []).append(
+                        (start_time, end_time)
+                    )
+                for position in end_times:
+                    staff_day = (items[position]["staff"].pk, items[position]["date"])
+                    if staff_day not in indexes:
+                        indexes[staff_day] = IntervalIndex(intervals.get(staff_day, []))
+
+            for position, end_time in end_times.items():
+                item = items[position]
+                staff_id, date, start_time = (
+                    item["staff"].pk,
+                    item["date"],
+                    item["start_time"],
+                )
+                windows = exceptions.windows(
+                    staff_id, date, rule_windows.get((staff_id, date.weekday()), [])
+                )
+                window_starts = [
+                    window.start_time
+                    for window in windows
+                    if window.start_time <= start_time and window.end_time >= end_time
+                ]
+
+                if not _on_slot_grid(date, start_time, window_starts):
+                    results[position] = "This time slot is not available for booking."
+                elif not indexes[(staff_id, date)].add(start_time, end_time):
+                    results[position] = "This time slot is already booked!"
+                else:
+                    results[position] = Booking(
+                        **item, end_time=end_time, price=item["service"].price
+                    )
+
+            if all_or_nothing and any(isinstance(result, str) for result in results):
+                return [
+                    (
+                        result
+                        if isinstance(result, str)
+                        else "Not booked because another item failed."
+                    )
+                    for result in results
+                ]
+
+            bookings = [result for result in results if isinstance(result, Booking)]
+            Booking.objects.bulk_create(bookings)
+            outbox.enqueue(bookings)
+            rollups.record(bookings)
     except IntegrityError:
-        raise ("This time slot is already booked!")
+        raise Exception("This time slot is already booked!")
+
+    # bulk_create skips model signals
+    for staff_id, date in {(booking.staff_id, booking.date) for booking in bookings}:
+        availability_cache.invalidate_staff_day(staff_id, date)
+    transaction.on_commit(lambda: events.publish_bookings("taken", bookings))
+    return results
 
 
-def get_available_staff(date):
+@routers.use_primary()
+def create_recurring_booking(recurrence, all_or_nothing=True, max_alternatives=3):
+    """
+    Saves recurrence and books its occurrences with create_bookings, so the whole
+    series is checked with one bookings query and inserted with one bulk_create.
+    Returns (bookings, conflicts); each conflict is {"date", "error", "alternatives"}
+    with the free start times of that date nearest to the requested one.
     """
-    Returns all staff who have availability rules for given date.
+    max_occurrences = settings.BOOKING_RECURRENCE_MAX_OCCURRENCES
+    dates = list(recurrence.occurrences(limit=max_occurrences + 1))
+    if not dates:
+        raise Exception("The series has no occurrences.")
+    if len(dates) > max_occurrences:
+        raise Exception(
+            f"A series cannot have more than {max_occurrences} occurrences."
+        )
+
+    with transaction.atomic():
+        recurrence.save()
+        results = create_bookings(
+            [
+                {
+                    "service": recurrence.service,
+                    "staff": recurrence.staff,
+                    "customer_name": recurrence.customer_name,
+                    "customer_email": recurrence.customer_email,
+                    "date": date,
+                    "start_time": recurrence.start_time,
+                    "recurrence": recurrence,
+                }
+                for date in dates
+            ],
+            all_or_nothing,
+        )
+        bookings = [result for result in results if isinstance(result, Booking)]
+        if not bookings:
+            transaction.set_rollback(True)
+            recurrence.pk = None
+
+    failed = {
+        date: error
+        for date, error in zip(dates, results)
+        if isinstance(error, str) and error != "Not booked because another item failed."
+    }
+    alternatives = nearest_slots(
+        recurrence.service,
+        recurrence.staff,
+        failed,
+        recurrence.start_time,
+        max_alternatives,
+    )
+    conflicts = [
+        {"date": date, "error": error, "alternatives": alternatives.get(date, [])}
+        for date, error in failed.items()
+    ]
+    return bookings, conflicts
+
+
+def nearest_slots(service, staff, dates, start_time, limit):
+    """
+    {date: up to limit free "HH:MM" slots of staff, nearest to start_time first}
+    for every date, loading the bookings of all dates with one query.
+    """
+    dates = [date for date in dates if date >= timezone.localdate()]
+    if not dates:
+        return {}
+    staff_schedule = schedule.get_schedules().get(staff.id)
+    exceptions = schedule.ExceptionCalendar(
+        schedule.exceptions_between(min(dates), max(dates), [staff.id])
+    )
+
+    intervals = {}
+    for date, booked_start, booked_end in busy_intervals(
+        ["date", "start_time", "end_time"], staff=staff, date__in=dates
+    ):
+        intervals.setdefault(date, []).append((booked_start, booked_end))
+
+    total_required_time = schedule.get_qualifications().total_required_time(
+        staff.id, service
+    )
+    now = timezone.localtime()
+    requested = start_time.hour * 60 + start_time.minute
+    nearest = {}
+    for date in dates:
+        windows = staff_schedule.windows(date.weekday()) if staff_schedule else []
+        slot_times = compute_slot_times(
+            date,
+            exceptions.windows(staff.id, date, windows),
+            intervals.get(date, []),
+            total_required_time,
+        )
+        slots = format_slots(slot_times, now.time() if date == now.date() else None)
+        nearest[date] = sorted(
+            slots,
+            key=lambda slot: (
+                abs(int(slot[:2]) * 60 + int(slot[3:]) - requested),
+                slot,
+            ),
+        )[:limit]
+    return nearest
+
+
+def lock_staff(staff):
+    """Serializes booking writes of one staff member until the transaction ends."""
+    lock_staff_ids([staff.pk])
+
+
+def lock_staff_ids(staff_ids):
     """
-    return Staff.objects.filter(
-        availabilityrule__day_of_week=date.weekday(), availabilityrule__is_active=True
-    ).distinct()
+    Row locks are taken in id order, so batches sharing staff members cannot deadlock.
+    SQLite has no row locks, so a no-op update takes the database write lock up front
+    instead.
+    """
+    if connection.features.has_select_for_update:
+        list(
+            Staff.objects.select_for_update()
+            .filter(pk__in=staff_ids)
+            .order_by("pk")
+            .values_list("id", flat=True)
+        )
+    else:
+        Staff.objects.filter(pk__in=staff_ids).update(is_active=F("is_active"))
+
+
+def is_slot_bookable(date, start_time, end_time, staff):
+    """
+    Same answer as looking start_time up in get_available_slots, using one query each
+    for the rules and exceptions of the day and one indexed overlap query instead of
+    computing the whole day.
+    """
+    if date == timezone.localdate() and start_time <= timezone.localtime().time():
+        return False
+
+    rules = AvailabilityRule.objects.filter(
+        staff=staff, day_of_week=date.weekday(), is_active=True
+    ).only("start_time", "end_time")
+    exceptions = schedule.ExceptionCalendar(
+        schedule.exceptions_between(date, date, [staff.pk])
+    )
+    window_starts = [
+        window.start_time
+        for window in exceptions.windows(staff.pk, date, list(rules))
+        if window.start_time <= start_time and window.end_time >= end_time
+    ]
+
+    if not _on_slot_grid(date, start_time, window_starts):
+        return False
+
+    return not busy_intervals(
+        ["id"], staff=staff, date=date, start_time__lt=end_time, end_time__gt=start_time
+    ).exists()
+
+
+def _on_slot_grid(date, start_time, rule_starts):
+    """Slots are offered every SLOT_STEP from the start of a covering rule."""
+    start_dt = datetime.combine(date, start_time)
+    return any(
+        (start_dt - datetime.combine(date, rule_start)) % SLOT_STEP == timedelta(0)
+        for rule_start in rule_starts
+    )
+
+
+def get_available_staff(date, service=None):
+    """
+    Returns all staff who work on given date: weekly rules or extra hours that day,
+    unless they or the whole shop are closed all day. With a service (or its id),
+    only staff qualified for it, still as one query.
+    """
+    staff = Staff.objects.all()
+    if service is not None:
+        restrictions = StaffService.objects.filter(staff=OuterRef("pk"))
+        staff = staff.filter(
+            Exists(restrictions.filter(service=service)) | ~Exists(restrictions)
+        )
+
+    day_exceptions = AvailabilityException.objects.filter(
+        start_date__lte=date, end_date__gte=date
+    )
+    whole_day_closures = day_exceptions.filter(kind="closed", start_time__isnull=True)
+    return (
+        staff.filter(
+            Q(
+                availabilityrule__day_of_week=date.weekday(),
+                availabilityrule__is_active=True,
+            )
+            | Q(
+                pk__in=day_exceptions.filter(kind="open", staff__isnull=False).values(
+                    "staff_id"
+                )
+            )
+        )
+        .exclude(
+            pk__in=whole_day_closures.filter(staff__isnull=False).values("staff_id")
+        )
+        .exclude(Exists(whole_day_closures.filter(staff__isnull=True)))
+        .distinct()
+    )
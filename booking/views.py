@@ -1,50 +1,385 @@
+import asyncio
+import hashlib
 import json
-from datetime import datetime
+from datetime import datetime, timedelta
+from functools import wraps
+
+from asgiref.sync import sync_to_async
 
 from django.views.decorators.csrf import csrf_exempt
-from django.views.decorators.http import require_POST
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import condition, require_POST
 from django.utils import timezone
-from django.http import JsonResponse
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.db.models import Count, Max
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
 from django.shortcuts import render
 
-from booking.utils import get_available_staff, get_available_slots, create_booking
-from booking.models import Staff, Service
+from booking.utils import (
+    aget_available_slots,
+    aget_available_slots_by_staff,
+    get_available_staff,
+    get_available_slots,
+    get_available_slots_by_staff,
+    iter_available_slots_by_staff,
+    merge_staff_slots,
+    create_booking,
+    create_bookings,
+    create_recurring_booking,
+    create_slot_hold,
+    find_next_available_slots,
+)
+from booking import cache as availability_cache
+from booking import events, metrics, rollups, schedule
+from booking.models import Recurrence, Staff, Service
+
+
+# Conditional request helpers
+def _slots_etag(request):
+    """
+    Derived from the availability versions of the date, so an unchanged day is answered
+    with 304 without touching the database. Needs a shared availability cache, other
+    workers' bookings never bump process local versions. Today's slots also expire
+    every minute, and a day with an expired hold has none until it is released.
+    """
+    date_obj, service_id, error = _parse_slots_params(request)
+    if error or not availability_cache.is_shared():
+        return None
+    version = availability_cache.day_version(date_obj)
+    if version is None:
+        return None
+
+    parts = [
+        service_id,
+        date_obj.isoformat(),
+        request.GET.get("staff", ""),
+        version,
+    ]
+    if date_obj == timezone.localdate():
+        parts.append(timezone.localtime().strftime("%H:%M"))
+    return hashlib.md5(":".join(parts).encode(), usedforsecurity=False).hexdigest()
+
+
+def _services_version(request):
+    """(count, last update) of the services, computed once per request."""
+    if not hasattr(request, "_services_version"):
+        request._services_version = Service.objects.aggregate(
+            count=Count("id"), updated_at=Max("updated_at")
+        )
+    return request._services_version
+
+
+def _aload_services_version(view):
+    """
+    Loads the services version with the async ORM before an async view's condition()
+    runs its etag and last modified functions, which cannot query from the event loop.
+    """
+
+    @wraps(view)
+    async def inner(request, *args, **kwargs):
+        request._services_version = await Service.objects.aaggregate(
+            count=Count("id"), updated_at=Max("updated_at")
+        )
+        return await view(request, *args, **kwargs)
+
+    return inner
+
+
+def _services_etag(request):
+    version = _services_version(request)
+    updated_at = version["updated_at"].timestamp() if version["updated_at"] else 0
+    return f"services-{version['count']}-{updated_at}"
+
+
+def _services_last_modified(request):
+    return _services_version(request)["updated_at"]
 
 
 # apis
+@cache_control(private=True, no_cache=True)
+@condition(etag_func=_slots_etag)
 def available_slots_api(request):
+    date_obj, service_id, error = _parse_slots_params(request)
+    if error:
+        return error
+
+    if date_obj < timezone.localdate():
+        return JsonResponse({"slots": []})
+
+    try:
+        service = Service.objects.get(id=service_id)
+    except Service.DoesNotExist:
+        return JsonResponse({"error": "Invalid service ID"}, status=404)
+
+    if request.GET.get("staff") == "any":
+        return JsonResponse(
+            _any_staff_payload(
+                get_available_slots_by_staff(date_obj, service),
+                service,
+                schedule.get_qualifications(),
+            )
+        )
+
+    # Assign the first available staff qualified for the service
+    available_staff = get_available_staff(date_obj, service).first()
+
+    if not available_staff:
+        return JsonResponse({"slots": [], "staff": None})
+
+    slots = get_available_slots(date_obj, service.id, available_staff)
+    return JsonResponse(
+        {
+            "slots": slots,
+            "staff": {"id": available_staff.id, "name": available_staff.name},
+        }
+    )
+
+
+@cache_control(private=True, no_cache=True)
+@condition(etag_func=_slots_etag)
+async def async_available_slots_api(request):
+    """Async variant of available_slots_api."""
+    date_obj, service_id, error = _parse_slots_params(request)
+    if error:
+        return error
+
+    if date_obj < timezone.localdate():
+        return JsonResponse({"slots": []})
+
+    if request.GET.get("staff") == "any":
+        service = await Service.objects.filter(id=service_id).afirst()
+        if service is None:
+            return JsonResponse({"error": "Invalid service ID"}, status=404)
+        return JsonResponse(
+            _any_staff_payload(
+                await aget_available_slots_by_staff(date_obj, service),
+                service,
+                await sync_to_async(schedule.get_qualifications)(),
+            )
+        )
+
+    # Service validation and the staff pick are independent queries
+    service, available_staff = await asyncio.gather(
+        Service.objects.filter(id=service_id).afirst(),
+        get_available_staff(date_obj, service_id).afirst(),
+    )
+    if service is None:
+        return JsonResponse({"error": "Invalid service ID"}, status=404)
+
+    if not available_staff:
+        return JsonResponse({"slots": [], "staff": None})
+
+    slots = await aget_available_slots(date_obj, service.id, available_staff)
+    return JsonResponse(
+        {
+            "slots": slots,
+            "staff": {"id": available_staff.id, "name": available_staff.name},
+        }
+    )
+
+
+async def slot_events_api(request):
+    """
+    Server-Sent Events stream of booking changes on one date, for ASGI deployments.
+    "taken" carries the booked staff interval so clients drop the slots it blocks,
+    "released" and "resync" mean the day should be fetched again.
+    """
+    # A WSGI worker would be held by the stream forever
+    if not isinstance(request, ASGIRequest):
+        return JsonResponse(
+            {"error": "Slot events require the ASGI server"}, status=501
+        )
+
+    date_obj, service_id, error = _parse_slots_params(request)
+    if error:
+        return error
+
+    if not await Service.objects.filter(id=service_id).aexists():
+        return JsonResponse({"error": "Invalid service ID"}, status=404)
+
+    broker = events.get_broker()
+    subscription = broker.subscribe(events.day_channel(date_obj))
+    heartbeat = settings.BOOKING_EVENTS_HEARTBEAT
+
+    async def stream():
+        try:
+            yield "retry: 3000\n: connected\n\n"
+            while True:
+                frame = await subscription.next(timeout=heartbeat)
+                # Comments keep proxies from closing an idle connection
+                yield frame if frame is not None else ": keep-alive\n\n"
+        finally:
+            broker.unsubscribe(subscription)
+
+    response = StreamingHttpResponse(stream(), content_type="text/event-stream")
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"
+    return response
+
+
+def _parse_slots_params(request):
+    """Returns (date, service_id, error_response) from the slots query string."""
     date_str = request.GET.get("date")
     service_id = request.GET.get("service_id")
 
     if not (date_str and service_id):
-        return JsonResponse({"error": "Missing required parameters"}, status=400)
+        return (
+            None,
+            None,
+            JsonResponse({"error": "Missing required parameters"}, status=400),
+        )
 
     try:
         date_obj = datetime.strptime(date_str, "%Y-%m-%d").date()
+    except ValueError:
+        return (
+            None,
+            None,
+            JsonResponse({"error": "Invalid date format, use YYYY-MM-DD"}, status=400),
+        )
+
+    return date_obj, service_id, None
+
+
+def _any_staff_payload(slots_by_staff, service, qualifications):
+    """
+    Slots across every working staff member, each assigned to the least loaded one.
+    """
+    staff_by_slot, assignments = merge_staff_slots(slots_by_staff)
+
+    return {
+        "slots": list(staff_by_slot),
+        "staff_by_slot": staff_by_slot,
+        "assignments": assignments,
+        "staff": {
+            staff_id: {
+                "id": staff.id,
+                "name": staff.name,
+                # Minutes a slot of this staff member blocks, for live updates
+                "total_minutes": qualifications.total_required_time(staff_id, service)
+                // timedelta(minutes=1),
+            }
+            for staff_id, (staff, slots, load) in slots_by_staff.items()
+        },
+    }
+
+
+def availability_range_api(request):
+    """
+    Streams one NDJSON line of merged staff slots per day between from and to
+    (inclusive).
+    """
+    service_id = request.GET.get("service_id")
+    from_str = request.GET.get("from")
+    to_str = request.GET.get("to")
+
+    if not (service_id and from_str and to_str):
+        return JsonResponse({"error": "Missing required parameters"}, status=400)
+
+    try:
+        start_date = datetime.strptime(from_str, "%Y-%m-%d").date()
+        end_date = datetime.strptime(to_str, "%Y-%m-%d").date()
     except ValueError:
         return JsonResponse(
             {"error": "Invalid date format, use YYYY-MM-DD"}, status=400
         )
 
-    if date_obj < timezone.localdate():
-        return JsonResponse({"slots": []})
+    if end_date < start_date:
+        return JsonResponse({"error": "'to' must not be before 'from'"}, status=400)
+
+    max_days = settings.BOOKING_AVAILABILITY_RANGE_MAX_DAYS
+    if (end_date - start_date).days + 1 > max_days:
+        return JsonResponse(
+            {"error": f"Date range cannot exceed {max_days} days"}, status=400
+        )
 
     try:
         service = Service.objects.get(id=service_id)
     except Service.DoesNotExist:
         return JsonResponse({"error": "Invalid service ID"}, status=404)
 
-    # Assign the first available staff
-    available_staff = get_available_staff(date_obj).first()
+    # Past days have no slots, so only compute from today onwards
+    start_date = max(start_date, timezone.localdate())
 
-    if not available_staff:
-        return JsonResponse({"slots": [], "staff": None})
+    def stream():
+        if start_date > end_date:
+            return
+        for day, slots_by_staff in iter_available_slots_by_staff(
+            start_date, end_date, service
+        ):
+            staff_by_slot, assignments = merge_staff_slots(slots_by_staff)
+            line = {
+                "date": day.isoformat(),
+                "slots": list(staff_by_slot),
+                "staff_by_slot": staff_by_slot,
+                "assignments": assignments,
+            }
+            yield json.dumps(line) + "\n"
 
-    slots = get_available_slots(date_obj, service.id, available_staff)
+    return StreamingHttpResponse(stream(), content_type="application/x-ndjson")
+
+
+def next_available_api(request):
+    """
+    Earliest slots for a service across all staff, from `after` (YYYY-MM-DD or YYYY-MM-
+    DDTHH:MM) on.
+    """
+    service_id = request.GET.get("service_id")
+    after_str = request.GET.get("after")
+
+    if not service_id:
+        return JsonResponse({"error": "Missing required parameters"}, status=400)
+
+    after_date, after_time = timezone.localdate(), None
+    if after_str:
+        try:
+            if "T" in after_str:
+                after = datetime.strptime(after_str, "%Y-%m-%dT%H:%M")
+                after_date, after_time = after.date(), after.time()
+            else:
+                after_date = datetime.strptime(after_str, "%Y-%m-%d").date()
+        except ValueError:
+            return JsonResponse(
+                {"error": "Invalid after, use YYYY-MM-DD or YYYY-MM-DDTHH:MM"},
+                status=400,
+            )
+
+    try:
+        limit = int(request.GET.get("limit", 5))
+    except ValueError:
+        return JsonResponse({"error": "Invalid limit"}, status=400)
+    if not 1 <= limit <= settings.BOOKING_NEXT_AVAILABLE_MAX_LIMIT:
+        return JsonResponse(
+            {
+                "error": "limit must be between 1 and "
+                f"{settings.BOOKING_NEXT_AVAILABLE_MAX_LIMIT}"
+            },
+            status=400,
+        )
+
+    try:
+        service = Service.objects.get(id=service_id)
+    except Service.DoesNotExist:
+        return JsonResponse({"error": "Invalid service ID"}, status=404)
+
+    slots = find_next_available_slots(
+        service,
+        after_date,
+        after_time,
+        limit,
+        settings.BOOKING_NEXT_AVAILABLE_MAX_DAYS,
+    )
     return JsonResponse(
         {
-            "slots": slots,
-            "staff": {"id": available_staff.id, "name": available_staff.name},
+            "slots": [
+                {
+                    "date": day.isoformat(),
+                    "start_time": slot,
+                    "staff": {"id": staff.id, "name": staff.name},
+                }
+                for day, slot, staff in slots
+            ]
         }
     )
 
@@ -53,51 +388,391 @@ def available_slots_api(request):
 @require_POST
 def book_appointment_api(request):
     """API to create bookings. Returns booking id and success message else responses with specific error message."""
+    fields, error = _parse_booking_payload(request)
+    if error:
+        return error
+
+    try:
+        service = Service.objects.get(id=fields.pop("service_id"))
+        staff = Staff.objects.get(id=fields.pop("staff_id"))
+    except (Service.DoesNotExist, Staff.DoesNotExist):
+        return JsonResponse({"error": "Invalid staff or service"}, status=404)
+
+    try:
+        booking = create_booking(service=service, staff=staff, **fields)
+        return JsonResponse({"success": True, "booking_id": booking.id})
+    except Exception as e:
+        return JsonResponse({"error": str(e)}, status=400)
+
+
+@csrf_exempt
+@require_POST
+def slot_hold_api(request):
+    """
+    Reserves a slot while the customer fills in the booking form. Booking with the
+    returned hold_token cannot lose the slot to another customer before expires_at.
+    """
     try:
         data = json.loads(request.body)
+        service_id = data.get("service_id")
+        staff_id = data.get("staff_id")
+        date_str = data.get("date")
+        start_time_str = data.get("start_time")
+    except (json.JSONDecodeError, TypeError, AttributeError):
+        return JsonResponse({"error": "Invalid JSON"}, status=400)
+
+    if not all([service_id, staff_id, date_str, start_time_str]):
+        return JsonResponse({"error": "Missing required fields"}, status=400)
+
+    try:
+        date = datetime.strptime(date_str, "%Y-%m-%d").date()
+        start_time = datetime.strptime(start_time_str, "%H:%M").time()
+    except (ValueError, TypeError):
+        return JsonResponse({"error": "Invalid date/time format"}, status=400)
+
+    try:
+        service = Service.objects.get(id=service_id)
+        staff = Staff.objects.get(id=staff_id)
+    except (Service.DoesNotExist, Staff.DoesNotExist, ValueError):
+        return JsonResponse({"error": "Invalid staff or service"}, status=404)
+
+    try:
+        hold = create_slot_hold(service, date, start_time, staff)
+    except Exception as e:
+        return JsonResponse({"error": str(e)}, status=400)
+
+    return JsonResponse(
+        {
+            "hold_token": hold.token,
+            "expires_at": hold.expires_at.isoformat(),
+            "start_time": hold.start_time.strftime("%H:%M"),
+            "end_time": hold.end_time.strftime("%H:%M"),
+        },
+        status=201,
+    )
+
+
+@csrf_exempt
+@require_POST
+async def async_book_appointment_api(request):
+    """Async variant of book_appointment_api."""
+    fields, error = _parse_booking_payload(request)
+    if error:
+        return error
+
+    try:
+        service, staff = await asyncio.gather(
+            Service.objects.aget(id=fields.pop("service_id")),
+            Staff.objects.aget(id=fields.pop("staff_id")),
+        )
+    except (Service.DoesNotExist, Staff.DoesNotExist):
+        return JsonResponse({"error": "Invalid staff or service"}, status=404)
+
+    try:
+        # The locked check and insert need a transaction, which the async ORM
+        # cannot open
+        booking = await sync_to_async(create_booking)(
+            service=service, staff=staff, **fields
+        )
+        return JsonResponse({"success": True, "booking_id": booking.id})
+    except Exception as e:
+        return JsonResponse({"error": str(e)}, status=400)
+
+
+def _parse_booking_payload(request):
+    """
+    Returns (create_booking kwargs plus service_id/staff_id, error_response) from the
+    JSON body.
+    """
+    try:
+        data = json.loads(request.body)
+    except (json.JSONDecodeError, TypeError):
+        return None, JsonResponse({"error": "Invalid JSON"}, status=400)
+
+    fields, error = _booking_fields(data)
+    if error:
+        return None, JsonResponse({"error": error}, status=400)
+    fields["hold_token"] = data.get("hold_token") or None
+    return fields, None
+
+
+def _booking_fields(data):
+    """
+    Returns (create_booking kwargs plus service_id/staff_id, error message) from one
+    booking object.
+    """
+    try:
         service_id = data.get("service_id")
         staff_id = data.get("staff_id")
         customer_name = data.get("customer_name")
         customer_email = data.get("customer_email")
         date_str = data.get("date")
         start_time_str = data.get("start_time")
-    except (json.JSONDecodeError, TypeError):
-        return JsonResponse({"error": "Invalid JSON"}, status=400)
+    except AttributeError:
+        return None, "Invalid JSON"
 
     if not all(
         [service_id, staff_id, customer_name, customer_email, date_str, start_time_str]
     ):
-        return JsonResponse({"error": "Missing required fields"}, status=400)
+        return None, "Missing required fields"
 
     try:
         date = datetime.strptime(date_str, "%Y-%m-%d").date()
         start_time = datetime.strptime(start_time_str, "%H:%M").time()
-    except ValueError:
-        return JsonResponse({"error": "Invalid date/time format"}, status=400)
+    except (ValueError, TypeError):
+        return None, "Invalid date/time format"
 
     if date < timezone.localdate():
-        return JsonResponse({"error": "Cannot book past date"}, status=400)
+        return None, "Cannot book past date"
+
+    return {
+        "service_id": service_id,
+        "staff_id": staff_id,
+        "customer_name": customer_name,
+        "customer_email": customer_email,
+        "date": date,
+        "start_time": start_time,
+    }, None
+
 
+@csrf_exempt
+@require_POST
+def batch_bookings_api(request):
+    """
+    Books a list of items in one transaction, e.g. back to back services or a group.
+    mode "all_or_nothing" (default) books nothing unless every item can be booked,
+    "best_effort" books every item it can. Returns one result per item, in order.
+    """
     try:
-        service = Service.objects.get(id=service_id)
-        staff = Staff.objects.get(id=staff_id)
+        data = json.loads(request.body)
+        items = data.get("bookings")
+        mode = data.get("mode", "all_or_nothing")
+    except (json.JSONDecodeError, TypeError, AttributeError):
+        return JsonResponse({"error": "Invalid JSON"}, status=400)
+
+    if mode not in ("all_or_nothing", "best_effort"):
+        return JsonResponse(
+            {"error": "mode must be all_or_nothing or best_effort"}, status=400
+        )
+    if not isinstance(items, list) or not items:
+        return JsonResponse({"error": "bookings must be a non-empty list"}, status=400)
+
+    max_items = settings.BOOKING_BATCH_MAX_ITEMS
+    if len(items) > max_items:
+        return JsonResponse(
+            {"error": f"A batch cannot contain more than {max_items} bookings"},
+            status=400,
+        )
+
+    parsed = []
+    for item in items:
+        fields, error = _booking_fields(item)
+        if not error:
+            fields["service_id"] = _as_id(fields["service_id"])
+            fields["staff_id"] = _as_id(fields["staff_id"])
+        parsed.append((fields, error))
+
+    # One query each for every service and staff member in the batch
+    services = Service.objects.in_bulk(
+        {fields["service_id"] for fields, error in parsed if not error} - {None}
+    )
+    staff_by_id = Staff.objects.in_bulk(
+        {fields["staff_id"] for fields, error in parsed if not error} - {None}
+    )
+
+    errors = [None] * len(items)
+    valid = []
+    for position, (fields, error) in enumerate(parsed):
+        if not error:
+            service = services.get(fields.pop("service_id"))
+            staff = staff_by_id.get(fields.pop("staff_id"))
+            if service is None or staff is None:
+                error = "Invalid staff or service"
+            else:
+                valid.append((position, dict(fields, service=service, staff=staff)))
+        errors[position] = error
+
+    all_or_nothing = mode == "all_or_nothing"
+    results = list(errors)
+    if all_or_nothing and any(errors):
+        for position, _ in valid:
+            results[position] = "Not booked because another item failed."
+    else:
+        try:
+            created = create_bookings([item for _, item in valid], all_or_nothing)
+        except Exception as e:
+            return JsonResponse({"error": str(e)}, status=400)
+        for (position, _), result in zip(valid, created):
+            results[position] = result
+
+    payload = [
+        (
+            {"success": False, "error": result}
+            if isinstance(result, str)
+            else {"success": True, "booking_id": result.id}
+        )
+        for result in results
+    ]
+    booked = sum(item["success"] for item in payload)
+    return JsonResponse(
+        {"success": booked == len(items), "booked": booked, "results": payload},
+        status=200 if booked else 400,
+    )
+
+
+@csrf_exempt
+@require_POST
+def recurring_booking_api(request):
+    """
+    Books a series, e.g. {"frequency": "weekly", "count": 12} on top of the single
+    booking fields, with "until" (YYYY-MM-DD) as an alternative end. Dates that cannot
+    be booked are reported with the nearest free times of that date. mode works as for
+    batches.
+    """
+    fields, error = _parse_booking_payload(request)
+    if error:
+        return error
+
+    data = json.loads(request.body)
+    frequency = data.get("frequency")
+    mode = data.get("mode", "all_or_nothing")
+    if frequency not in dict(Recurrence.FREQUENCY_CHOICES):
+        return JsonResponse(
+            {"error": "frequency must be weekly, biweekly or monthly"}, status=400
+        )
+    if mode not in ("all_or_nothing", "best_effort"):
+        return JsonResponse(
+            {"error": "mode must be all_or_nothing or best_effort"}, status=400
+        )
+
+    count, until = data.get("count"), data.get("until")
+    if count is None and until is None:
+        return JsonResponse({"error": "Either count or until is required"}, status=400)
+    try:
+        count = int(count) if count is not None else None
+        until = datetime.strptime(until, "%Y-%m-%d").date() if until else None
+    except (TypeError, ValueError):
+        return JsonResponse({"error": "Invalid count or until"}, status=400)
+    if count is not None and count < 1:
+        return JsonResponse({"error": "count must be positive"}, status=400)
+
+    try:
+        service = Service.objects.get(id=fields.pop("service_id"))
+        staff = Staff.objects.get(id=fields.pop("staff_id"))
     except (Service.DoesNotExist, Staff.DoesNotExist):
         return JsonResponse({"error": "Invalid staff or service"}, status=404)
 
+    recurrence = Recurrence(
+        service=service,
+        staff=staff,
+        customer_name=fields["customer_name"],
+        customer_email=fields["customer_email"],
+        frequency=frequency,
+        start_date=fields["date"],
+        start_time=fields["start_time"],
+        count=count,
+        until=until,
+    )
     try:
-        booking = create_booking(
-            service=service,
-            customer_name=customer_name,
-            customer_email=customer_email,
-            date=date,
-            start_time=start_time,
-            staff=staff,
+        bookings, conflicts = create_recurring_booking(
+            recurrence, all_or_nothing=mode == "all_or_nothing"
         )
-        return JsonResponse({"success": True, "booking_id": booking.id})
     except Exception as e:
         return JsonResponse({"error": str(e)}, status=400)
 
+    return JsonResponse(
+        {
+            "success": not conflicts,
+            "recurrence_id": recurrence.pk,
+            "bookings": [
+                {"date": booking.date.isoformat(), "booking_id": booking.id}
+                for booking in bookings
+            ],
+            "conflicts": [
+                {
+                    "date": conflict["date"].isoformat(),
+                    "error": conflict["error"],
+                    "alternatives": conflict["alternatives"],
+                }
+                for conflict in conflicts
+            ],
+        },
+        status=200 if bookings else 400,
+    )
+
+
+def utilization_report_api(request):
+    """
+    Staff utilization, bookings and revenue per day, week or month between from and
+    to (inclusive), read from the daily staff stats. Admin staff only.
+    """
+    if not request.user.is_staff:
+        return JsonResponse({"error": "Staff login required"}, status=403)
+
+    from_str = request.GET.get("from")
+    to_str = request.GET.get("to")
+    period = request.GET.get("period", "day")
+    if not (from_str and to_str):
+        return JsonResponse({"error": "Missing required parameters"}, status=400)
+    if period not in ("day", "week", "month"):
+        return JsonResponse({"error": "period must be day, week or month"}, status=400)
+
+    try:
+        start_date = datetime.strptime(from_str, "%Y-%m-%d").date()
+        end_date = datetime.strptime(to_str, "%Y-%m-%d").date()
+    except ValueError:
+        return JsonResponse(
+            {"error": "Invalid date format, use YYYY-MM-DD"}, status=400
+        )
+
+    if end_date < start_date:
+        return JsonResponse({"error": "'to' must not be before 'from'"}, status=400)
+
+    max_days = settings.BOOKING_REPORT_MAX_DAYS
+    if (end_date - start_date).days + 1 > max_days:
+        return JsonResponse(
+            {"error": f"Date range cannot exceed {max_days} days"}, status=400
+        )
+
+    staff_ids = None
+    if request.GET.get("staff"):
+        staff_id = _as_id(request.GET["staff"])
+        if staff_id is None:
+            return JsonResponse({"error": "Invalid staff ID"}, status=400)
+        staff_ids = {staff_id}
+
+    return JsonResponse(
+        {
+            "period": period,
+            "rows": [
+                {
+                    "period_start": row["period"].isoformat(),
+                    "staff": {"id": row["staff"].id, "name": row["staff"].name},
+                    "bookings": row["bookings"],
+                    "booked_minutes": row["booked_minutes"],
+                    "available_minutes": row["available_minutes"],
+                    "utilization": (
+                        round(row["booked_minutes"] / row["available_minutes"], 4)
+                        if row["available_minutes"]
+                        else None
+                    ),
+                    "revenue": row["revenue"],
+                }
+                for row in rollups.utilization(start_date, end_date, period, staff_ids)
+            ],
+        }
+    )
+
+
+def _as_id(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
 
+@cache_control(no_cache=True)
+@condition(etag_func=_services_etag, last_modified_func=_services_last_modified)
 def services_api(request):
     """Returns all the services with name, duration, price and a specific id."""
     services = Service.objects.all().values(
@@ -106,6 +781,24 @@ def services_api(request):
     return JsonResponse({"services": list(services)})
 
 
+@_aload_services_version
+@cache_control(no_cache=True)
+@condition(etag_func=_services_etag, last_modified_func=_services_last_modified)
+async def async_services_api(request):
+    """Async variant of services_api."""
+    services = Service.objects.all().values(
+        "id", "name", "duration_minutes", "price", "buffer_minutes"
+    )
+    return JsonResponse({"services": [service async for service in services]})
+
+
+def metrics_view(request):
+    """Prometheus scrape endpoint for the request metrics."""
+    return HttpResponse(
+        metrics.render_prometheus(), content_type="text/plain; version=0.0.4"
+    )
+
+
 # template views
 def booking_page(request):
     return render(request, "booking/booking_form.html")